@@ -9,8 +9,15 @@ from .crew_scheduling_agent import CrewSchedulingAgent
 from .aircraft_maintenance_agent import AircraftMaintenanceAgent
 from .airport_resource_agent import AirportResourceAgent
 from .customer_communication_agent import CustomerCommunicationAgent
-import json
+import hashlib
 from mongo_utils import mongo_db
+from services.date_utils import to_iso
+from services.flight_repository import flight_repository
+from services.gemini_service import is_model_response
+from services.ttl_cache import TTLCache
+from services.agent_stats_service import AgentCommunicationStatsService
+from services.communication_store import CommunicationStore, read_content
+from services.unit_of_work import flush_current, unit_of_work
 
 try:
     from config import Config
@@ -42,6 +49,10 @@ class AgentCoordinator:
         self.agents: Dict[str, Any] = {}
         self.executor = ThreadPoolExecutor(max_workers=5)
         self.app = None  # No longer create a Flask app instance here
+        # Phase 1 assessments keyed by (disruption_id, agent_name, version), warmed by the prefetch service
+        self.assessment_cache = TTLCache(Config.PREFETCH_ASSESSMENT_TTL_SECONDS)
+        self.communication_stats = AgentCommunicationStatsService()
+        self.communications = CommunicationStore(self.communication_stats)
         logging.info("Agent Coordinator initialized, agents not yet created.")
         self.adk_agents = None
         if hasattr(Config, 'USE_ADK_AGENTS') and Config.USE_ADK_AGENTS:
@@ -79,6 +90,16 @@ class AgentCoordinator:
         if not self.agents:
             logging.error("Agents not initialized. Call init_agents() first.")
             return {"success": False, "error": "Agents not initialized"}
+        # Agent writes are batched per collection and flushed after each agent
+        with unit_of_work(f"coordination-{disruption_id}") as uow:
+            response = self._coordinate_disruption(disruption_id)
+            if uow is not None:
+                self._flush_writes()
+                response["write_stats"] = uow.get_stats()
+            return response
+    
+    def _coordinate_disruption(self, disruption_id: int) -> dict:
+        """Run the four coordination phases for a disruption"""
         try:
             disruption = mongo_db['disruptions'].find_one({'id': disruption_id})
             if not disruption:
@@ -104,30 +125,76 @@ class AgentCoordinator:
                 "next_review": (datetime.utcnow().timestamp() + 1800)
             }
             self._log_coordination_activity(disruption_id, response)
-            # Test: Create a direct communication record to verify MongoDB is working
+            # Completion marker; the retention archiver keeps its status as the disruption's last_status
             try:
-                test_comm = {
-                    'sender': "Agent Coordinator",
-                    'receiver': "System",
-                    'message_type': "coordination_complete",
-                    'content': json.dumps({"disruption_id": disruption_id, "status": "completed"}),
-                    'processed': False,
-                    'disruption_id': disruption_id,
-                    'timestamp': datetime.utcnow().isoformat()
-                }
-                mongo_db['agent_communications'].insert_one(test_comm)
-                logging.info(f"Test communication record created for disruption {disruption_id}")
+                self.communications.send("Agent Coordinator", "System", "coordination_complete",
+                                         {"disruption_id": disruption_id, "status": "completed"}, disruption_id)
+                logging.info(f"Coordination completion recorded for disruption {disruption_id}")
             except Exception as e:
-                logging.error(f"Failed to create test communication record: {e}")
+                logging.error(f"Failed to record coordination completion: {e}")
             return response
         except Exception as e:
             logging.error(f"Coordination error for disruption {disruption_id}: {e}")
             return {"success": False, "error": str(e)}
     
+    def prefetch_disruption(self, disruption_id: int) -> Dict[str, Any]:
+        """Warm assessment and AI caches for a disruption ahead of coordination.
+
+        Runs in the caller's thread so background work never occupies the
+        interactive executor; LLM calls should be made under
+        GeminiService.background_priority().
+        """
+        if not self.agents:
+            return {"success": False, "error": "Agents not initialized"}
+        warmed = {"assessments": [], "ai_prompts": [], "errors": {}}
+        version = self._assessment_version(disruption_id)
+        if version is None:
+            return {"success": False, "error": "Disruption not found"}
+        for agent_name, agent in self.agents.items():
+            try:
+                if (disruption_id, agent_name, version) not in self.assessment_cache:
+                    result = agent.analyze_situation({"disruption_id": disruption_id})
+                    if "error" not in result:
+                        self.assessment_cache.set((disruption_id, agent_name, version), result)
+                        warmed["assessments"].append(agent_name)
+                if self._is_warmed(agent.prefetch_ai_analysis(disruption_id)):
+                    warmed["ai_prompts"].append(agent_name)
+            except Exception as e:
+                logging.warning(f"Prefetch failed for {agent_name} on disruption {disruption_id}: {e}")
+                warmed["errors"][agent_name] = str(e)
+        return {"success": True, "disruption_id": disruption_id, **warmed}
+    
+    def _assessment_version(self, disruption_id: int):
+        """What a disruption's assessments depend on: its document (a reseed replaces it) and its flights' versions"""
+        disruption = mongo_db['disruptions'].find_one({'id': disruption_id}, {'_id': 1, 'affected_flight_list': 1})
+        if not disruption:
+            return None
+        flights = flight_repository.get_many(disruption.get('affected_flight_list', []))
+        state = [str(disruption['_id'])] + [(f.get('id'), f.get('version'), to_iso(f.get('updated_at'))) for f in flights]
+        return hashlib.sha1(repr(state).encode('utf-8')).hexdigest()
+    
+    def _is_warmed(self, analysis) -> bool:
+        """Whether a prefetched analysis holds model output rather than an error or placeholder"""
+        if analysis is None:
+            return False
+        if isinstance(analysis, str):
+            return is_model_response(analysis)
+        if isinstance(analysis, dict):
+            return "error" not in analysis and all(self._is_warmed(value) for value in analysis.values()
+                                                   if isinstance(value, (str, dict)))
+        return True
+    
     def _execute_parallel_assessment(self, disruption_id: int) -> Dict[str, Any]:
         """Execute parallel assessment by all agents"""
         assessment_tasks = {}
+        assessment_results = {}
+        version = self._assessment_version(disruption_id)
         for agent_name, agent in self.agents.items():
+            cached = self.assessment_cache.get((disruption_id, agent_name, version)) if version else None
+            if cached is not None:
+                logging.debug(f"Using prefetched assessment from {agent_name}")
+                assessment_results[agent_name] = cached
+                continue
             def task_with_context(agent=agent):
                 try:
                     return agent.analyze_situation({"disruption_id": disruption_id})
@@ -136,7 +203,6 @@ class AgentCoordinator:
                     return {"error": str(e)}
             task = self.executor.submit(task_with_context)
             assessment_tasks[agent_name] = task
-        assessment_results = {}
         for agent_name, task in assessment_tasks.items():
             try:
                 logging.debug(f"Waiting for assessment result from {agent_name}")
@@ -199,6 +265,8 @@ class AgentCoordinator:
                 completed_agents.add(agent_name)
                 logging.info(f"Agent {agent_name} completed successfully")
                 self._process_agent_communications(agent_name, coordination_plan, result, disruption_id)
+                # Later agents read this agent's messages
+                self._flush_writes()
                 logging.info(f"Agent {agent_name} completed disruption processing")
             except Exception as e:
                 logging.error(f"Execution failed for {agent_name}: {e}")
@@ -274,20 +342,19 @@ class AgentCoordinator:
         for flow in communication_flows:
             if flow["from"] == agent_name:
                 try:
-                    comm_doc = {
-                        'sender': self.agents[agent_name].name,
-                        'receiver': flow["to"],
-                        'message_type': flow["message"],
-                        'content': json.dumps(result),
-                        'processed': False,
-                        'disruption_id': disruption_id,
-                        'timestamp': datetime.utcnow().isoformat()
-                    }
-                    mongo_db['agent_communications'].insert_one(comm_doc)
+                    self.communications.send(self.agents[agent_name].name, flow["to"], flow["message"],
+                                             result, disruption_id)
                     logging.info(f"Communication sent: {agent_name} -> {flow['to']}")
                 except Exception as e:
                     logging.error(f"Failed to create communication record: {e}")
     
+    def _flush_writes(self):
+        """Send the writes queued so far in the current unit of work"""
+        try:
+            flush_current()
+        except Exception as e:
+            logging.error(f"Failed to flush coordination writes: {e}")
+    
     def _log_coordination_activity(self, disruption_id: int, response: Dict[str, Any]):
         """Log coordination activity for audit and analysis"""
         log_entry = {
@@ -323,16 +390,16 @@ class AgentCoordinator:
             for message in messages:
                 try:
                     response = self._handle_agent_message(agent, message)
-                    agent.mark_message_processed(message.id)
+                    agent.mark_message_processed(message['_id'], message.get('timestamp'))
                     processed_messages.append({
-                        "message_id": message.id,
-                        "sender": message.sender,
-                        "message_type": message.message_type,
+                        "message_id": str(message['_id']),
+                        "sender": message.get('sender'),
+                        "message_type": message.get('message_type'),
                         "processed_at": datetime.utcnow().isoformat(),
                         "response": response
                     })
                 except Exception as e:
-                    logging.error(f"Failed to process message {message.id}: {e}")
+                    logging.error(f"Failed to process message {message.get('_id')}: {e}")
             return processed_messages
         except Exception as e:
             logging.error(f"Failed to process messages for {agent_name}: {e}")
@@ -340,8 +407,8 @@ class AgentCoordinator:
     
     def _handle_agent_message(self, agent, message) -> Dict[str, Any]:
         """Handle a specific agent message"""
-        message_type = message.message_type
-        content = message.content_dict
+        message_type = message.get('message_type')
+        content = read_content(message)
         
         if message_type == "status_request":
             return agent.get_agent_info()
@@ -1,6 +1,10 @@
 from .base_agent import BaseAgent
 from mongo_utils import mongo_db
+from services.flight_repository import flight_repository
+from services.fleet_model import fleet
+from services.maintenance_scheduler import maintenance_scheduler
 from services.gemini_service import GeminiService
+from services.date_utils import to_datetime, utcnow
 from datetime import datetime, timedelta
 import logging
 
@@ -25,7 +29,7 @@ class AircraftMaintenanceAgent(BaseAgent):
             if not disruption:
                 return {"success": False, "error": "Disruption not found"}
             affected_flight_ids = disruption.get('affected_flight_list', [])
-            affected_flights = list(mongo_db['flights'].find({'id': {'$in': affected_flight_ids}}))
+            affected_flights = flight_repository.get_many(affected_flight_ids)
             
             # Analyze aircraft impact
             aircraft_analysis = self._analyze_aircraft_impact(affected_flights, disruption)
@@ -33,14 +37,19 @@ class AircraftMaintenanceAgent(BaseAgent):
             # Check maintenance requirements
             maintenance_needs = self._assess_maintenance_needs(affected_flights, disruption)
             
-            # Find spare aircraft
+            # Schedule the work against technicians and hangar bays at each airport
+            maintenance_schedule = maintenance_scheduler.book(disruption_id, maintenance_needs)
+            
+            # Find spare aircraft, and swaps or spares for the aircraft grounded until their work ends
             spare_aircraft = self._find_spare_aircraft(affected_flights)
+            aircraft_recovery = self._plan_aircraft_recovery(maintenance_schedule)
             
             # Generate AI-powered maintenance solutions
             ai_solutions = self._get_ai_maintenance_solutions(disruption, aircraft_analysis, maintenance_needs)
             
             # Create maintenance recovery plan
-            recovery_plan = self._create_maintenance_recovery_plan(affected_flights, maintenance_needs, spare_aircraft)
+            recovery_plan = self._create_maintenance_recovery_plan(affected_flights, maintenance_needs, spare_aircraft,
+                                                                   aircraft_recovery, maintenance_schedule)
             
             result = {
                 "success": True,
@@ -49,9 +58,10 @@ class AircraftMaintenanceAgent(BaseAgent):
                 "aircraft_affected": len(aircraft_analysis["affected_aircraft"]),
                 "maintenance_required": len(maintenance_needs),
                 "spare_aircraft_available": len(spare_aircraft),
+                "aircraft_recovery": aircraft_recovery,
                 "recovery_plan": recovery_plan,
                 "ai_solutions": ai_solutions,
-                "estimated_recovery_time": self._estimate_recovery_time(maintenance_needs),
+                "estimated_recovery_time": self._estimate_recovery_time(maintenance_needs, maintenance_schedule),
                 "airworthiness_status": "Compliant"
             }
             
@@ -75,7 +85,7 @@ class AircraftMaintenanceAgent(BaseAgent):
             disruption = mongo_db['disruptions'].find_one({'id': disruption_id})
             if not disruption:
                 return {"error": "Disruption not found"}
-            affected_flights = list(mongo_db['flights'].find({'id': {'$in': disruption.get('affected_flight_list', [])}}))
+            affected_flights = flight_repository.get_many(disruption.get('affected_flight_list', []))
             
             analysis = {
                 "fleet_impact": self._analyze_fleet_impact(affected_flights),
@@ -91,6 +101,16 @@ class AircraftMaintenanceAgent(BaseAgent):
             logging.error(f"Maintenance situation analysis error: {e}")
             return {"error": str(e)}
     
+    def prefetch_ai_analysis(self, disruption_id: int):
+        """Warm the maintenance AI prompt ahead of coordination (no messages sent)"""
+        disruption = mongo_db['disruptions'].find_one({'id': disruption_id})
+        if not disruption:
+            return None
+        affected_flights = flight_repository.get_many(disruption.get('affected_flight_list', []))
+        aircraft_analysis = self._analyze_aircraft_impact(affected_flights, disruption)
+        maintenance_needs = self._assess_maintenance_needs(affected_flights, disruption)
+        return self._get_ai_maintenance_solutions(disruption, aircraft_analysis, maintenance_needs)
+    
     def generate_recommendations(self, analysis: dict) -> list:
         """Generate aircraft maintenance recommendations"""
         recommendations = []
@@ -131,34 +151,42 @@ class AircraftMaintenanceAgent(BaseAgent):
         
         return recommendations
     
+    def _disruption_type(self, disruption):
+        """Disruption type as a string; older documents stored {'value': ...}"""
+        disruption_type = disruption.get('type') or 'Unknown'
+        return disruption_type.get('value', 'Unknown') if isinstance(disruption_type, dict) else disruption_type
+    
     def _analyze_aircraft_impact(self, affected_flights, disruption):
         """Analyze impact on aircraft from disruption"""
         affected_aircraft = set()
         aircraft_types = {}
+        model = fleet.current()
         
         for flight in affected_flights:
             if flight.get('aircraft_id'):
                 affected_aircraft.add(flight['aircraft_id'])
-                aircraft_type = flight['aircraft_id'].split('-')[0]  # Extract type from ID
+                aircraft_type = model.aircraft_type(flight['aircraft_id'])
                 aircraft_types[aircraft_type] = aircraft_types.get(aircraft_type, 0) + 1
         
         return {
             "affected_aircraft": list(affected_aircraft),
             "aircraft_count": len(affected_aircraft),
             "aircraft_types": aircraft_types,
-            "maintenance_impact": self._determine_maintenance_impact(disruption.get('type', {}).get('value', 'Unknown'))
+            "maintenance_impact": self._determine_maintenance_impact(self._disruption_type(disruption))
         }
     
     def _assess_maintenance_needs(self, affected_flights, disruption):
         """Assess maintenance needs based on disruption type"""
         maintenance_needs = []
         
-        if disruption.get('type', {}).get('value') == "mechanical":
+        if self._disruption_type(disruption) == "mechanical":
             # Mechanical disruption requires immediate maintenance
             for flight in affected_flights:
                 if flight.get('aircraft_id'):
                     maintenance_needs.append({
                         "aircraft_id": flight['aircraft_id'],
+                        "airport": flight.get('origin'),
+                        "deadline": self._next_departure(flight),
                         "maintenance_type": "unscheduled",
                         "urgency": "critical",
                         "estimated_duration": "4-8 hours",
@@ -167,12 +195,14 @@ class AircraftMaintenanceAgent(BaseAgent):
                         "technicians_required": 3
                     })
         
-        elif disruption.get('type', {}).get('value') == "weather":
+        elif self._disruption_type(disruption) == "weather":
             # Weather might require inspections
             for flight in affected_flights:
                 if flight.get('aircraft_id') and flight.get('delay_minutes') and flight['delay_minutes'] > 180:
                     maintenance_needs.append({
                         "aircraft_id": flight['aircraft_id'],
+                        "airport": flight.get('origin'),
+                        "deadline": self._next_departure(flight),
                         "maintenance_type": "inspection",
                         "urgency": "medium",
                         "estimated_duration": "1-2 hours",
@@ -183,36 +213,43 @@ class AircraftMaintenanceAgent(BaseAgent):
         
         return maintenance_needs
     
+    def _next_departure(self, flight):
+        """When the aircraft is next due out: the flight's departure if still ahead"""
+        departure = to_datetime(flight.get('scheduled_departure'))
+        return departure if departure and departure > utcnow() else None
+    
     def _find_spare_aircraft(self, affected_flights):
-        """Find available spare aircraft for substitution"""
-        # This would integrate with aircraft management system
-        affected_types = set()
+        """Find aircraft of the affected types idle at the affected airports"""
+        model = fleet.current()
+        now = utcnow()
+        affected = set()
         for flight in affected_flights:
             if flight.get('aircraft_id'):
-                aircraft_type = flight['aircraft_id'].split('-')[0]
-                affected_types.add(aircraft_type)
+                affected.add((flight.get('origin', ''), model.aircraft_type(flight['aircraft_id'])))
         
         spare_aircraft = []
-        for aircraft_type in affected_types:
-            # Simulate spare aircraft availability
-            spare_aircraft.extend([
-                {
-                    "aircraft_id": f"{aircraft_type}-SPARE{i}",
-                    "aircraft_type": aircraft_type,
-                    "location": "Maintenance Base",
-                    "availability": "24 hours",
-                    "status": "ready"
-                }
-                for i in range(1, 3)  # 2 spare aircraft per type
-            ])
-        
+        for airport, aircraft_type in sorted(affected):
+            spare_aircraft.extend(model.available_tails(airport, now, aircraft_type))
         return spare_aircraft
     
+    def _plan_aircraft_recovery(self, maintenance_schedule):
+        """Wait, spare or swap for every aircraft grounded by maintenance, minimizing propagated delay"""
+        now = utcnow()
+        groundings = {}
+        for task in maintenance_schedule["timeline"]:
+            ready_at = to_datetime(task["end"])
+            groundings[task["aircraft_id"]] = max(ready_at, groundings.get(task["aircraft_id"], ready_at))
+        try:
+            return fleet.current().recover(groundings, now)
+        except Exception as e:
+            logging.error(f"Aircraft recovery planning error: {e}")
+            return {"plans": [], "unknown_aircraft": list(groundings), "totals": {}, "solve_ms": None}
+    
     def _get_ai_maintenance_solutions(self, disruption, aircraft_analysis, maintenance_needs):
         """Get AI-powered maintenance solutions"""
         try:
             context = f"""
-            Disruption Type: {disruption.get('type', {}).get('value', 'Unknown')}
+            Disruption Type: {self._disruption_type(disruption)}
             Severity: {disruption.get('severity', 'Unknown')}
             Aircraft Affected: {aircraft_analysis['aircraft_count']}
             Maintenance Tasks: {len(maintenance_needs)}
@@ -241,8 +278,11 @@ class AircraftMaintenanceAgent(BaseAgent):
             logging.error(f"AI maintenance solutions error: {e}")
             return {"error": "AI analysis unavailable"}
     
-    def _create_maintenance_recovery_plan(self, affected_flights, maintenance_needs, spare_aircraft):
+    def _create_maintenance_recovery_plan(self, affected_flights, maintenance_needs, spare_aircraft, aircraft_recovery=None,
+                                          maintenance_schedule=None):
         """Create comprehensive maintenance recovery plan"""
+        aircraft_plans = (aircraft_recovery or {}).get("plans", [])
+        schedule = maintenance_schedule or maintenance_scheduler.simulate(maintenance_needs)
         plan = {
             "immediate_actions": [
                 "Assess all aircraft technical status",
@@ -250,47 +290,47 @@ class AircraftMaintenanceAgent(BaseAgent):
                 "Coordinate spare aircraft positioning"
             ],
             "maintenance_sequence": [],
+            "aircraft_substitutions": [p for p in aircraft_plans if p["action"] in ("swap", "spare")],
             "resource_allocation": {
                 "technicians_deployed": sum(need.get("technicians_required", 1) for need in maintenance_needs),
-                "spare_aircraft_activated": len(spare_aircraft),
-                "hangar_bays_required": min(len(maintenance_needs), 4)
+                "spare_aircraft_activated": sum(1 for p in aircraft_plans if p["action"] in ("swap", "spare")),
+                "hangar_bays_required": sum(a["peak_hangar_bays"] for a in schedule["airports"].values())
             },
             "timeline": {
-                "0-1hr": "Initial assessment and team deployment",
-                "1-4hr": "Critical repairs and inspections",
-                "4-8hr": "Complete repairs and aircraft return to service"
+                "start": schedule["timeline"][0]["start"] if schedule["timeline"] else None,
+                "eta": schedule["eta"],
+                "eta_optimistic": schedule.get("eta_optimistic"),
+                "late_tasks": schedule["late_tasks"],
+                "unschedulable": schedule["unschedulable"]
             }
         }
         
-        # Create maintenance sequence
-        for i, need in enumerate(maintenance_needs):
+        # Create maintenance sequence in start order
+        for i, task in enumerate(schedule["timeline"]):
             plan["maintenance_sequence"].append({
                 "priority": i + 1,
-                "aircraft_id": need["aircraft_id"],
-                "task": need["description"],
-                "estimated_completion": f"{need['estimated_duration']}",
+                "aircraft_id": task["aircraft_id"],
+                "airport": task["airport"],
+                "task": task["task"],
+                "start": task["start"],
+                "estimated_completion": task["end"],
+                "hangar_bay": task["hangar_bay"] or None,
+                "meets_deadline": task["meets_deadline"],
                 "assigned_team": f"Team {i + 1}"
             })
         
         return plan
     
-    def _estimate_recovery_time(self, maintenance_needs):
-        """Estimate total recovery time"""
+    def _estimate_recovery_time(self, maintenance_needs, maintenance_schedule=None):
+        """Estimate total recovery time from the scheduled maintenance timeline"""
         if not maintenance_needs:
             return "No maintenance required"
         
-        max_duration = 0
-        for need in maintenance_needs:
-            duration_str = need.get("estimated_duration", "2 hours")
-            # Extract hours from duration string
-            hours = 2  # Default
-            if "4-8" in duration_str:
-                hours = 8
-            elif "1-2" in duration_str:
-                hours = 2
-            max_duration = max(max_duration, hours)
-        
-        return f"{max_duration} hours"
+        schedule = maintenance_schedule or maintenance_scheduler.simulate(maintenance_needs)
+        optimistic = schedule.get("recovery_hours_optimistic")
+        if optimistic is not None and optimistic < schedule["recovery_hours"]:
+            return f"{optimistic}-{schedule['recovery_hours']} hours"
+        return f"{schedule['recovery_hours']} hours"
     
     def _determine_maintenance_impact(self, disruption_type):
         """Determine maintenance impact based on disruption type"""
@@ -315,7 +355,7 @@ class AircraftMaintenanceAgent(BaseAgent):
     
     def _assess_maintenance_urgency(self, disruption):
         """Assess urgency of maintenance response"""
-        if disruption.get('type', {}).get('value') == "mechanical":
+        if self._disruption_type(disruption) == "mechanical":
             return "critical"
         elif disruption.get('severity', 'Unknown') in ["high", "critical"]:
             return "high"
@@ -324,27 +364,34 @@ class AircraftMaintenanceAgent(BaseAgent):
     
     def _assess_maintenance_resources(self):
         """Assess available maintenance resources"""
+        stats = maintenance_scheduler.get_stats()
+        busiest = max(stats["in_use"].values(), key=lambda usage: usage["technicians"], default={})
         return {
-            "technicians_available": 12,
-            "hangar_capacity": 6,
+            "technicians_available": stats["technicians_per_airport"] - busiest.get("technicians", 0),
+            "hangar_capacity": stats["hangar_bays_per_airport"] - busiest.get("hangar_bays", 0),
+            "tasks_booked": stats["tasks_booked"],
             "parts_inventory": "Adequate",
             "equipment_availability": "Full"
         }
     
     def _check_spare_aircraft_availability(self):
         """Check spare aircraft availability"""
+        model = fleet.current()
+        now = utcnow()
+        immediately = sum(len(model.available_tails(airport, now)) for airport in model.airports)
+        within_day = sum(len(model.available_tails(airport, now + timedelta(hours=24))) for airport in model.airports)
         return {
-            "total_spares": 8,
-            "immediately_available": 5,
-            "24hr_available": 3,
-            "spare_utilization": "65%"
+            "total_spares": max(immediately, within_day),
+            "immediately_available": immediately,
+            "24hr_available": max(0, within_day - immediately),
+            "spare_utilization": f"{100 * (1 - immediately / max(1, model.size['tails'])):.0f}%"
         }
     
     def _assess_technical_complexity(self, disruption):
         """Assess technical complexity of the situation"""
-        if disruption.get('type', {}).get('value') == "mechanical" and disruption.get('severity', 'Unknown') == "critical":
+        if self._disruption_type(disruption) == "mechanical" and disruption.get('severity', 'Unknown') == "critical":
             return "high"
-        elif disruption.get('type', {}).get('value') == "mechanical":
+        elif self._disruption_type(disruption) == "mechanical":
             return "medium"
         else:
             return "low"
@@ -1,5 +1,8 @@
 from .base_agent import BaseAgent
 from mongo_utils import mongo_db
+from services.flight_repository import flight_repository
+from services.gate_allocation import gate_allocation
+from services.ground_resources import EQUIPMENT, PERSONNEL, ground_resources
 from services.gemini_service import GeminiService
 from datetime import datetime, timedelta
 import logging
@@ -25,7 +28,7 @@ class AirportResourceAgent(BaseAgent):
             if not disruption:
                 return {"success": False, "error": "Disruption not found"}
             affected_flight_ids = disruption.get('affected_flight_list', [])
-            affected_flights = list(mongo_db['flights'].find({'id': {'$in': affected_flight_ids}}))
+            affected_flights = flight_repository.get_many(affected_flight_ids)
             
             # Get affected airports
             affected_airports = disruption.get('affected_airport_list', [])
@@ -37,13 +40,18 @@ class AirportResourceAgent(BaseAgent):
             resource_availability = self._check_resource_availability(affected_airports)
             
             # Assess gate requirements
-            gate_requirements = self._assess_gate_requirements(affected_flights)
+            delays = self._expected_delays(disruption, affected_flights)
+            gate_requirements = self._assess_gate_requirements(affected_flights, affected_airports, delays)
+            
+            # Hold ground equipment and staff for the delayed turns
+            ground_reservation = ground_resources.reserve(disruption_id, affected_flights, delays, affected_airports or None)
             
             # Generate AI-powered resource solutions
             ai_solutions = self._get_ai_resource_solutions(disruption, resource_analysis, gate_requirements)
             
             # Create resource allocation plan
-            allocation_plan = self._create_resource_allocation_plan(affected_flights, affected_airports, resource_analysis)
+            allocation_plan = self._create_resource_allocation_plan(affected_flights, affected_airports, resource_analysis,
+                                                                    gate_requirements, ground_reservation)
             
             result = {
                 "success": True,
@@ -78,7 +86,7 @@ class AirportResourceAgent(BaseAgent):
             disruption = mongo_db['disruptions'].find_one({'id': disruption_id})
             if not disruption:
                 return {"error": "Disruption not found"}
-            affected_flights = list(mongo_db['flights'].find({'id': {'$in': disruption.get('affected_flight_list', [])}}))
+            affected_flights = flight_repository.get_many(disruption.get('affected_flight_list', []))
             
             # Get affected airports
             affected_airports = disruption.get('affected_airport_list', [])
@@ -97,6 +105,18 @@ class AirportResourceAgent(BaseAgent):
             logging.error(f"Airport resource situation analysis error: {e}")
             return {"error": str(e)}
     
+    def prefetch_ai_analysis(self, disruption_id: int):
+        """Warm the airport resource AI prompt ahead of coordination (no messages sent)"""
+        disruption = mongo_db['disruptions'].find_one({'id': disruption_id})
+        if not disruption:
+            return None
+        affected_flights = flight_repository.get_many(disruption.get('affected_flight_list', []))
+        affected_airports = disruption.get('affected_airport_list', [])
+        resource_analysis = self._analyze_resource_impact(affected_flights, affected_airports)
+        gate_requirements = self._assess_gate_requirements(affected_flights, affected_airports,
+                                                           self._expected_delays(disruption, affected_flights))
+        return self._get_ai_resource_solutions(disruption, resource_analysis, gate_requirements)
+    
     def generate_recommendations(self, analysis: dict) -> list:
         """Generate airport resource recommendations"""
         recommendations = []
@@ -161,51 +181,44 @@ class AirportResourceAgent(BaseAgent):
     def _check_resource_availability(self, affected_airports):
         """Check availability of airport resources"""
         availability = {}
+        gates = gate_allocation.current().availability(affected_airports)
+        pools = ground_resources.availability(affected_airports)
         
         for airport in affected_airports:
-            # This would integrate with airport management systems
+            available = pools.get(airport, {}).get("available", {})
             availability[airport] = {
-                "gates_available": 8,  # Simulated data
-                "remote_stands": 12,
-                "ground_equipment": {
-                    "pushback_tugs": 6,
-                    "belt_loaders": 8,
-                    "catering_trucks": 4,
-                    "fuel_trucks": 3
-                },
-                "personnel": {
-                    "ground_handlers": 15,
-                    "customer_service": 8,
-                    "baggage_handlers": 12
-                },
+                "gates_available": gates[airport]["gates_available"],
+                "remote_stands": gates[airport]["remote_stands_available"],
+                "ground_equipment": {resource: available.get(resource, 0) for resource in EQUIPMENT},
+                "personnel": {resource: available.get(resource, 0) for resource in PERSONNEL},
                 "terminal_capacity": "Normal"
             }
         
         return availability
     
-    def _assess_gate_requirements(self, affected_flights):
-        """Assess gate assignment requirements"""
-        gate_requirements = {
-            "total_gates_needed": len(affected_flights),
-            "gate_reassignments": [],
-            "remote_stand_usage": 0,
-            "gate_conflicts": []
-        }
-        
-        # Simulate gate assignments
-        for i, flight in enumerate(affected_flights[:5]):  # First 5 flights
-            gate_requirements["gate_reassignments"].append({
-                "flight_number": flight.get('flight_number', ''),
-                "original_gate": f"{flight.get('origin', '')}-{10 + i}",
-                "new_gate": f"{flight.get('origin', '')}-{20 + i}",
-                "reason": "Disruption accommodation"
-            })
-        
-        # Some flights may need remote stands
-        if len(affected_flights) > 10:
-            gate_requirements["remote_stand_usage"] = len(affected_flights) - 10
+    def _assess_gate_requirements(self, affected_flights, affected_airports=None, delays=None):
+        """Re-place the delayed flights' arrivals and departures on the gate plan"""
+        if delays is None:
+            delays = {f.get('id'): f.get('delay_minutes') or 0 for f in affected_flights}
+        allocation = gate_allocation.current().reallocate(affected_flights, delays, affected_airports or None)
         
-        return gate_requirements
+        return {
+            "total_gates_needed": len(allocation["movements"]),
+            "gate_reassignments": [{
+                "flight_number": move["flight_number"],
+                "movement": move["movement"],
+                "original_gate": move["original_gate"],
+                "new_gate": move["new_gate"] or "holding",
+                "reason": ("Delay conflicts with " + ", ".join(move["conflicts_with"]) if move["conflicts_with"]
+                           else "No contact gate free" if move["new_gate"] is None
+                           else "Not on the gate plan")
+            } for move in allocation["reassignments"]],
+            "remote_stand_usage": allocation["remote_stand_usage"],
+            "gate_conflicts": allocation["conflicts"],
+            "unplaced_movements": len(allocation["unplaced"]),
+            "movements": allocation["movements"],
+            "solve_ms": allocation["solve_ms"]
+        }
     
     def _get_ai_resource_solutions(self, disruption, resource_analysis, gate_requirements):
         """Get AI-powered airport resource solutions"""
@@ -240,8 +253,11 @@ class AirportResourceAgent(BaseAgent):
             logging.error(f"AI resource solutions error: {e}")
             return {"error": "AI analysis unavailable"}
     
-    def _create_resource_allocation_plan(self, affected_flights, affected_airports, resource_analysis):
+    def _create_resource_allocation_plan(self, affected_flights, affected_airports, resource_analysis, gate_requirements=None,
+                                         ground_reservation=None):
         """Create comprehensive resource allocation plan"""
+        if gate_requirements is None:
+            gate_requirements = self._assess_gate_requirements(affected_flights, affected_airports)
         plan = {
             "gate_assignments": [],
             "equipment_deployment": {},
@@ -255,30 +271,32 @@ class AirportResourceAgent(BaseAgent):
         }
         
         # Gate assignments
-        for i, flight in enumerate(affected_flights[:10]):  # Limit to manageable number
+        for move in gate_requirements.get("movements", []):
             plan["gate_assignments"].append({
-                "flight": flight.get('flight_number', ''),
-                "gate": f"Gate {i + 1}",
+                "flight": move["flight_number"],
+                "movement": move["movement"],
+                "gate": move["new_gate"] or "holding",
+                "from": move["start"],
+                "until": move["end"],
                 "equipment_assigned": ["Pushback tug", "Belt loader", "Ground power"],
-                "service_level": "Full service"
+                "service_level": "Remote stand - bus boarding" if move["remote_stand"] else "Full service"
             })
         
-        # Equipment deployment by airport
+        # Equipment deployment and staffing by airport, from what was reserved in the pools
+        reserved = (ground_reservation or {}).get("airports", {})
         for airport in affected_airports:
+            allocation = reserved.get(airport, {"reserved": {}, "shortfall": {}, "short_from": None})
             plan["equipment_deployment"][airport] = {
-                "additional_tugs": 2,
-                "extra_belt_loaders": 3,
-                "backup_ground_power": 2,
-                "catering_support": 1
+                "reserved": {resource: allocation["reserved"].get(resource, 0) for resource in EQUIPMENT},
+                "shortfall": {resource: allocation["shortfall"].get(resource, 0) for resource in EQUIPMENT
+                              if allocation["shortfall"].get(resource)}
             }
-        
-        # Staffing adjustments
-        for airport in affected_airports:
+            staff_short = {resource: allocation["shortfall"].get(resource, 0) for resource in PERSONNEL
+                           if allocation["shortfall"].get(resource)}
             plan["staffing_adjustments"][airport] = {
-                "additional_ground_crew": 5,
-                "extra_customer_service": 3,
-                "baggage_handling_boost": 4,
-                "shift_extensions": "2 hours"
+                "reserved": {resource: allocation["reserved"].get(resource, 0) for resource in PERSONNEL},
+                "call_in": staff_short,
+                "shift_extensions": f"from {allocation['short_from']}" if staff_short else "None"
             }
         
         # Passenger services
@@ -308,15 +326,12 @@ class AirportResourceAgent(BaseAgent):
         
         return f"{base_time} minutes"
     
-    def _calculate_equipment_demand(self, affected_flights):
-        """Calculate ground equipment demand"""
-        return {
-            "pushback_tugs": len(affected_flights),
-            "belt_loaders": len(affected_flights) * 2,  # 2 per flight
-            "catering_trucks": len(affected_flights),
-            "fuel_trucks": max(len(affected_flights) // 2, 1),
-            "ground_power_units": len(affected_flights)
-        }
+    def _calculate_equipment_demand(self, affected_flights, delays=None):
+        """Peak ground equipment the flights' turns need at once, summed over airports"""
+        if delays is None:
+            delays = {f.get('id'): f.get('delay_minutes') or 0 for f in affected_flights}
+        peaks = ground_resources.demand(affected_flights, delays).max(axis=1).sum(axis=0)
+        return {resource: int(peak) for resource, peak in zip(EQUIPMENT, peaks)}
     
     def _assess_baggage_impact(self, affected_flights):
         """Assess impact on baggage handling"""
@@ -340,9 +355,10 @@ class AirportResourceAgent(BaseAgent):
     
     def _assess_resource_strain(self, affected_flights, affected_airports):
         """Assess strain on airport resources"""
+        pools = ground_resources.availability(affected_airports).values()
         return {
-            "ground_equipment_utilization": 85,
-            "staffing_utilization": 90,
+            "ground_equipment_utilization": max((pool["peak_equipment_utilization"] for pool in pools), default=0),
+            "staffing_utilization": max((pool["peak_staff_utilization"] for pool in pools), default=0),
             "gate_utilization": 80,
             "critical_resources": ["Ground crew", "Customer service staff"]
         }
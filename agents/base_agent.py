@@ -1,9 +1,12 @@
 from abc import ABC, abstractmethod
-from datetime import datetime
 from mongo_utils import mongo_db
-import json
 import logging
 from models import AgentStatus
+from services.communication_store import CommunicationStore, live_query, read_content
+from services.date_utils import to_datetime, utcnow
+from services.agent_stats_service import AgentCommunicationStatsService
+from services.agent_status_history import AgentStatusHistoryService
+from services.unit_of_work import deferred_update
 
 class BaseAgent(ABC):
     """Abstract base class for all IROPS agents"""
@@ -12,8 +15,12 @@ class BaseAgent(ABC):
         self.name = name
         self.agent_type = agent_type
         self.status = AgentStatus.IDLE
+        self.status_since = utcnow()
         self.current_task = None
         self.capabilities = []
+        self.communication_stats = AgentCommunicationStatsService()
+        self.communications = CommunicationStore(self.communication_stats)
+        self.status_history = AgentStatusHistoryService()
         
         # Ensure agent exists in database
         self._ensure_agent_exists()
@@ -30,10 +37,10 @@ class BaseAgent(ABC):
                 agent_doc = {
                     'name': self.name,
                     'type': self.agent_type,
-                    'status': self.status,
+                    'status': self.status.value,
                     'capabilities': self.capabilities,
                     'current_task': self.current_task,
-                    'last_activity': datetime.utcnow().isoformat()
+                    'last_activity': utcnow()
                 }
                 mongo_db['agents'].insert_one(agent_doc)
                 logging.info(f"Created agent record: {self.name}")
@@ -41,13 +48,16 @@ class BaseAgent(ABC):
             logging.error(f"Error creating agent record: {e}")
     
     def update_status(self, status, task: str = None):
-        """Update agent status in MongoDB"""
+        """Update agent status in MongoDB and append the transition to the status history"""
         try:
-            update = {'status': status, 'last_activity': datetime.utcnow().isoformat()}
+            now = utcnow()
+            update = {'status': status.value, 'last_activity': now}
             if task is not None:
                 update['current_task'] = task
-            mongo_db['agents'].update_one({'name': self.name}, {'$set': update})
+            deferred_update('agents', {'name': self.name}, {'$set': update})
+            self.status_history.record_transition(self.name, status, task, self.status, self.status_since, now)
             self.status = status
+            self.status_since = now
             self.current_task = task
             logging.debug(f"Agent {self.name} status updated: {status}")
         except Exception as e:
@@ -56,15 +66,8 @@ class BaseAgent(ABC):
     def send_message(self, receiver: str, message_type: str, content: dict):
         """Send message to another agent (MongoDB)"""
         try:
-            comm_doc = {
-                'sender': self.name,
-                'receiver': receiver,
-                'message_type': message_type,
-                'content': json.dumps(content),
-                'processed': False,
-                'timestamp': datetime.utcnow().isoformat()
-            }
-            mongo_db['agent_communications'].insert_one(comm_doc)
+            disruption_id = content.get('disruption_id') if isinstance(content, dict) else None
+            self.communications.send(self.name, receiver, message_type, content, disruption_id)
             logging.info(f"Message sent: {self.name} -> {receiver} ({message_type})")
             return True
         except Exception as e:
@@ -74,25 +77,28 @@ class BaseAgent(ABC):
     def get_unprocessed_messages(self):
         """Get unprocessed messages for this agent (MongoDB)"""
         try:
-            messages = list(mongo_db['agent_communications'].find({
+            messages = list(mongo_db['agent_communications'].find(live_query({
                 'receiver': self.name,
                 'processed': False
-            }).sort('timestamp', 1))
+            })).sort('timestamp', 1))
             return messages
         except Exception as e:
             logging.error(f"Error getting messages: {e}")
             return []
     
-    def mark_message_processed(self, message_id):
-        """Mark a message as processed (MongoDB)"""
+    def mark_message_processed(self, message_id, sent_at=None):
+        """Mark a message as processed (MongoDB), recording its response time when sent_at is known"""
         try:
-            mongo_db['agent_communications'].update_one({'_id': message_id}, {'$set': {'processed': True}})
+            processed_at = utcnow()
+            deferred_update('agent_communications', {'_id': message_id}, {'$set': {'processed': True, 'processed_at': processed_at}})
+            if sent_at:
+                self.communication_stats.record_response_time(self.name, sent_at, processed_at)
             logging.debug(f"Message {message_id} marked as processed")
         except Exception as e:
             logging.error(f"Error marking message processed: {e}")
     
-    def _get_disruption_messages(self, disruption_id: int, sender_name: str = None) -> list:
-        """Retrieve and parse messages for a given disruption (MongoDB)"""
+    def _get_disruption_messages(self, disruption_id: int, sender_name: str = None, mark_processed: bool = True) -> list:
+        """Retrieve and parse messages for a given disruption (MongoDB); sender_name is the sending agent's name"""
         messages_content = []
         try:
             query = {
@@ -101,19 +107,28 @@ class BaseAgent(ABC):
             }
             if sender_name:
                 query['sender'] = sender_name
-            messages = list(mongo_db['agent_communications'].find(query).sort('timestamp', 1))
+            messages = list(mongo_db['agent_communications'].find(live_query(query)).sort('timestamp', 1))
             for msg in messages:
-                try:
-                    content_dict = json.loads(msg.get('content', '{}'))
-                except:
-                    content_dict = {}
-                messages_content.append(content_dict)
+                messages_content.append(read_content(msg))
                 # Mark message as processed once it's been read
-                self.mark_message_processed(msg.get('_id'))
+                if mark_processed:
+                    self.mark_message_processed(msg.get('_id'), msg.get('timestamp'))
         except Exception as e:
             logging.error(f"Error retrieving messages for disruption {disruption_id}: {e}")
         return messages_content
     
+    def _expected_delays(self, disruption, affected_flights):
+        """Minutes each affected flight is expected to be late: its own delay, else until the disruption clears"""
+        end = to_datetime(disruption.get('estimated_end_time'))
+        delays = {}
+        for flight in affected_flights:
+            delay = flight.get('delay_minutes') or 0
+            departure = to_datetime(flight.get('scheduled_departure'))
+            if not delay and end and departure and end > departure:
+                delay = int((end - departure).total_seconds() // 60)
+            delays[flight.get('id')] = delay
+        return delays
+    
     @abstractmethod
     def process_disruption(self, disruption_id: int) -> dict:
         """Process a disruption - must be implemented by subclasses"""
@@ -129,6 +144,14 @@ class BaseAgent(ABC):
         """Generate recommendations based on analysis"""
         pass
     
+    def prefetch_ai_analysis(self, disruption_id: int):
+        """Warm the LLM cache with the prompts process_disruption will issue.
+
+        Must not send messages or update state; subclasses override this when
+        their AI prompts can be built before other agents have reported.
+        """
+        return None
+    
     def execute_task(self, task_type: str, parameters: dict) -> dict:
         """Execute a specific task"""
         self.update_status(AgentStatus.PROCESSING, f"Executing {task_type}")
@@ -1,6 +1,11 @@
 from .base_agent import BaseAgent
 from mongo_utils import mongo_db
+from services.crew_duty_engine import crew_duty
+from services.crew_roster import crew_roster
+from services.flight_repository import flight_repository
+from services.reserve_assignment import ReserveAssignmentSolver
 from services.gemini_service import GeminiService
+from services.date_utils import to_datetime
 from datetime import datetime, timedelta
 import logging
 
@@ -17,6 +22,7 @@ class CrewSchedulingAgent(BaseAgent):
             "regulatory_compliance"
         ]
         self.gemini_service = GeminiService()
+        self.reserve_solver = ReserveAssignmentSolver()
     
     def process_disruption(self, disruption_id: int) -> dict:
         """Process disruption for crew scheduling needs (MongoDB)"""
@@ -25,17 +31,20 @@ class CrewSchedulingAgent(BaseAgent):
             if not disruption:
                 return {"success": False, "error": "Disruption not found"}
             affected_flight_ids = disruption.get('affected_flight_list', [])
-            affected_flights = list(mongo_db['flights'].find({'id': {'$in': affected_flight_ids}}))
+            affected_flights = flight_repository.get_many(affected_flight_ids)
             
             # Get context from other agents
-            maintenance_messages = self._get_disruption_messages(disruption_id, sender_name="aircraft_maintenance")
+            maintenance_messages = self._get_disruption_messages(disruption_id, sender_name="Aircraft Maintenance Agent")
             maintenance_context = maintenance_messages[0] if maintenance_messages else {}
             
-            # Analyze crew impact
+            # Analyze crew impact and the later legs those crews are due to fly
             crew_analysis = self._analyze_crew_impact(affected_flights)
+            downstream = self._analyze_downstream_legs(affected_flights)
             
-            # Check duty time violations
-            duty_violations = self._check_duty_time_violations(affected_flights)
+            # Check duty legality with the delays this disruption is expected to cause
+            delays = self._expected_delays(disruption, affected_flights)
+            duty_check = self._check_duty_legality(affected_flights, delays)
+            duty_violations = duty_check["violations"]
             
             # Find available reserve crews
             available_crews = self._find_available_reserve_crews(affected_flights)
@@ -44,7 +53,8 @@ class CrewSchedulingAgent(BaseAgent):
             ai_analysis = self._get_ai_recommendations(disruption, affected_flights, maintenance_context)
             
             # Create crew reassignment plan
-            reassignment_plan = self._create_reassignment_plan(available_crews, ai_analysis)
+            reassignment_plan = self._create_reassignment_plan(available_crews, ai_analysis, duty_violations,
+                                                               affected_flights, delays)
             
             result = {
                 "success": True,
@@ -52,7 +62,9 @@ class CrewSchedulingAgent(BaseAgent):
                 "disruption_id": disruption_id,
                 "flights_affected": len(affected_flights),
                 "crews_affected": crew_analysis["total_crews"],
+                "downstream_legs": downstream,
                 "duty_violations": len(duty_violations),
+                "duty_legality": duty_check,
                 "available_reserves": len(available_crews),
                 "reassignment_plan": reassignment_plan,
                 "ai_recommendations": ai_analysis,
@@ -79,7 +91,7 @@ class CrewSchedulingAgent(BaseAgent):
             disruption = mongo_db['disruptions'].find_one({'id': disruption_id})
             if not disruption:
                 return {"error": "Disruption not found"}
-            affected_flights = list(mongo_db['flights'].find({'id': {'$in': disruption.get('affected_flight_list', [])}}))
+            affected_flights = flight_repository.get_many(disruption.get('affected_flight_list', []))
             
             analysis = {
                 "crew_utilization": self._analyze_crew_utilization(affected_flights),
@@ -95,6 +107,17 @@ class CrewSchedulingAgent(BaseAgent):
             logging.error(f"Crew situation analysis error: {e}")
             return {"error": str(e)}
     
+    def prefetch_ai_analysis(self, disruption_id: int):
+        """Warm the crew scheduling AI prompt ahead of coordination (no messages sent)"""
+        disruption = mongo_db['disruptions'].find_one({'id': disruption_id})
+        if not disruption:
+            return None
+        affected_flights = flight_repository.get_many(disruption.get('affected_flight_list', []))
+        maintenance_messages = self._get_disruption_messages(disruption_id, sender_name="Aircraft Maintenance Agent",
+                                                             mark_processed=False)
+        maintenance_context = maintenance_messages[0] if maintenance_messages else {}
+        return self._get_ai_recommendations(disruption, affected_flights, maintenance_context)
+    
     def generate_recommendations(self, analysis: dict) -> list:
         """Generate crew scheduling recommendations"""
         recommendations = []
@@ -135,58 +158,69 @@ class CrewSchedulingAgent(BaseAgent):
         
         return recommendations
     
+    def _format_disruption_duration(self, disruption):
+        """Describe the expected disruption duration in hours"""
+        start = to_datetime(disruption.get('start_time'))
+        end = to_datetime(disruption.get('estimated_end_time'))
+        if not start or not end:
+            return 'Unknown'
+        return f"{(end - start).total_seconds() / 3600:.1f} hours"
+    
     def _analyze_crew_impact(self, affected_flights):
         """Analyze crew impact from affected flights"""
-        unique_crews = set()
-        for flight in affected_flights:
-            if flight.get('crew_list', []):
-                unique_crews.update(flight['crew_list'])
+        unique_crews = crew_roster.crew_ids_on(f.get('id') for f in affected_flights)
+        roles = [(crew_roster.crew(crew_id) or {}).get('role') for crew_id in unique_crews]
+        pilots = roles.count('pilot') if any(roles) else len(unique_crews) // 2  # Approximate without a roster
         
         return {
             "total_crews": len(unique_crews),
             "crew_types": {
-                "pilots": len(unique_crews) // 2,  # Approximate
-                "flight_attendants": len(unique_crews) - (len(unique_crews) // 2)
+                "pilots": pilots,
+                "flight_attendants": len(unique_crews) - pilots
             },
             "crew_bases": self._identify_crew_bases(affected_flights)
         }
     
-    def _check_duty_time_violations(self, affected_flights):
-        """Check for potential duty time violations"""
-        violations = []
-        
-        for flight in affected_flights:
-            if flight.get('delay_minutes', 0) and flight['delay_minutes'] > 120:  # 2+ hour delay
-                # Simulate duty time check (would integrate with crew management system)
-                violations.append({
-                    "flight": flight.get('flight_number', 'UNKNOWN'),
-                    "crew_id": flight['crew_list'][0] if flight['crew_list'] else "UNKNOWN",
-                    "violation_type": "potential_overtime", 
-                    "estimated_duty_time": "14+ hours",
-                    "action_required": "crew_substitution"
-                })
-        
-        return violations
+    def _analyze_downstream_legs(self, affected_flights, limit=20):
+        """Later legs flown by the crews of the affected flights, where their delay propagates next"""
+        affected_ids = {f.get('id') for f in affected_flights}
+        downstream = crew_roster.downstream_legs(affected_ids)
+        legs = {}
+        for crew_legs in downstream.values():
+            for leg in crew_legs:
+                if leg['flight_id'] not in affected_ids:
+                    legs.setdefault(leg['flight_id'], dict(leg, crews=0))['crews'] += 1
+        flights = sorted(legs.values(), key=lambda leg: leg['scheduled_departure'])
+        return {
+            "crews_with_later_legs": len(downstream),
+            "flights_at_risk": len(flights),
+            "flights": [{
+                "flight": leg['flight_number'],
+                "route": f"{leg['origin']}-{leg['destination']}",
+                "departure": leg['scheduled_departure'].isoformat(),
+                "crews": leg['crews']
+            } for leg in flights[:limit]]
+        }
+    
+    def _check_duty_legality(self, affected_flights, delays=None):
+        """FAR 117 legality and duty margin of every crew on the affected flights under the given delays"""
+        if delays is None:
+            delays = {f.get('id'): f.get('delay_minutes') or 0 for f in affected_flights}
+        try:
+            return crew_duty.current().check(delays)
+        except Exception as e:
+            logging.error(f"Crew duty legality check error: {e}")
+            return {"crews_checked": 0, "duty_periods_checked": 0, "illegal": 0, "at_risk": 0,
+                    "min_fdp_margin_minutes": None, "violations": [], "at_risk_crews": []}
+    
+    def _check_duty_time_violations(self, affected_flights, delays=None):
+        """Crews whose duty period becomes illegal once the delays are applied"""
+        return self._check_duty_legality(affected_flights, delays)["violations"]
     
     def _find_available_reserve_crews(self, affected_flights):
         """Find available reserve crews for substitution"""
-        # This would integrate with crew management system
-        affected_airports = set(f['origin'] for f in affected_flights)
-        
-        available_crews = []
-        for airport in affected_airports:
-            # Simulate reserve crew availability
-            available_crews.extend([
-                {
-                    "crew_id": f"RESERVE_{airport}_{i}",
-                    "base": airport,
-                    "qualification": "A320/A321",
-                    "availability": "immediate"
-                }
-                for i in range(1, 4)  # 3 reserve crews per airport
-            ])
-        
-        return available_crews
+        # Reserves at any base are candidates; the assignment solver weighs positioning
+        return crew_roster.reserves()
     
     def _get_ai_recommendations(self, disruption, affected_flights, maintenance_context):
         """Get AI-powered crew scheduling recommendations"""
@@ -195,7 +229,7 @@ class CrewSchedulingAgent(BaseAgent):
             Disruption: {disruption.get('type', 'Unknown')} - {disruption.get('severity', 'Unknown')}
             Affected Flights: {len(affected_flights)}
             Crews Affected: {self._analyze_crew_impact(affected_flights)['total_crews']}
-            Disruption Duration: {disruption.get('estimated_end_time', 'Unknown') - disruption.get('start_time', 'Unknown') if disruption.get('estimated_end_time') else 'Unknown'}
+            Disruption Duration: {self._format_disruption_duration(disruption)}
             Description: {disruption.get('description', 'Unknown')}
             Affected Crews: {len(affected_flights)}
             Maintenance Status: {maintenance_context.get('status', 'Unknown')}
@@ -225,10 +259,11 @@ class CrewSchedulingAgent(BaseAgent):
             logging.error(f"AI crew recommendations error: {e}")
             return {"error": "AI analysis unavailable"}
     
-    def _create_reassignment_plan(self, available_crews, ai_analysis):
+    def _create_reassignment_plan(self, available_crews, ai_analysis, duty_violations, affected_flights=(), delays=None):
         """Create comprehensive crew reassignment plan"""
-        # Get duty violations from the process_disruption method
-        duty_violations = self._check_duty_time_violations([])  # Will be populated by caller
+        # Cover each illegal duty with the cheapest qualified, duty-legal reserve
+        slots = self.reserve_solver.build_slots(duty_violations, {f.get('id'): f for f in affected_flights}, delays or {})
+        assignment = self.reserve_solver.assign(slots, available_crews)
         
         plan = {
             "immediate_actions": [
@@ -236,7 +271,9 @@ class CrewSchedulingAgent(BaseAgent):
                 "Position reserve crews to affected airports", 
                 "Coordinate with crew scheduling office"
             ],
-            "crew_assignments": [],
+            "crew_assignments": assignment["assignments"],
+            "unassigned_slots": assignment["unassigned"],
+            "assignment_cost": assignment["total_cost"],
             "timeline": {
                 "0-30min": "Assess all crew statuses",
                 "30-60min": "Execute crew substitutions",
@@ -244,21 +281,11 @@ class CrewSchedulingAgent(BaseAgent):
             },
             "resources_required": {
                 "reserve_crews": len(duty_violations),
-                "positioning_flights": len(available_crews),
+                "positioning_flights": sum(1 for a in assignment["assignments"] if a["positioning_minutes"]),
                 "crew_schedulers": 3
             }
         }
         
-        # Create specific crew assignments
-        for i, violation in enumerate(duty_violations):
-            if i < len(available_crews):
-                plan["crew_assignments"].append({
-                    "original_crew": violation["crew_id"],
-                    "replacement_crew": available_crews[i]["crew_id"],
-                    "flight": violation["flight"],
-                    "status": "assigned"
-                })
-        
         return plan
     
     def _check_regulatory_compliance(self, recovery_plan):
@@ -273,18 +300,20 @@ class CrewSchedulingAgent(BaseAgent):
     def _analyze_crew_utilization(self, affected_flights):
         """Analyze current crew utilization"""
         return {
-            "flights_per_crew": len(affected_flights) / max(1, len(set().union(*[f['crew_list'] for f in affected_flights if f['crew_list']]))),
+            "flights_per_crew": len(affected_flights) / max(1, len(crew_roster.crew_ids_on(f.get('id') for f in affected_flights))),
             "average_duty_day": "11.5 hours",
             "utilization_rate": "85%"
         }
     
     def _assess_duty_time_risk(self, affected_flights):
         """Assess duty time violation risk"""
-        delayed_flights = [f for f in affected_flights if f.get('delay_minutes', 0) and f['delay_minutes'] > 60]
+        duty_check = self._check_duty_legality(affected_flights)
         
         return {
-            "high_risk_crews": len(delayed_flights),
-            "moderate_risk_crews": len(affected_flights) - len(delayed_flights),
+            "high_risk_crews": duty_check["illegal"],
+            "moderate_risk_crews": duty_check["at_risk"],
+            "crews_checked": duty_check["crews_checked"],
+            "min_fdp_margin_minutes": duty_check["min_fdp_margin_minutes"],
             "risk_factors": ["Extended delays", "Multiple sectors", "Late night operations"]
         }
     
@@ -317,4 +346,7 @@ class CrewSchedulingAgent(BaseAgent):
     
     def _identify_crew_bases(self, affected_flights):
         """Identify crew home bases"""
-        return list(set(f['origin'] for f in affected_flights))
+        bases = {(crew_roster.crew(crew_id) or {}).get('base')
+                 for crew_id in crew_roster.crew_ids_on(f.get('id') for f in affected_flights)}
+        bases.discard(None)
+        return sorted(bases) if bases else list(set(f['origin'] for f in affected_flights))
@@ -1,5 +1,6 @@
 from .base_agent import BaseAgent
 from mongo_utils import mongo_db
+from services.flight_repository import flight_repository
 from services.gemini_service import GeminiService
 from datetime import datetime, timedelta
 import logging
@@ -25,13 +26,13 @@ class CustomerCommunicationAgent(BaseAgent):
             if not disruption:
                 return {"success": False, "error": "Disruption not found"}
             affected_flight_ids = disruption.get('affected_flight_list', [])
-            affected_flights = list(mongo_db['flights'].find({'id': {'$in': affected_flight_ids}}))
+            affected_flights = flight_repository.get_many(affected_flight_ids)
             
             # Get context from other agents
-            rebooking_messages = self._get_disruption_messages(disruption_id, sender_name="passenger_rebooking")
+            rebooking_messages = self._get_disruption_messages(disruption_id, sender_name="Passenger Rebooking Agent")
             rebooking_context = rebooking_messages[0] if rebooking_messages else {}
             
-            airport_messages = self._get_disruption_messages(disruption_id, sender_name="airport_resource")
+            airport_messages = self._get_disruption_messages(disruption_id, sender_name="Airport Resource Agent")
             airport_context = airport_messages[0] if airport_messages else {}
 
             # Calculate passenger impact
@@ -81,7 +82,7 @@ class CustomerCommunicationAgent(BaseAgent):
             disruption = mongo_db['disruptions'].find_one({'id': disruption_id})
             if not disruption:
                 return {"error": "Disruption not found"}
-            affected_flights = list(mongo_db['flights'].find({'id': {'$in': disruption.get('affected_flight_list', [])}}))
+            affected_flights = flight_repository.get_many(disruption.get('affected_flight_list', []))
             
             analysis = {
                 "communication_urgency": self._assess_communication_urgency(disruption, affected_flights),
@@ -97,6 +98,25 @@ class CustomerCommunicationAgent(BaseAgent):
             logging.error(f"Customer communication situation analysis error: {e}")
             return {"error": str(e)}
     
+    def prefetch_ai_analysis(self, disruption_id: int):
+        """Warm the customer communication AI prompts ahead of coordination (no messages sent)"""
+        disruption = mongo_db['disruptions'].find_one({'id': disruption_id})
+        if not disruption:
+            return None
+        affected_flights = flight_repository.get_many(disruption.get('affected_flight_list', []))
+        passenger_impact = self._calculate_passenger_impact(affected_flights)
+        rebooking_messages = self._get_disruption_messages(disruption_id, sender_name="Passenger Rebooking Agent",
+                                                           mark_processed=False)
+        airport_messages = self._get_disruption_messages(disruption_id, sender_name="Airport Resource Agent",
+                                                         mark_processed=False)
+        rebooking_context = rebooking_messages[0] if rebooking_messages else {}
+        airport_context = airport_messages[0] if airport_messages else {}
+        return {
+            "ai_drafts": self._get_ai_communication_drafts(disruption, passenger_impact["total_passengers"],
+                                                           rebooking_context, airport_context),
+            "ai_content": self._generate_ai_communication_content(disruption, passenger_impact)
+        }
+    
     def generate_recommendations(self, analysis: dict) -> list:
         """Generate customer communication recommendations"""
         recommendations = []
@@ -1,6 +1,11 @@
 from .base_agent import BaseAgent
 from mongo_utils import mongo_db
+from services.flight_repository import flight_repository
 from services.gemini_service import GeminiService
+from services.connection_graph import CONNECTING_SHARE, connection_graph
+from services.reallocation_engine import ReallocationEngine
+from services.route_index import route_index
+from services.date_utils import to_datetime, utcnow
 from datetime import datetime, timedelta
 import logging
 
@@ -17,6 +22,7 @@ class PassengerRebookingAgent(BaseAgent):
             "cost_analysis"
         ]
         self.gemini_service = GeminiService()
+        self.reallocation_engine = ReallocationEngine()
     
     def process_disruption(self, disruption_id: int) -> dict:
         """Process disruption for passenger rebooking (MongoDB)"""
@@ -26,12 +32,12 @@ class PassengerRebookingAgent(BaseAgent):
                 return {"success": False, "error": "Disruption not found"}
             
             # Get context from other agents
-            crew_messages = self._get_disruption_messages(disruption_id, sender_name="crew_scheduling")
+            crew_messages = self._get_disruption_messages(disruption_id, sender_name="Crew Scheduling Agent")
             crew_context = crew_messages[0] if crew_messages else {}
             
             # Get affected flights
             affected_flight_ids = disruption.get('affected_flight_list', [])
-            affected_flights = list(mongo_db['flights'].find({'id': {'$in': affected_flight_ids}}))
+            affected_flights = flight_repository.get_many(affected_flight_ids)
             
             # Analyze passenger impact
             total_passengers = sum(flight.get('passenger_count', 0) for flight in affected_flights)
@@ -39,11 +45,15 @@ class PassengerRebookingAgent(BaseAgent):
             # Find alternative flights
             alternatives = self._find_alternative_flights(affected_flights)
             
+            # Onward connections the expected delays will break
+            misconnects = self._assess_misconnects(disruption, affected_flights)
+            
             # Generate AI-powered recommendations
             ai_analysis = self._get_ai_recommendations(disruption, affected_flights, alternatives, crew_context)
             
             # Create rebooking plan
-            rebooking_plan = self._create_rebooking_plan(affected_flights, alternatives, ai_analysis)
+            rebooking_plan = self._create_rebooking_plan(affected_flights, alternatives, ai_analysis,
+                                                         misconnects.get("misconnecting_by_flight"))
             
             result = {
                 "success": True,
@@ -52,6 +62,7 @@ class PassengerRebookingAgent(BaseAgent):
                 "passengers_affected": total_passengers,
                 "flights_affected": len(affected_flights),
                 "alternatives_found": len(alternatives),
+                "misconnects": misconnects,
                 "rebooking_plan": rebooking_plan,
                 "ai_recommendations": ai_analysis,
                 "estimated_rebooking_time": "2-4 hours",
@@ -82,7 +93,7 @@ class PassengerRebookingAgent(BaseAgent):
                 return {"error": "Disruption not found"}
             
             # Get affected flights and passengers
-            affected_flights = list(mongo_db['flights'].find({'id': {'$in': disruption.get('affected_flight_list', [])}}))
+            affected_flights = flight_repository.get_many(disruption.get('affected_flight_list', []))
             
             analysis = {
                 "passenger_impact": {
@@ -101,6 +112,17 @@ class PassengerRebookingAgent(BaseAgent):
             logging.error(f"Situation analysis error: {e}")
             return {"error": str(e)}
     
+    def prefetch_ai_analysis(self, disruption_id: int):
+        """Warm the rebooking AI prompt ahead of coordination (no messages sent)"""
+        disruption = mongo_db['disruptions'].find_one({'id': disruption_id})
+        if not disruption:
+            return None
+        affected_flights = flight_repository.get_many(disruption.get('affected_flight_list', []))
+        alternatives = self._find_alternative_flights(affected_flights)
+        crew_messages = self._get_disruption_messages(disruption_id, sender_name="Crew Scheduling Agent", mark_processed=False)
+        crew_context = crew_messages[0] if crew_messages else {}
+        return self._get_ai_recommendations(disruption, affected_flights, alternatives, crew_context)
+    
     def generate_recommendations(self, analysis: dict) -> list:
         """Generate passenger rebooking recommendations"""
         recommendations = []
@@ -141,24 +163,20 @@ class PassengerRebookingAgent(BaseAgent):
     def _find_alternative_flights(self, affected_flights):
         """Find alternative flights for rebooking"""
         alternatives = []
+        # One pass over the in-memory route index instead of a query per affected flight
+        found = route_index.find_alternatives(affected_flights, window=timedelta(hours=24), limit=5)
         
         for flight in affected_flights:
-            # Look for flights on same route within next 24 hours
-            alternative_flights = list(mongo_db['flights'].find({
-                'origin': flight.get('origin', ''),
-                'destination': flight.get('destination', ''),
-                'scheduled_departure': {'$gte': flight.get('scheduled_departure', 0)},
-                'scheduled_departure': {'$lte': flight.get('scheduled_departure', 0) + 86400},
-                'status': 'scheduled',
-                'id': {'$ne': flight.get('id', '')}
-            }).limit(5))
-            
-            for alt_flight in alternative_flights:
+            departure = to_datetime(flight.get('scheduled_departure'))
+            if departure is None:
+                continue
+            for alt_flight in found.get(flight.get('id'), []):
+                alt_departure = to_datetime(alt_flight.get('scheduled_departure'))
                 alternatives.append({
                     "original_flight": flight.get('flight_number', ''),
                     "alternative_flight": alt_flight.get('flight_number', ''),
-                    "departure_time": alt_flight.get('scheduled_departure', ''),
-                    "delay_from_original": int((alt_flight.get('scheduled_departure', 0) - flight.get('scheduled_departure', 0)) / 60)
+                    "departure_time": alt_departure.isoformat() if alt_departure else '',
+                    "delay_from_original": int((alt_departure - departure).total_seconds() / 60) if alt_departure else None
                 })
         
         return alternatives
@@ -197,8 +215,11 @@ class PassengerRebookingAgent(BaseAgent):
             logging.error(f"AI recommendation error: {e}")
             return {"error": "AI analysis unavailable"}
     
-    def _create_rebooking_plan(self, affected_flights, alternatives, ai_analysis):
+    def _create_rebooking_plan(self, affected_flights, alternatives, ai_analysis, misconnecting=None):
         """Create comprehensive rebooking plan"""
+        # Passengers about to misconnect are rebooked ahead of point-to-point passengers
+        reallocation = self.reallocation_engine.reallocate(affected_flights, connecting=misconnecting)
+        totals = reallocation["totals"]
         plan = {
             "phases": [
                 {
@@ -217,6 +238,9 @@ class PassengerRebookingAgent(BaseAgent):
                     "actions": ["Process remaining passengers", "Offer accommodation if needed"]
                 }
             ],
+            "reallocation": reallocation,
+            "passengers_placed": totals["placed"],
+            "passengers_unplaced": totals["unplaced"],
             "resources_needed": {
                 "staff": 8,
                 "workstations": 6,
@@ -241,8 +265,27 @@ class PassengerRebookingAgent(BaseAgent):
         return priority_categories
     
     def _count_connecting_passengers(self, affected_flights):
-        """Estimate connecting passengers (would integrate with PNR system)"""
-        return sum(int((flight.get('passenger_count', 0) or 0) * 0.3) for flight in affected_flights)
+        """Estimate connecting passengers from the connection graph (would integrate with PNR system)"""
+        graph = connection_graph.current()
+        counts = graph.connecting_passengers(f.get('id') for f in affected_flights if f.get('id') in graph.index)
+        # Flights outside the graph's window fall back to the flat estimate
+        return sum(counts.get(flight.get('id'), int((flight.get('passenger_count', 0) or 0) * CONNECTING_SHARE))
+                   for flight in affected_flights)
+    
+    def _assess_misconnects(self, disruption, affected_flights):
+        """Onward flights and passengers whose connections break under the expected delays"""
+        try:
+            graph = connection_graph.current()
+            delays = self._expected_delays(disruption, affected_flights)
+            misconnects = graph.misconnects(delays, limit=10)
+            # Affected flights the graph covers but with no broken connections have no misconnecting passengers
+            for flight_id in delays:
+                if flight_id in graph.index:
+                    misconnects["misconnecting_by_flight"].setdefault(flight_id, 0)
+            return misconnects
+        except Exception as e:
+            logging.error(f"Misconnect assessment error: {e}")
+            return {}
     
     def _assess_rebooking_complexity(self, affected_flights):
         """Assess complexity of rebooking operation"""
@@ -257,9 +300,9 @@ class PassengerRebookingAgent(BaseAgent):
     
     def _assess_time_sensitivity(self, affected_flights):
         """Assess time sensitivity of rebooking"""
-        now = datetime.utcnow()
+        now = utcnow()
         urgent_flights = [f for f in affected_flights 
-                         if f.get('scheduled_departure', 0) <= now.timestamp()]
+                         if (to_datetime(f.get('scheduled_departure')) or now) <= now]
         
         if len(urgent_flights) > len(affected_flights) * 0.5:
             return "critical"
@@ -270,9 +313,18 @@ class PassengerRebookingAgent(BaseAgent):
     
     def _check_available_capacity(self, affected_flights):
         """Check available capacity on alternative flights"""
-        # This would integrate with inventory management system
-        return {
-            "same_day_availability": "Limited",
-            "next_day_availability": "Good", 
+        capacity = self.reallocation_engine.capacity_summary(affected_flights)
+        displaced = capacity["displaced_passengers"]
+        
+        def availability(seats):
+            if seats >= displaced:
+                return "Good"
+            return "Limited" if seats > 0 else "None"
+        
+        capacity.update({
+            "same_day_availability": availability(capacity["same_day_seats"]),
+            "next_day_availability": availability(capacity["same_day_seats"] + capacity["next_day_seats"]),
+            # Partner inventory isn't integrated yet
             "partner_airline_options": "Available"
-        }
+        })
+        return capacity
@@ -0,0 +1,22 @@
+"""Compact agent_communications older than the archive cutoff into per-disruption summaries.
+
+The app runs this periodically (COMMUNICATION_ARCHIVE_INTERVAL_MINUTES); use
+this script from cron when the background archiver is disabled.
+
+    python archive_communications.py [--older-than-hours 24] [--batch-size 1000] [--dry-run]
+"""
+import argparse
+from config import Config
+from services.communication_retention import CommunicationRetentionService
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive old agent communications into disruption summaries")
+    parser.add_argument('--older-than-hours', type=int, default=Config.COMMUNICATION_ARCHIVE_AFTER_HOURS)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--dry-run', action='store_true', help="count affected documents without writing")
+    args = parser.parse_args()
+
+    print(f"Archiving communications older than {args.older_than_hours}h{' (dry run)' if args.dry_run else ''}...")
+    result = CommunicationRetentionService(args.older_than_hours, args.batch_size).archive(args.dry_run)
+    print(f"agent_communications: {result['archived']} messages from {result['disruptions']} disruptions archived.")
+    print("Archive complete!")
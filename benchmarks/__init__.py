@@ -0,0 +1 @@
+# Benchmark fixtures and runners for IROPS query and agent performance
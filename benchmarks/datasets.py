@@ -0,0 +1,170 @@
+"""Dataset fixtures for benchmarks: DataSimulator data at 1k to 10M flights.
+
+benchmark_database() switches the process-wide client to a benchmark
+provider and database, loads a dataset and restores the previous provider
+afterwards. It never touches MONGODB_DATABASE:
+
+    with benchmark_database('local', '1m') as counts:
+        ...  # mongo_db, agents and services now see the loaded dataset
+
+The in-memory provider is only practical up to about 100k flights; use a
+local mongod for production-sized runs.
+"""
+import logging
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import Any, Callable, Dict, Optional
+from mongo_indexes import ensure_indexes
+from mongo_providers import get_provider
+from mongo_utils import client_factory, mongo_db
+from services.communication_store import CommunicationStore
+from services.connection_graph import connection_graph
+from services.crew_duty_engine import crew_duty
+from services.crew_roster import crew_roster
+from services.fleet_model import fleet
+from services.gate_allocation import gate_allocation
+from services.maintenance_scheduler import maintenance_scheduler
+from services.data_simulator import DataSimulator
+from services.date_utils import utcnow
+from services.flight_repository import flight_repository
+from services.route_index import route_index
+
+BENCHMARK_DATABASE = 'irops_benchmark'
+
+DATASET_SIZES = {
+    '1k': 1_000,
+    '10k': 10_000,
+    '100k': 100_000,
+    '1m': 1_000_000,
+    '10m': 10_000_000,
+}
+
+FLIGHT_DATE_FIELDS = ('scheduled_departure', 'scheduled_arrival', 'actual_departure', 'actual_arrival', 'updated_at')
+
+# Sender -> receiver/message pairs of the coordinator's communication flow
+COMMUNICATION_FLOWS = [
+    ("Aircraft Maintenance Agent", "Crew Scheduling Agent", "maintenance_status"),
+    ("Crew Scheduling Agent", "Passenger Rebooking Agent", "crew_availability"),
+    ("Passenger Rebooking Agent", "Customer Communication Agent", "rebooking_status"),
+    ("Airport Resource Agent", "Customer Communication Agent", "facility_status"),
+    ("Agent Coordinator", "System", "coordination_complete"),
+]
+
+def parse_size(value) -> int:
+    """Accept 10000, '10000', '10k', '1m' or a DATASET_SIZES key"""
+    if isinstance(value, int):
+        return value
+    text = str(value).strip().lower().replace('_', '')
+    if text in DATASET_SIZES:
+        return DATASET_SIZES[text]
+    multiplier = {'k': 1_000, 'm': 1_000_000}.get(text[-1:], 1)
+    try:
+        return int(float(text[:-1] if multiplier > 1 else text) * multiplier)
+    except ValueError:
+        raise ValueError(f"Invalid dataset size '{value}'; use a number or one of {', '.join(DATASET_SIZES)}")
+
+def reset_database():
+    """Drop every collection in the current database and forget cached flights and routes"""
+    for name in mongo_db.list_collection_names():
+        mongo_db[name].drop()
+    flight_repository.invalidate()
+    route_index.invalidate()
+    connection_graph.invalidate()
+    crew_duty.invalidate()
+    crew_roster.invalidate()
+    fleet.invalidate()
+    gate_allocation.invalidate()
+    maintenance_scheduler.reset()
+
+def load_flights(count: int, batch_size: int = 10_000, spread_days: int = 7,
+                 simulator: DataSimulator = None, progress: Callable[[int, int], None] = None) -> int:
+    """Insert count simulator flights in batches, spread over the preceding spread_days days"""
+    simulator = simulator or DataSimulator()
+    loaded = 0
+    while loaded < count:
+        batch = simulator.generate_realistic_flights(min(batch_size, count - loaded))
+        for doc in batch:
+            doc['flight_number'] = f"AO{100 + doc['id']}"
+            if spread_days > 1:
+                shift = timedelta(days=random.randrange(spread_days))
+                for field in FLIGHT_DATE_FIELDS:
+                    if doc.get(field):
+                        doc[field] -= shift
+        mongo_db['flights'].insert_many(batch, ordered=False)
+        loaded += len(batch)
+        if progress:
+            progress(loaded, count)
+    return loaded
+
+def load_crews(simulator: DataSimulator = None, batch_size: int = 10_000) -> int:
+    """Insert roster records for every crew member on the loaded flights, plus reserves"""
+    simulator = simulator or DataSimulator()
+    fields = {'_id': 0, 'origin': 1, 'aircraft_id': 1, 'crew_list': 1, 'scheduled_departure': 1}
+    crews = simulator.generate_crews(mongo_db['flights'].find({}, fields))
+    for start in range(0, len(crews), batch_size):
+        mongo_db['crews'].insert_many(crews[start:start + batch_size], ordered=False)
+    return len(crews)
+
+def load_disruptions(count: int, simulator: DataSimulator = None) -> int:
+    """Insert count simulator disruptions against the loaded flights"""
+    simulator = simulator or DataSimulator()
+    if count <= 0:
+        return 0
+    ids = simulator.sequences.reserve('disruptions', count)
+    disruptions = []
+    for disruption_id in ids:
+        doc = simulator.create_realistic_disruption_scenario()
+        doc.update({'id': disruption_id, 'created_at': utcnow()})
+        disruptions.append(doc)
+    mongo_db['disruptions'].insert_many(disruptions, ordered=False)
+    return len(disruptions)
+
+def load_communications(per_disruption: int = 5) -> int:
+    """Insert coordinator-style messages for every loaded disruption"""
+    store = CommunicationStore()
+    docs = []
+    for disruption in mongo_db['disruptions'].find({}, {'id': 1}):
+        for sender, receiver, message_type in COMMUNICATION_FLOWS[:per_disruption]:
+            docs.append(store.build(sender, receiver, message_type,
+                                    {'disruption_id': disruption['id'], 'status': 'completed'}, disruption['id']))
+    if docs:
+        mongo_db['agent_communications'].insert_many(docs, ordered=False)
+    return len(docs)
+
+def load_dataset(size, batch_size: int = 10_000, spread_days: int = 7, flights_per_disruption: int = 2_000,
+                 communications_per_disruption: int = 5, seed: Optional[int] = None,
+                 progress: Callable[[int, int], None] = None) -> Dict[str, Any]:
+    """Load flights, disruptions and communications into the current database"""
+    if seed is not None:
+        random.seed(seed)
+    flight_count = parse_size(size)
+    simulator = DataSimulator()
+    started = time.perf_counter()
+    counts = {'flights': load_flights(flight_count, batch_size, spread_days, simulator, progress)}
+    counts['crews'] = load_crews(simulator)
+    counts['disruptions'] = load_disruptions(max(5, flight_count // flights_per_disruption), simulator)
+    counts['communications'] = load_communications(communications_per_disruption)
+    counts['load_seconds'] = round(time.perf_counter() - started, 2)
+    logging.info(f"Loaded benchmark dataset: {counts}")
+    return counts
+
+@contextmanager
+def benchmark_database(provider='memory', size='10k', database: str = BENCHMARK_DATABASE, **load_options):
+    """Point mongo_db at a fresh benchmark database with a loaded dataset for the duration"""
+    previous_provider, previous_database = client_factory.provider, client_factory.database
+    provider = get_provider(provider) if isinstance(provider, str) else provider
+    client_factory.use_provider(provider, database)
+    try:
+        reset_database()
+        counts = load_dataset(size, **load_options)
+        # Building indexes after the bulk load is much faster than maintaining them during it
+        started = time.perf_counter()
+        ensure_indexes()
+        counts['index_seconds'] = round(time.perf_counter() - started, 2)
+        yield counts
+    finally:
+        reset_database()
+        client_factory.use_provider(previous_provider, previous_database)
+        flight_repository.invalidate()
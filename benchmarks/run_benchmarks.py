@@ -0,0 +1,122 @@
+"""Time hot queries (and optionally agents) against a loaded benchmark dataset.
+
+    python -m benchmarks.run_benchmarks --provider local --size 1m --repeat 50
+    python -m benchmarks.run_benchmarks --provider memory --size 10k --agents
+
+Providers: memory (needs mongomock), local (needs a mongod binary) or uri
+(MONGODB_URI; only the irops_benchmark database is written).
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from datetime import timedelta
+from typing import Callable, Dict, List
+from benchmarks.datasets import DATASET_SIZES, benchmark_database
+from mongo_utils import mongo_db
+from services.dashboard_service import DashboardService
+from services.date_utils import utcnow
+from services.flight_repository import flight_repository
+from services.pagination import keyset_page
+from services.reallocation_engine import ReallocationEngine
+from services.route_index import route_index
+
+def time_call(fn: Callable[[], object], repeat: int) -> Dict[str, float]:
+    """Run fn repeat times and summarize the wall-clock latency in milliseconds"""
+    samples: List[float] = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        'min_ms': round(samples[0], 3),
+        'median_ms': round(statistics.median(samples), 3),
+        'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+        'max_ms': round(samples[-1], 3)
+    }
+
+def query_benchmarks(flight_count: int) -> Dict[str, Callable[[], object]]:
+    """Named hot-path queries, parameterized with random ids and windows on each call"""
+    now = utcnow()
+    dashboard = DashboardService(cache_ttl_seconds=0)
+    reallocation = ReallocationEngine()
+
+    def random_ids(n):
+        return [random.randint(1, flight_count) for _ in range(n)]
+
+    def cold_get_many():
+        flight_repository.invalidate()
+        return flight_repository.get_many(random_ids(20))
+
+    def alternatives():
+        departure = now - timedelta(hours=random.randint(0, 72))
+        return list(mongo_db['flights'].find({
+            'origin': 'JFK', 'destination': 'LAX',
+            'scheduled_departure': {'$gte': departure, '$lte': departure + timedelta(hours=24)}
+        }).sort('scheduled_departure', 1).limit(10))
+
+    return {
+        'flight find_one by id': lambda: mongo_db['flights'].find_one({'id': random.randint(1, flight_count)}),
+        'flight_repository.get_many(20) cold': cold_get_many,
+        'flight_repository.get_many(20) warm': lambda: flight_repository.get_many(list(range(1, 21))),
+        'flights keyset page (status=delayed)': lambda: keyset_page(mongo_db['flights'], {'status': 'delayed'},
+                                                                    'scheduled_departure', limit=50),
+        'alternative flights JFK-LAX 24h': alternatives,
+        'route_index.find_alternatives(200)': lambda: route_index.find_alternatives(
+            mongo_db['flights'].find({'status': 'scheduled'}).limit(200)),
+        'reallocation_engine.reallocate(200)': lambda: reallocation.reallocate(
+            mongo_db['flights'].find({'status': 'scheduled'}).limit(200)),
+        'disruptions keyset page': lambda: keyset_page(mongo_db['disruptions'], {}, 'created_at', limit=50),
+        'communications for disruption': lambda: list(mongo_db['agent_communications'].find(
+            {'disruption_id': random.randint(1, 5)}).sort('timestamp', -1).limit(20)),
+        'dashboard aggregation': dashboard.get_dashboard_data,
+    }
+
+def agent_benchmarks() -> Dict[str, Callable[[], object]]:
+    """process_disruption for each agent on a random loaded disruption"""
+    from agents.agent_coordinator import AgentCoordinator
+    coordinator = AgentCoordinator()
+    coordinator.init_agents()
+    disruption_ids = [doc['id'] for doc in mongo_db['disruptions'].find({}, {'id': 1}).limit(100)]
+    return {
+        f"agent {name}.process_disruption": (lambda agent=agent: agent.process_disruption(random.choice(disruption_ids)))
+        for name, agent in coordinator.agents.items()
+    }
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark IROPS queries against a generated dataset")
+    parser.add_argument('--provider', choices=['memory', 'local', 'uri'], default='memory')
+    parser.add_argument('--size', default='10k', help=f"flights to load: a number or one of {', '.join(DATASET_SIZES)}")
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--batch-size', type=int, default=10_000)
+    parser.add_argument('--spread-days', type=int, default=7)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--agents', action='store_true', help="also time each agent's process_disruption")
+    args = parser.parse_args(argv)
+
+    def progress(loaded, total):
+        print(f"\r  loading flights: {loaded:,}/{total:,}", end='', flush=True)
+
+    print(f"Loading {args.size} dataset into the {args.provider} provider...")
+    with benchmark_database(args.provider, args.size, batch_size=args.batch_size, spread_days=args.spread_days,
+                            seed=args.seed, progress=progress) as counts:
+        print(f"\nLoaded {counts['flights']:,} flights, {counts['disruptions']:,} disruptions, "
+              f"{counts['communications']:,} communications in {counts['load_seconds']}s "
+              f"(indexes built in {counts['index_seconds']}s)")
+        benchmarks = query_benchmarks(counts['flights'])
+        if args.agents:
+            benchmarks.update(agent_benchmarks())
+        print(f"{'benchmark':<48}{'min':>10}{'median':>10}{'p95':>10}{'max':>10}  (ms, n={args.repeat})")
+        for name, fn in benchmarks.items():
+            try:
+                result = time_call(fn, args.repeat)
+            except Exception as e:
+                print(f"{name:<48}  unsupported on this provider: {e}")
+                continue
+            print(f"{name:<48}{result['min_ms']:>10}{result['median_ms']:>10}{result['p95_ms']:>10}{result['max_ms']:>10}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,6 +8,28 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', 'sqlite:///irops.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # MongoDB connection and pool (see mongo_utils.MongoClientFactory)
+    MONGODB_URI = os.getenv('MONGODB_URI', 'YOUR_MONGODB_CONNECTION_STRING_HERE')
+    MONGODB_DATABASE = os.getenv('MONGODB_DATABASE', 'irops')
+    MONGODB_APP_NAME = os.getenv('MONGODB_APP_NAME', 'flight-fixer')
+    MONGODB_MAX_POOL_SIZE = int(os.getenv('MONGODB_MAX_POOL_SIZE', '100'))
+    MONGODB_MIN_POOL_SIZE = int(os.getenv('MONGODB_MIN_POOL_SIZE', '0'))
+    MONGODB_MAX_IDLE_TIME_MS = os.getenv('MONGODB_MAX_IDLE_TIME_MS', '')
+    MONGODB_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv('MONGODB_WAIT_QUEUE_TIMEOUT_MS', '10000'))
+    MONGODB_CONNECT_TIMEOUT_MS = int(os.getenv('MONGODB_CONNECT_TIMEOUT_MS', '20000'))
+    MONGODB_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv('MONGODB_SERVER_SELECTION_TIMEOUT_MS', '30000'))
+    MONGODB_SOCKET_TIMEOUT_MS = os.getenv('MONGODB_SOCKET_TIMEOUT_MS', '')
+    MONGODB_READ_PREFERENCE = os.getenv('MONGODB_READ_PREFERENCE', 'primary')
+    MONGODB_WRITE_CONCERN = os.getenv('MONGODB_WRITE_CONCERN', '')
+    MONGODB_RETRY_WRITES = os.getenv('MONGODB_RETRY_WRITES', 'True').lower() == 'true'
+    # Where the client connects: 'uri' (MONGODB_URI), 'local' (throwaway mongod in a temp dir)
+    # or 'memory' (in-process stand-in, needs mongomock); see mongo_providers.py
+    MONGODB_PROVIDER = os.getenv('MONGODB_PROVIDER', 'uri')
+    MONGOD_BINARY = os.getenv('MONGOD_BINARY', 'mongod')
+    MONGOD_PORT = int(os.getenv('MONGOD_PORT', '0'))  # 0 picks a free port
+    MONGOD_REPLICA_SET = os.getenv('MONGOD_REPLICA_SET', '')  # e.g. 'rs0' for change streams
+    MONGOD_STARTUP_TIMEOUT_SECONDS = int(os.getenv('MONGOD_STARTUP_TIMEOUT_SECONDS', '30'))
+    
     # Gemini AI Configuration
     GEMINI_API_KEY = os.getenv('GEMINI_API_KEY', 'YOUR_GEMINI_API_KEY_HERE')
     GEMINI_MODEL_NAME = os.getenv('GEMINI_MODEL_NAME', 'gemini-2.0-flash-exp')
@@ -19,6 +41,104 @@ class Config:
     # API Rate Limiting
     GEMINI_RATE_LIMIT_PER_MINUTE = int(os.getenv('GEMINI_RATE_LIMIT_PER_MINUTE', '10'))
     GEMINI_RETRY_DELAY_SECONDS = int(os.getenv('GEMINI_RETRY_DELAY_SECONDS', '10'))
+    GEMINI_INTERACTIVE_RESERVE_PER_MINUTE = int(os.getenv('GEMINI_INTERACTIVE_RESERVE_PER_MINUTE', '3'))
+
+    # Gemini response cache
+    GEMINI_CACHE_TTL_SECONDS = int(os.getenv('GEMINI_CACHE_TTL_SECONDS', '900'))
+    GEMINI_CACHE_MAX_ENTRIES = int(os.getenv('GEMINI_CACHE_MAX_ENTRIES', '512'))
+
+    # Disruption prefetch (background warming of assessment and LLM caches)
+    PREFETCH_ENABLED = os.getenv('PREFETCH_ENABLED', 'True').lower() == 'true'
+    PREFETCH_WORKERS = int(os.getenv('PREFETCH_WORKERS', '1'))
+    PREFETCH_ASSESSMENT_TTL_SECONDS = int(os.getenv('PREFETCH_ASSESSMENT_TTL_SECONDS', '600'))
+    PREFETCH_RATE_LIMIT_WAIT_SECONDS = int(os.getenv('PREFETCH_RATE_LIMIT_WAIT_SECONDS', '60'))
+
+    # Indexes (see mongo_indexes.py)
+    ENSURE_INDEXES_ON_STARTUP = os.getenv('ENSURE_INDEXES_ON_STARTUP', 'True').lower() == 'true'
+
+    # Flight read-through cache (see services/flight_repository.py)
+    FLIGHT_CACHE_ENABLED = os.getenv('FLIGHT_CACHE_ENABLED', 'True').lower() == 'true'
+    FLIGHT_CACHE_MAX_ENTRIES = int(os.getenv('FLIGHT_CACHE_MAX_ENTRIES', '5000'))
+    FLIGHT_CACHE_TTL_SECONDS = int(os.getenv('FLIGHT_CACHE_TTL_SECONDS', '300'))
+    FLIGHT_CACHE_POLL_SECONDS = int(os.getenv('FLIGHT_CACHE_POLL_SECONDS', '5'))
+
+    # Route schedule index for alternative flights (see services/route_index.py)
+    ROUTE_INDEX_ENABLED = os.getenv('ROUTE_INDEX_ENABLED', 'True').lower() == 'true'
+    ROUTE_INDEX_REFRESH_SECONDS = int(os.getenv('ROUTE_INDEX_REFRESH_SECONDS', '5'))
+    ROUTE_INDEX_REBUILD_SECONDS = int(os.getenv('ROUTE_INDEX_REBUILD_SECONDS', '900'))
+
+    # Crew roster index (see services/crew_roster.py)
+    CREW_ROSTER_ENABLED = os.getenv('CREW_ROSTER_ENABLED', 'True').lower() == 'true'
+    CREW_ROSTER_REFRESH_SECONDS = int(os.getenv('CREW_ROSTER_REFRESH_SECONDS', '5'))
+    CREW_ROSTER_REBUILD_SECONDS = int(os.getenv('CREW_ROSTER_REBUILD_SECONDS', '900'))
+
+    # Passenger reallocation (see services/reallocation_engine.py)
+    REALLOCATION_WINDOW_HOURS = int(os.getenv('REALLOCATION_WINDOW_HOURS', '24'))
+    REALLOCATION_MAX_ALTERNATIVES = int(os.getenv('REALLOCATION_MAX_ALTERNATIVES', '10'))
+    REALLOCATION_EXACT_MAX_EDGES = int(os.getenv('REALLOCATION_EXACT_MAX_EDGES', '500'))  # larger problems use the greedy solver
+
+    # Connection graph for misconnect impact (see services/connection_graph.py)
+    CONNECTION_MCT_DOMESTIC_MINUTES = int(os.getenv('CONNECTION_MCT_DOMESTIC_MINUTES', '45'))
+    CONNECTION_MCT_INTERNATIONAL_MINUTES = int(os.getenv('CONNECTION_MCT_INTERNATIONAL_MINUTES', '90'))
+    CONNECTION_MAX_MINUTES = int(os.getenv('CONNECTION_MAX_MINUTES', '360'))
+    CONNECTION_GRAPH_LOOKBACK_HOURS = int(os.getenv('CONNECTION_GRAPH_LOOKBACK_HOURS', '12'))
+    CONNECTION_GRAPH_HORIZON_HOURS = int(os.getenv('CONNECTION_GRAPH_HORIZON_HOURS', '36'))
+    CONNECTION_GRAPH_TTL_SECONDS = int(os.getenv('CONNECTION_GRAPH_TTL_SECONDS', '300'))
+
+    # Crew duty legality, FAR 117 (see services/crew_duty_engine.py)
+    CREW_REPORT_MINUTES = int(os.getenv('CREW_REPORT_MINUTES', '60'))
+    CREW_MIN_REST_MINUTES = int(os.getenv('CREW_MIN_REST_MINUTES', '600'))
+    CREW_DUTY_AT_RISK_MINUTES = int(os.getenv('CREW_DUTY_AT_RISK_MINUTES', '60'))
+    CREW_DUTY_LOOKBACK_HOURS = int(os.getenv('CREW_DUTY_LOOKBACK_HOURS', '36'))
+    CREW_DUTY_HORIZON_HOURS = int(os.getenv('CREW_DUTY_HORIZON_HOURS', '36'))
+    CREW_DUTY_TTL_SECONDS = int(os.getenv('CREW_DUTY_TTL_SECONDS', '300'))
+    RESERVE_CANDIDATES_PER_SLOT = int(os.getenv('RESERVE_CANDIDATES_PER_SLOT', '25'))
+
+    # Fleet rotations and aircraft swaps (see services/fleet_model.py)
+    FLEET_MIN_TURN_MINUTES = int(os.getenv('FLEET_MIN_TURN_MINUTES', '45'))
+    FLEET_SWAP_WINDOW_MINUTES = int(os.getenv('FLEET_SWAP_WINDOW_MINUTES', '180'))
+    FLEET_SWAP_CANDIDATES = int(os.getenv('FLEET_SWAP_CANDIDATES', '10'))
+    FLEET_MODEL_LOOKBACK_HOURS = int(os.getenv('FLEET_MODEL_LOOKBACK_HOURS', '24'))
+    FLEET_MODEL_HORIZON_HOURS = int(os.getenv('FLEET_MODEL_HORIZON_HOURS', '48'))
+    FLEET_MODEL_TTL_SECONDS = int(os.getenv('FLEET_MODEL_TTL_SECONDS', '300'))
+
+    # Gate and remote stand allocation (see services/gate_allocation.py)
+    GATES_PER_MAJOR_HUB = int(os.getenv('GATES_PER_MAJOR_HUB', '30'))
+    GATES_PER_INTERNATIONAL_HUB = int(os.getenv('GATES_PER_INTERNATIONAL_HUB', '12'))
+    REMOTE_STANDS_PER_AIRPORT = int(os.getenv('REMOTE_STANDS_PER_AIRPORT', '12'))
+    GATE_BUFFER_MINUTES = int(os.getenv('GATE_BUFFER_MINUTES', '10'))
+    GATE_DEPARTURE_MINUTES = int(os.getenv('GATE_DEPARTURE_MINUTES', '50'))  # on the gate before pushback
+    GATE_ARRIVAL_MINUTES = int(os.getenv('GATE_ARRIVAL_MINUTES', '30'))  # on the gate after block-in
+    GATE_PLAN_LOOKBACK_HOURS = int(os.getenv('GATE_PLAN_LOOKBACK_HOURS', '24'))
+    GATE_PLAN_HORIZON_HOURS = int(os.getenv('GATE_PLAN_HORIZON_HOURS', '48'))
+    GATE_PLAN_TTL_SECONDS = int(os.getenv('GATE_PLAN_TTL_SECONDS', '300'))
+
+    # Ground equipment and staff pools (see services/ground_resources.py)
+    GROUND_POOL_BUCKET_MINUTES = int(os.getenv('GROUND_POOL_BUCKET_MINUTES', '15'))
+    GROUND_POOL_HORIZON_HOURS = int(os.getenv('GROUND_POOL_HORIZON_HOURS', '48'))
+
+    # Maintenance task scheduling (see services/maintenance_scheduler.py)
+    MAINTENANCE_TECHNICIANS_PER_AIRPORT = int(os.getenv('MAINTENANCE_TECHNICIANS_PER_AIRPORT', '12'))
+    MAINTENANCE_HANGAR_BAYS_PER_AIRPORT = int(os.getenv('MAINTENANCE_HANGAR_BAYS_PER_AIRPORT', '6'))
+
+    # agent_communications retention (see services/communication_retention.py)
+    COMMUNICATION_LIVE_WINDOW_HOURS = int(os.getenv('COMMUNICATION_LIVE_WINDOW_HOURS', '24'))
+    COMMUNICATION_ARCHIVE_AFTER_HOURS = int(os.getenv('COMMUNICATION_ARCHIVE_AFTER_HOURS', '24'))
+    COMMUNICATION_ARCHIVE_INTERVAL_MINUTES = int(os.getenv('COMMUNICATION_ARCHIVE_INTERVAL_MINUTES', '60'))
+    COMMUNICATION_TTL_DAYS = int(os.getenv('COMMUNICATION_TTL_DAYS', '7'))  # 0 keeps raw chatter forever
+
+    # Agent status history (see services/agent_status_history.py)
+    AGENT_STATUS_HISTORY_ENABLED = os.getenv('AGENT_STATUS_HISTORY_ENABLED', 'True').lower() == 'true'
+    AGENT_STATUS_HISTORY_RETENTION_DAYS = int(os.getenv('AGENT_STATUS_HISTORY_RETENTION_DAYS', '30'))
+    AGENT_STATUS_ROLLUP_RETENTION_DAYS = int(os.getenv('AGENT_STATUS_ROLLUP_RETENTION_DAYS', '90'))
+    AGENT_PERFORMANCE_WINDOW_MINUTES = int(os.getenv('AGENT_PERFORMANCE_WINDOW_MINUTES', '1440'))
+
+    # Unit of work (see services/unit_of_work.py): batch a request's/coordination's writes into bulk_writes
+    UNIT_OF_WORK_ENABLED = os.getenv('UNIT_OF_WORK_ENABLED', 'True').lower() == 'true'
+    UNIT_OF_WORK_WRITE_CONCERN = os.getenv('UNIT_OF_WORK_WRITE_CONCERN', '')  # e.g. 'majority' or '1'; empty = client default
+
+    # Dashboard
+    DASHBOARD_CACHE_TTL_SECONDS = int(os.getenv('DASHBOARD_CACHE_TTL_SECONDS', '15'))
     
     # Logging
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
@@ -0,0 +1,20 @@
+"""One-shot migration: store agent_communications.content as embedded documents.
+
+Rows written before schema_version 2 hold content as a JSON string. This
+rewrites them in _id-ordered batches and is safe to re-run or resume.
+
+    python migrate_communications_content.py [--batch-size 1000] [--dry-run]
+"""
+import argparse
+from services.communication_store import migrate_legacy_content
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert JSON string communication content to subdocuments")
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--dry-run', action='store_true', help="count affected documents without writing")
+    args = parser.parse_args()
+
+    print(f"Converting communication content to embedded documents{' (dry run)' if args.dry_run else ''}...")
+    result = migrate_legacy_content(args.batch_size, args.dry_run)
+    print(f"agent_communications: {result['updated']} of {result['scanned']} legacy documents converted.")
+    print("Migration complete!")
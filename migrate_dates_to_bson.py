@@ -0,0 +1,52 @@
+"""One-shot migration: convert ISO-8601 string timestamps to native BSON dates.
+
+Walks each collection in _id order, batch by batch, and rewrites only the
+documents that still hold string dates, so it is safe to re-run or resume.
+
+    python migrate_dates_to_bson.py [--batch-size 1000] [--dry-run]
+"""
+import argparse
+from pymongo import UpdateOne
+from mongo_utils import mongo_db
+from services.date_utils import DATE_FIELDS, to_datetime
+
+def migrate_collection(name, fields, batch_size=1000, dry_run=False):
+    """Convert one collection's string date fields; returns (scanned, updated)"""
+    string_dates = {'$or': [{field: {'$type': 'string'}} for field in fields]}
+    projection = {field: 1 for field in fields}
+    scanned = updated = 0
+    last_id = None
+    while True:
+        query = string_dates if last_id is None else {'$and': [string_dates, {'_id': {'$gt': last_id}}]}
+        batch = list(mongo_db[name].find(query, projection).sort('_id', 1).limit(batch_size))
+        if not batch:
+            break
+        last_id = batch[-1]['_id']
+        operations = []
+        for doc in batch:
+            changes = {}
+            for field in fields:
+                value = doc.get(field)
+                if isinstance(value, str):
+                    parsed = to_datetime(value)
+                    if parsed is not None:
+                        changes[field] = parsed
+            if changes:
+                operations.append(UpdateOne({'_id': doc['_id']}, {'$set': changes}))
+        scanned += len(batch)
+        if operations and not dry_run:
+            mongo_db[name].bulk_write(operations, ordered=False)
+        updated += len(operations)
+    return scanned, updated
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert ISO string timestamps to BSON dates")
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--dry-run', action='store_true', help="count affected documents without writing")
+    args = parser.parse_args()
+
+    print(f"Converting string timestamps to BSON dates{' (dry run)' if args.dry_run else ''}...")
+    for name, fields in DATE_FIELDS.items():
+        scanned, updated = migrate_collection(name, fields, args.batch_size, args.dry_run)
+        print(f"{name}: {updated} of {scanned} documents with string dates converted.")
+    print("Migration complete!")
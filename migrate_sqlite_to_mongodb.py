@@ -1,17 +1,13 @@
 import os
 import sys
-from pymongo.mongo_client import MongoClient
-from pymongo.server_api import ServerApi
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from models import Flight, Disruption, Agent, AgentCommunication, Scenario
 import json
 from datetime import datetime
 
-# MongoDB connection
-uri = os.getenv('MONGODB_URI', 'YOUR_MONGODB_CONNECTION_STRING_HERE')
-client = MongoClient(uri, server_api=ServerApi('1'))
-mongo_db = client['irops']
+# MongoDB connection (pool, timeouts and write concern from Config)
+from mongo_utils import mongo_db
 
 # SQLite connection
 engine = create_engine('sqlite:///irops.db')
@@ -4,6 +4,7 @@
 from datetime import datetime
 from enum import Enum
 import json
+import math
 
 class DisruptionType(Enum):
     WEATHER = "weather"
@@ -25,6 +26,50 @@ class AgentType(Enum):
     AIRPORT_RESOURCE = "airport_resource"
     CUSTOMER_COMMUNICATION = "customer_communication"
 
+# Airports served, with standard-time UTC offsets and coordinates. International
+# gateways need longer minimum connect times.
+AIRPORTS = {
+    "JFK": {"name": "John F. Kennedy International", "hub": "major", "region": "northeast", "utc_offset": -5, "lat": 40.64, "lon": -73.78},
+    "LAX": {"name": "Los Angeles International", "hub": "major", "region": "west", "utc_offset": -8, "lat": 33.94, "lon": -118.41},
+    "ORD": {"name": "O'Hare International", "hub": "major", "region": "midwest", "utc_offset": -6, "lat": 41.98, "lon": -87.9},
+    "DFW": {"name": "Dallas/Fort Worth International", "hub": "major", "region": "south", "utc_offset": -6, "lat": 32.9, "lon": -97.04},
+    "ATL": {"name": "Hartsfield-Jackson Atlanta", "hub": "major", "region": "southeast", "utc_offset": -5, "lat": 33.64, "lon": -84.43},
+    "LHR": {"name": "London Heathrow", "hub": "international", "region": "europe", "utc_offset": 0, "lat": 51.47, "lon": -0.45},
+    "CDG": {"name": "Charles de Gaulle", "hub": "international", "region": "europe", "utc_offset": 1, "lat": 49.01, "lon": 2.55},
+    "NRT": {"name": "Narita International", "hub": "international", "region": "asia", "utc_offset": 9, "lat": 35.77, "lon": 140.39},
+    "SIN": {"name": "Singapore Changi", "hub": "international", "region": "asia", "utc_offset": 8, "lat": 1.36, "lon": 103.99},
+    "DXB": {"name": "Dubai International", "hub": "international", "region": "middle_east", "utc_offset": 4, "lat": 25.25, "lon": 55.36}
+}
+
+# Aircraft types flown, with seat capacity. aircraft_id is "<type>-<tail>".
+AIRCRAFT_TYPES = {
+    "B737": {"name": "Boeing 737", "capacity": 180, "range": "domestic"},
+    "B787": {"name": "Boeing 787 Dreamliner", "capacity": 250, "range": "international"},
+    "A320": {"name": "Airbus A320", "capacity": 160, "range": "domestic"},
+    "A350": {"name": "Airbus A350", "capacity": 300, "range": "international"},
+    "B777": {"name": "Boeing 777", "capacity": 350, "range": "international"},
+    "E190": {"name": "Embraer E190", "capacity": 100, "range": "regional"}
+}
+
+def airport_distance_km(origin: str, destination: str) -> float:
+    """Great-circle distance between two airports in AIRPORTS"""
+    if origin == destination:
+        return 0.0
+    a, b = AIRPORTS[origin], AIRPORTS[destination]
+    lat1, lat2 = math.radians(a["lat"]), math.radians(b["lat"])
+    dlat, dlon = lat2 - lat1, math.radians(b["lon"] - a["lon"])
+    h = math.sin(dlat / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2) ** 2
+    return 2 * 6371 * math.asin(math.sqrt(h))
+
+def seat_capacity(flight: dict) -> int:
+    """Seats on a flight: its seat_capacity, else its aircraft type's capacity, else its load"""
+    if flight.get('seat_capacity'):
+        return int(flight['seat_capacity'])
+    aircraft_type = str(flight.get('aircraft_id') or '').split('-')[0]
+    if aircraft_type in AIRCRAFT_TYPES:
+        return AIRCRAFT_TYPES[aircraft_type]["capacity"]
+    return int(flight.get('passenger_count') or 0)
+
 class Flight:
     __tablename__ = 'flights'
     
@@ -0,0 +1,223 @@
+"""Index declarations for the irops database.
+
+Run directly to create the indexes, or with --check to explain() the hot
+queries and fail if any of them falls back to a collection scan:
+
+    python mongo_indexes.py
+    python mongo_indexes.py --check
+"""
+import argparse
+import logging
+import sys
+from datetime import datetime
+from typing import Any, Dict, List
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+from config import Config
+from mongo_utils import mongo_db
+
+# Raw agent chatter expires on its BSON timestamp; 0 disables expiry
+COMMUNICATION_TTL = {'expireAfterSeconds': Config.COMMUNICATION_TTL_DAYS * 86400} if Config.COMMUNICATION_TTL_DAYS > 0 else {}
+
+# Collections that must be created as time-series collections before anything writes to them
+TIMESERIES_COLLECTIONS = {
+    'agent_status_history': {
+        'timeseries': {'timeField': 'timestamp', 'metaField': 'agent', 'granularity': 'seconds'},
+        'expireAfterSeconds': Config.AGENT_STATUS_HISTORY_RETENTION_DAYS * 86400
+    },
+}
+
+# Collection -> indexes every hot path relies on. Names are explicit so
+# re-running is a no-op rather than a conflict.
+INDEXES = {
+    'flights': [
+        IndexModel([('id', ASCENDING)], name='id_unique', unique=True),
+        IndexModel([('scheduled_departure', DESCENDING), ('id', DESCENDING)], name='scheduled_departure_id'),
+        IndexModel([('status', ASCENDING), ('scheduled_departure', DESCENDING), ('id', DESCENDING)],
+                   name='status_scheduled_departure_id'),
+        IndexModel([('origin', ASCENDING), ('destination', ASCENDING), ('scheduled_departure', DESCENDING)],
+                   name='origin_destination_scheduled_departure'),
+        IndexModel([('updated_at', ASCENDING)], name='updated_at'),
+        IndexModel([('crew_list', ASCENDING), ('scheduled_departure', ASCENDING)], name='crew_list_scheduled_departure'),
+    ],
+    'crews': [
+        IndexModel([('crew_id', ASCENDING)], name='crew_id_unique', unique=True),
+        IndexModel([('status', ASCENDING), ('base', ASCENDING)], name='status_base'),
+        IndexModel([('updated_at', ASCENDING)], name='updated_at'),
+    ],
+    'disruptions': [
+        IndexModel([('id', ASCENDING)], name='id_unique', unique=True),
+        IndexModel([('created_at', DESCENDING), ('id', DESCENDING)], name='created_at_id'),
+        IndexModel([('status', ASCENDING), ('created_at', DESCENDING), ('id', DESCENDING)],
+                   name='status_created_at_id'),
+    ],
+    'agent_communications': [
+        IndexModel([('disruption_id', ASCENDING), ('timestamp', ASCENDING)], name='disruption_id_timestamp'),
+        IndexModel([('receiver', ASCENDING), ('processed', ASCENDING), ('timestamp', ASCENDING)],
+                   name='receiver_processed_timestamp'),
+        IndexModel([('receiver', ASCENDING), ('disruption_id', ASCENDING), ('timestamp', ASCENDING)],
+                   name='receiver_disruption_id_timestamp'),
+        IndexModel([('timestamp', DESCENDING)], name='timestamp', **COMMUNICATION_TTL),
+        IndexModel([('id', ASCENDING)], name='id'),
+    ],
+    'agents': [
+        IndexModel([('name', ASCENDING)], name='name_unique', unique=True),
+    ],
+    'scenarios': [
+        IndexModel([('id', ASCENDING)], name='id_unique', unique=True),
+        IndexModel([('created_at', DESCENDING), ('id', DESCENDING)], name='created_at_id'),
+        IndexModel([('status', ASCENDING), ('created_at', DESCENDING), ('id', DESCENDING)],
+                   name='status_created_at_id'),
+    ],
+    'communication_summaries': [
+        IndexModel([('disruption_id', ASCENDING)], name='disruption_id_unique', unique=True),
+    ],
+    'agent_status_history': [
+        IndexModel([('agent', ASCENDING), ('timestamp', DESCENDING)], name='agent_timestamp'),
+    ],
+    'agent_status_rollups': [
+        IndexModel([('agent', ASCENDING), ('minute', ASCENDING)], name='agent_minute_unique', unique=True),
+        IndexModel([('minute', ASCENDING)], name='minute_ttl',
+                   expireAfterSeconds=Config.AGENT_STATUS_ROLLUP_RETENTION_DAYS * 86400),
+    ],
+    'agent_comm_stats': [
+        IndexModel([('agent', ASCENDING)], name='agent_unique', unique=True),
+    ],
+}
+
+# Representative hot queries: (collection, filter, sort). Values only need the right type.
+HOT_QUERIES = [
+    ('flights', {'id': 1}, None),
+    ('flights', {'id': {'$in': [1, 2, 3]}}, None),
+    ('flights', {'scheduled_departure': {'$gte': datetime(2024, 1, 1), '$lt': datetime(2024, 1, 2)}}, None),
+    ('flights', {'status': 'delayed'}, [('scheduled_departure', DESCENDING), ('id', DESCENDING)]),
+    ('flights', {'origin': 'JFK', 'destination': 'LAX'}, [('scheduled_departure', DESCENDING)]),
+    ('flights', {}, [('scheduled_departure', DESCENDING), ('id', DESCENDING)]),
+    ('flights', {'crew_list': 'CREW_1000'}, [('scheduled_departure', ASCENDING)]),
+    ('crews', {'crew_id': 'CREW_1000'}, None),
+    ('crews', {'status': 'reserve', 'base': {'$in': ['JFK']}}, None),
+    ('disruptions', {'id': 1}, None),
+    ('disruptions', {'status': 'active'}, [('created_at', DESCENDING), ('id', DESCENDING)]),
+    ('disruptions', {}, [('created_at', DESCENDING), ('id', DESCENDING)]),
+    ('agent_communications', {'disruption_id': 1}, [('timestamp', DESCENDING)]),
+    ('agent_communications', {'receiver': 'Crew Scheduling Agent', 'processed': False}, [('timestamp', ASCENDING)]),
+    ('agent_communications', {'receiver': 'Crew Scheduling Agent', 'disruption_id': 1}, [('timestamp', ASCENDING)]),
+    ('agent_communications', {'timestamp': {'$gte': datetime(2024, 1, 1)}}, [('timestamp', DESCENDING)]),
+    ('agent_communications', {'receiver': 'Crew Scheduling Agent', 'processed': False,
+                              'timestamp': {'$gte': datetime(2024, 1, 1)}}, [('timestamp', ASCENDING)]),
+    ('communication_summaries', {'disruption_id': 1}, None),
+    ('agents', {'name': 'Crew Scheduling Agent'}, None),
+    ('scenarios', {'id': 1}, None),
+    ('scenarios', {}, [('created_at', DESCENDING), ('id', DESCENDING)]),
+    ('agent_comm_stats', {'agent': 'Crew Scheduling Agent'}, None),
+    ('agent_status_history', {'agent': 'Crew Scheduling Agent'}, [('timestamp', DESCENDING)]),
+    ('agent_status_rollups', {'minute': {'$gte': datetime(2024, 1, 1)}}, None),
+    ('agent_status_rollups', {'agent': 'Crew Scheduling Agent', 'minute': {'$gte': datetime(2024, 1, 1)}},
+     [('minute', ASCENDING)]),
+]
+
+def _sync_ttl(db, collection: str, indexes: List[IndexModel]):
+    """Apply a changed expireAfterSeconds to an existing index with collMod instead of failing on the conflict"""
+    existing = db[collection].index_information()
+    for index in indexes:
+        name = index.document['name']
+        expire = index.document.get('expireAfterSeconds')
+        if name not in existing or existing[name].get('expireAfterSeconds') == expire:
+            continue
+        if expire is None:
+            logging.warning(f"Index {name} on {collection} still has a TTL; drop it to disable expiry")
+            continue
+        db.command('collMod', collection, index={'name': name, 'expireAfterSeconds': expire})
+        logging.info(f"Set TTL of {collection}.{name} to {expire}s")
+
+def ensure_timeseries_collections(db=None):
+    """Create the declared time-series collections that don't exist yet"""
+    db = db if db is not None else mongo_db
+    existing = set(db.list_collection_names())
+    for collection, options in TIMESERIES_COLLECTIONS.items():
+        if collection in existing:
+            continue
+        try:
+            db.create_collection(collection, **options)
+            logging.info(f"Created time-series collection {collection}")
+        except Exception as e:
+            # Servers before 5.0 (and in-memory stand-ins) get a regular collection on first insert
+            logging.error(f"Error creating time-series collection {collection}: {e}")
+
+def ensure_indexes(db=None) -> Dict[str, List[str]]:
+    """Create all declared indexes; existing identical indexes are left alone"""
+    db = db if db is not None else mongo_db
+    ensure_timeseries_collections(db)
+    created = {}
+    for collection, indexes in INDEXES.items():
+        try:
+            _sync_ttl(db, collection, indexes)
+        except OperationFailure as e:
+            logging.error(f"Error updating TTL indexes on {collection}: {e}")
+        try:
+            created[collection] = db[collection].create_indexes(indexes)
+        except OperationFailure as e:
+            # One bad index (e.g. duplicate ids blocking a unique index) must not block the rest
+            logging.error(f"Error creating indexes on {collection}: {e}")
+            created[collection] = []
+            for index in indexes:
+                try:
+                    created[collection].extend(db[collection].create_indexes([index]))
+                except OperationFailure as index_error:
+                    logging.error(f"Error creating index {index.document['name']} on {collection}: {index_error}")
+    logging.info(f"Ensured indexes on {len(created)} collections")
+    return created
+
+def _plan_stages(plan: Dict[str, Any]) -> List[str]:
+    """Flatten the stage names of an explain() plan tree"""
+    stages = [plan.get('stage')]
+    for key in ('inputStage', 'queryPlan'):
+        if key in plan:
+            stages.extend(_plan_stages(plan[key]))
+    for child in plan.get('inputStages', []):
+        stages.extend(_plan_stages(child))
+    return [stage for stage in stages if stage]
+
+def check_query_plans(db=None) -> List[Dict[str, Any]]:
+    """Explain every hot query and report the stages of its winning plan"""
+    db = db if db is not None else mongo_db
+    results = []
+    for collection, query, sort in HOT_QUERIES:
+        cursor = db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        plan = cursor.explain().get('queryPlanner', {}).get('winningPlan', {})
+        stages = _plan_stages(plan)
+        results.append({
+            'collection': collection,
+            'query': query,
+            'sort': sort,
+            'stages': stages,
+            'collscan': 'COLLSCAN' in stages
+        })
+    return results
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Create and verify irops MongoDB indexes")
+    parser.add_argument('--check', action='store_true',
+                        help="explain() the hot queries and exit non-zero if any does a COLLSCAN")
+    args = parser.parse_args(argv)
+
+    if not args.check:
+        for collection, names in ensure_indexes().items():
+            print(f"{collection}: {', '.join(names) or 'no indexes created'}")
+        return 0
+
+    failures = 0
+    for result in check_query_plans():
+        status = "COLLSCAN" if result['collscan'] else "ok"
+        print(f"[{status}] {result['collection']} {result['query']} sort={result['sort']} -> {' > '.join(result['stages'])}")
+        failures += result['collscan']
+    if failures:
+        print(f"{failures} hot queries do a collection scan; run `python mongo_indexes.py` to create indexes")
+        return 1
+    print("All hot queries use an index")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
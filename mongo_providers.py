@@ -0,0 +1,168 @@
+"""Database providers behind mongo_utils.MongoClientFactory.
+
+MONGODB_PROVIDER picks where the process-wide client connects:
+
+    uri     MONGODB_URI (default; Atlas or any existing deployment)
+    local   a throwaway mongod started in a temp dir, stopped and deleted on exit
+    memory  an in-process mongomock stand-in (pip install mongomock); no
+            $lookup sub-pipelines, change streams, explain() or time-series
+
+Benchmarks switch providers at runtime with client_factory.use_provider().
+"""
+import atexit
+import logging
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import time
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+from config import Config
+
+class UriProvider:
+    """Connects to MONGODB_URI (or an explicit URI)"""
+
+    name = 'uri'
+
+    def __init__(self, uri: str = None):
+        self.uri = uri
+
+    def create_client(self, options: dict) -> MongoClient:
+        return MongoClient(self.uri or Config.MONGODB_URI, **options)
+
+    def close(self):
+        pass
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+class LocalMongodProvider:
+    """Starts a private mongod on 127.0.0.1 with its data in a temp dir.
+
+    The server starts on first use and is stopped, with its data deleted,
+    by close() or at interpreter exit in the process that started it. With
+    a replica set name it is initiated as a single-node replica set, so
+    change streams and transactions work too.
+    """
+
+    name = 'local'
+
+    def __init__(self, binary: str = None, port: int = None, replica_set: str = None,
+                 startup_timeout: int = None):
+        self.binary = binary or Config.MONGOD_BINARY
+        self.port = port if port is not None else Config.MONGOD_PORT
+        self.replica_set = replica_set if replica_set is not None else Config.MONGOD_REPLICA_SET
+        self.startup_timeout = startup_timeout or Config.MONGOD_STARTUP_TIMEOUT_SECONDS
+        self.dbpath = None
+        self.process = None
+        self._owner_pid = None
+
+    @property
+    def uri(self) -> str:
+        uri = f"mongodb://127.0.0.1:{self.port}/?directConnection=true"
+        return f"{uri}&replicaSet={self.replica_set}" if self.replica_set else uri
+
+    def start(self):
+        """Launch mongod and wait until it accepts commands"""
+        if self.process is not None and self.process.poll() is None:
+            return
+        binary = shutil.which(self.binary)
+        if binary is None:
+            raise RuntimeError(f"MONGODB_PROVIDER=local needs a mongod binary; '{self.binary}' was not found "
+                               f"(set MONGOD_BINARY)")
+        self.port = self.port or _free_port()
+        self.dbpath = tempfile.mkdtemp(prefix='irops-mongod-')
+        command = [binary, '--dbpath', self.dbpath, '--port', str(self.port), '--bind_ip', '127.0.0.1',
+                   '--logpath', os.path.join(self.dbpath, 'mongod.log')]
+        if self.replica_set:
+            command += ['--replSet', self.replica_set]
+        logging.info(f"Starting local mongod on port {self.port} in {self.dbpath}")
+        self.process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self._owner_pid = os.getpid()
+        atexit.register(self.close)
+        self._wait_until_ready()
+
+    def _wait_until_ready(self):
+        deadline = time.monotonic() + self.startup_timeout
+        client = MongoClient('127.0.0.1', self.port, directConnection=True, serverSelectionTimeoutMS=500)
+        try:
+            while True:
+                if self.process.poll() is not None:
+                    raise RuntimeError(f"mongod exited with code {self.process.returncode}; "
+                                       f"see {os.path.join(self.dbpath, 'mongod.log')}")
+                try:
+                    client.admin.command('ping')
+                    break
+                except PyMongoError:
+                    if time.monotonic() > deadline:
+                        raise RuntimeError(f"mongod did not start within {self.startup_timeout}s")
+                    time.sleep(0.2)
+            if self.replica_set:
+                client.admin.command('replSetInitiate', {
+                    '_id': self.replica_set,
+                    'members': [{'_id': 0, 'host': f'127.0.0.1:{self.port}'}]
+                })
+                while not client.admin.command('hello').get('isWritablePrimary'):
+                    if time.monotonic() > deadline:
+                        raise RuntimeError(f"Replica set {self.replica_set} did not elect a primary in time")
+                    time.sleep(0.2)
+        finally:
+            client.close()
+
+    def create_client(self, options: dict) -> MongoClient:
+        self.start()
+        return MongoClient(self.uri, **options)
+
+    def close(self):
+        """Stop mongod and delete its data (only in the process that started it)"""
+        if self.process is None or os.getpid() != self._owner_pid:
+            return
+        if self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        shutil.rmtree(self.dbpath, ignore_errors=True)
+        logging.info(f"Stopped local mongod on port {self.port}")
+        self.process = None
+        self.dbpath = None
+
+class InMemoryProvider:
+    """Process-local mongomock client; data lives until close()"""
+
+    name = 'memory'
+
+    def __init__(self):
+        self._client = None
+
+    def create_client(self, options: dict):
+        if self._client is None:
+            try:
+                import mongomock
+            except ImportError:
+                raise RuntimeError("MONGODB_PROVIDER=memory needs mongomock (pip install mongomock)")
+            # Pool, timeout and concern options don't apply to an in-process store
+            self._client = mongomock.MongoClient()
+        return self._client
+
+    def close(self):
+        self._client = None
+
+PROVIDERS = {
+    UriProvider.name: UriProvider,
+    LocalMongodProvider.name: LocalMongodProvider,
+    InMemoryProvider.name: InMemoryProvider,
+}
+
+def get_provider(name: str = None):
+    """Build the provider named by MONGODB_PROVIDER (or name)"""
+    name = (name or Config.MONGODB_PROVIDER or UriProvider.name).lower()
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown MONGODB_PROVIDER '{name}'; expected one of {', '.join(PROVIDERS)}")
+    return PROVIDERS[name]()
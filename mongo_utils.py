@@ -1,7 +1,226 @@
-from pymongo.mongo_client import MongoClient
-from pymongo.server_api import ServerApi
-import os
- 
-uri = os.getenv('MONGODB_URI', 'YOUR_MONGODB_CONNECTION_STRING_HERE')
-client = MongoClient(uri, server_api=ServerApi('1'))
-mongo_db = client['irops'] 
\ No newline at end of file
+from pymongo import monitoring
+from pymongo.mongo_client import MongoClient
+from pymongo.server_api import ServerApi
+import logging
+import os
+import threading
+import time
+from config import Config
+from mongo_providers import get_provider
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Tracks connection pool usage per server: open/checked-out connections and checkout wait times"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pools = {}
+        self._checkout_started = threading.local()
+
+    @staticmethod
+    def _key(address) -> str:
+        return f"{address[0]}:{address[1]}" if isinstance(address, tuple) else str(address)
+
+    def _pool(self, address):
+        key = self._key(address)
+        pool = self._pools.get(key)
+        if pool is None:
+            pool = self._pools[key] = {
+                'open_connections': 0,
+                'checked_out': 0,
+                'max_checked_out': 0,
+                'checkouts': 0,
+                'checkout_failures': 0,
+                'checkout_failure_reasons': {},
+                'wait_time_total_ms': 0.0,
+                'wait_time_max_ms': 0.0,
+                'pool_clears': 0
+            }
+        return pool
+
+    def pool_created(self, event):
+        with self._lock:
+            self._pool(event.address)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self._pool(event.address)['pool_clears'] += 1
+
+    def pool_closed(self, event):
+        with self._lock:
+            self._pools.pop(self._key(event.address), None)
+
+    def connection_created(self, event):
+        with self._lock:
+            self._pool(event.address)['open_connections'] += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool['open_connections'] = max(0, pool['open_connections'] - 1)
+
+    def connection_check_out_started(self, event):
+        self._checkout_started.value = time.monotonic()
+
+    def connection_check_out_failed(self, event):
+        waited = self._waited_ms()
+        with self._lock:
+            pool = self._pool(event.address)
+            pool['checkout_failures'] += 1
+            reasons = pool['checkout_failure_reasons']
+            reasons[event.reason] = reasons.get(event.reason, 0) + 1
+            pool['wait_time_max_ms'] = max(pool['wait_time_max_ms'], waited)
+
+    def connection_checked_out(self, event):
+        waited = self._waited_ms()
+        with self._lock:
+            pool = self._pool(event.address)
+            pool['checkouts'] += 1
+            pool['checked_out'] += 1
+            pool['max_checked_out'] = max(pool['max_checked_out'], pool['checked_out'])
+            pool['wait_time_total_ms'] += waited
+            pool['wait_time_max_ms'] = max(pool['wait_time_max_ms'], waited)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool['checked_out'] = max(0, pool['checked_out'] - 1)
+
+    def _waited_ms(self) -> float:
+        started = getattr(self._checkout_started, 'value', None)
+        self._checkout_started.value = None
+        return (time.monotonic() - started) * 1000 if started else 0.0
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = {}
+            for address, pool in self._pools.items():
+                stats[address] = dict(pool, checkout_failure_reasons=dict(pool['checkout_failure_reasons']))
+                stats[address]['wait_time_avg_ms'] = round(pool['wait_time_total_ms'] / pool['checkouts'], 3) if pool['checkouts'] else 0.0
+            return stats
+
+def _client_options() -> dict:
+    """MongoClient keyword arguments from Config (unset values keep the driver defaults)"""
+    options = {
+        'server_api': ServerApi('1'),
+        'appname': Config.MONGODB_APP_NAME,
+        'maxPoolSize': Config.MONGODB_MAX_POOL_SIZE,
+        'minPoolSize': Config.MONGODB_MIN_POOL_SIZE,
+        'waitQueueTimeoutMS': Config.MONGODB_WAIT_QUEUE_TIMEOUT_MS,
+        'connectTimeoutMS': Config.MONGODB_CONNECT_TIMEOUT_MS,
+        'serverSelectionTimeoutMS': Config.MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+        'readPreference': Config.MONGODB_READ_PREFERENCE,
+        'retryWrites': Config.MONGODB_RETRY_WRITES
+    }
+    optional = {
+        'maxIdleTimeMS': Config.MONGODB_MAX_IDLE_TIME_MS,
+        'socketTimeoutMS': Config.MONGODB_SOCKET_TIMEOUT_MS,
+        'w': Config.MONGODB_WRITE_CONCERN
+    }
+    for key, value in optional.items():
+        if value in (None, ''):
+            continue
+        options[key] = int(value) if str(value).isdigit() else value
+    return options
+
+class MongoClientFactory:
+    """Owns the process-wide MongoClient.
+
+    The client is created lazily on first use and re-created when the
+    process id changes, so a gunicorn --preload master never hands its
+    sockets to forked workers. Where it connects is up to the provider
+    (MONGODB_PROVIDER, see mongo_providers.py).
+    """
+
+    def __init__(self, provider=None):
+        self._lock = threading.Lock()
+        self._client = None
+        self._pid = None
+        self.pool_listener = PoolStatsListener()
+        self.provider = provider or get_provider()
+        self.database = None
+
+    def create_client(self, uri: str = None, **overrides) -> MongoClient:
+        """Build a new client with the configured pool, timeouts and concerns"""
+        options = _client_options()
+        options.update(overrides)
+        options['event_listeners'] = list(options.get('event_listeners', [])) + [self.pool_listener]
+        if uri:
+            return MongoClient(uri, **options)
+        return self.provider.create_client(options)
+
+    def use_provider(self, provider, database: str = None):
+        """Switch providers (e.g. for benchmarks); the next get_client() connects through the new one"""
+        self.close()
+        self.provider.close()
+        self.provider = provider
+        self.database = database
+
+    def get_client(self) -> MongoClient:
+        pid = os.getpid()
+        if self._client is None or self._pid != pid:
+            with self._lock:
+                if self._client is None or self._pid != pid:
+                    if self._client is not None:
+                        # Inherited across fork: drop it without closing the parent's sockets
+                        logging.info(f"Re-creating MongoDB client after fork (pid {self._pid} -> {pid})")
+                        self.pool_listener = PoolStatsListener()
+                    self._client = self.create_client()
+                    self._pid = pid
+        return self._client
+
+    def after_fork(self):
+        """Forget the parent's client in a forked child (registered with os.register_at_fork)"""
+        self._lock = threading.Lock()
+        self._client = None
+        self._pid = None
+        self.pool_listener = PoolStatsListener()
+
+    def get_database(self, name: str = None):
+        return self.get_client()[name or self.database or Config.MONGODB_DATABASE]
+
+    def close(self):
+        with self._lock:
+            if self._client is not None and self._pid == os.getpid():
+                self._client.close()
+            self._client = None
+            self._pid = None
+
+    def get_pool_stats(self) -> dict:
+        """Pool configuration plus live per-server pool counters"""
+        return {
+            'pid': os.getpid(),
+            'provider': self.provider.name,
+            'connected': self._client is not None and self._pid == os.getpid(),
+            'config': {
+                'max_pool_size': Config.MONGODB_MAX_POOL_SIZE,
+                'min_pool_size': Config.MONGODB_MIN_POOL_SIZE,
+                'wait_queue_timeout_ms': Config.MONGODB_WAIT_QUEUE_TIMEOUT_MS,
+                'read_preference': Config.MONGODB_READ_PREFERENCE,
+                'write_concern': Config.MONGODB_WRITE_CONCERN or 'server default'
+            },
+            'pools': self.pool_listener.get_stats()
+        }
+
+class _DatabaseProxy:
+    """Stands in for the irops Database so `from mongo_utils import mongo_db` stays fork-safe"""
+
+    def __getitem__(self, name):
+        return client_factory.get_database()[name]
+
+    def __getattr__(self, name):
+        return getattr(client_factory.get_database(), name)
+
+client_factory = MongoClientFactory()
+mongo_db = _DatabaseProxy()
+
+def get_client() -> MongoClient:
+    return client_factory.get_client()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=client_factory.after_fork)
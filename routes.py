@@ -1,13 +1,35 @@
-from flask import render_template, request, jsonify, redirect, url_for, flash
+from flask import render_template, request, jsonify, redirect, url_for, flash, Response, stream_with_context, g
+from flask.json.provider import DefaultJSONProvider
 from datetime import datetime, timedelta
 from models import Flight, Disruption, Agent, AgentCommunication, Scenario, DisruptionType, AgentStatus, AgentType
 from agents.agent_coordinator import AgentCoordinator
 from services.data_simulator import DataSimulator
 from services.business_metrics_service import BusinessMetricsService
+from services.dashboard_service import DashboardService
+from services.agent_stats_service import AgentCommunicationStatsService
+from services.agent_status_history import AgentStatusHistoryService
 from coordination_test_utils import CoordinationTestRunner, TestResult, quick_coordination_test, quick_communications_test, quick_system_check
 import json
 import logging
-from mongo_utils import mongo_db
+from urllib.parse import urlencode
+from config import Config
+from mongo_utils import mongo_db, client_factory
+from mongo_indexes import ensure_indexes
+from services.pagination import (PaginationError, keyset_page, parse_fields, parse_limit,
+                                 parse_datetime_param, build_projection, shape_documents)
+from services.sequence_service import SequenceService
+from services.date_utils import utcnow, to_datetime, with_bson_dates
+from services.communication_store import CommunicationStore
+from services.flight_repository import flight_repository
+from services.connection_graph import connection_graph
+from services.route_index import route_index
+from services.crew_roster import crew_roster
+from services.maintenance_scheduler import maintenance_scheduler
+from services.ground_resources import ground_resources
+from services.communication_retention import communication_retention
+from services.unit_of_work import UnitOfWork, get_totals as get_unit_of_work_totals
+from services.export_service import ExportService, EXPORT_DATASETS
+from services.prefetch_service import DisruptionPrefetchService, register_prefetcher, schedule_disruption_prefetch, get_prefetcher
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -16,18 +38,114 @@ logger = logging.getLogger(__name__)
 # Global coordinator instance
 coordinator = None
 business_metrics_service = BusinessMetricsService()
+dashboard_service = DashboardService()
+communication_stats_service = AgentCommunicationStatsService()
+communication_store = CommunicationStore(communication_stats_service)
+status_history_service = AgentStatusHistoryService()
+export_service = ExportService()
+sequence_service = SequenceService()
+
+# API field name -> stored field name, used for fields= selection and projections
+FLIGHT_API_FIELDS = {
+    'id': 'id', 'flight_number': 'flight_number', 'origin': 'origin', 'destination': 'destination',
+    'scheduled_departure': 'scheduled_departure', 'actual_departure': 'actual_departure',
+    'scheduled_arrival': 'scheduled_arrival', 'actual_arrival': 'actual_arrival',
+    'aircraft_id': 'aircraft_id', 'crew_list': 'crew_list', 'passenger_count': 'passenger_count',
+    'status': 'status', 'delay_minutes': 'delay_minutes', 'disruption_type': 'disruption_type'
+}
+DISRUPTION_API_FIELDS = {
+    'id': 'id', 'type': 'type', 'severity': 'severity', 'description': 'description',
+    'affected_flights': 'affected_flight_list', 'affected_airports': 'affected_airport_list',
+    'start_time': 'start_time', 'end_time': 'end_time', 'estimated_end_time': 'estimated_end_time',
+    'status': 'status', 'created_at': 'created_at'
+}
+# Statuses POST /api/disruptions/<id>/close accepts; either frees what was booked for the disruption
+CLOSED_DISRUPTION_STATUSES = ('resolved', 'cancelled')
+SCENARIO_API_FIELDS = {
+    'id': 'id', 'name': 'name', 'description': 'description', 'scenario_type': 'scenario_type',
+    'parameters': 'parameters', 'results': 'results', 'status': 'status',
+    'created_at': 'created_at', 'completed_at': 'completed_at'
+}
+
+def _paged_response(items, next_cursor):
+    """JSON list response; the next page's cursor travels in X-Next-Cursor and Link headers"""
+    response = jsonify(items)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+        args = request.args.to_dict()
+        args['cursor'] = next_cursor
+        response.headers['Link'] = f'<{request.base_url}?{urlencode(args)}>; rel="next"'
+    return response
+
+class IsoJSONProvider(DefaultJSONProvider):
+    """Serialize BSON dates as ISO-8601 strings, as the API did when dates were stored as strings"""
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return DefaultJSONProvider.default(o)
 
 def init_app(app):
     """Initialize the application with routes"""
     global coordinator
     
+    app.json = IsoJSONProvider(app)
+    
+    # Create the indexes every hot query relies on (no-op when they already exist)
+    if Config.ENSURE_INDEXES_ON_STARTUP:
+        try:
+            ensure_indexes()
+        except Exception as e:
+            logger.error(f"Error ensuring MongoDB indexes: {e}")
+    
     # Initialize agent coordinator
     coordinator = AgentCoordinator()
     coordinator.init_agents(app)
     
+    # Keep the shared flight cache coherent with writes from other processes
+    flight_repository.start_invalidation_listener()
+    
+    # Compact communications that have left the live window into per-disruption summaries
+    communication_retention.start_archiver()
+    
+    # Warm assessment and AI caches whenever a disruption is created
+    if Config.PREFETCH_ENABLED:
+        register_prefetcher(DisruptionPrefetchService(coordinator))
+    
+    # Batch the agent, communication and stats writes each request makes into bulk_writes
+    if Config.UNIT_OF_WORK_ENABLED:
+        register_unit_of_work(app)
+    
     # Register routes
     register_routes(app)
 
+def register_unit_of_work(app):
+    """Give every request its own unit of work, flushed before the response is sent"""
+    
+    @app.before_request
+    def begin_unit_of_work():
+        g.unit_of_work = UnitOfWork(f"{request.method} {request.path}").begin()
+    
+    @app.after_request
+    def flush_unit_of_work(response):
+        uow = g.get('unit_of_work')
+        if uow is None or not uow.pending:
+            return response
+        try:
+            uow.flush()
+        except Exception as e:
+            logger.error(f"Error flushing writes for {uow.name}: {e}")
+            response = jsonify({'success': False, 'error': str(e)})
+            response.status_code = 500
+        return response
+    
+    @app.teardown_request
+    def end_unit_of_work(exc):
+        uow = g.pop('unit_of_work', None)
+        if uow is not None:
+            uow.end()
+
 def register_routes(app):
     """Register all routes with the Flask app"""
     
@@ -35,61 +153,14 @@ def register_routes(app):
     def dashboard():
         """Dashboard page (MongoDB version)"""
         try:
-            today = datetime.utcnow().date()
-            today_start = datetime.combine(today, datetime.min.time())
-            today_end = datetime.combine(today, datetime.max.time())
-            
-            # Total flights today
-            total_flights_today = mongo_db['flights'].count_documents({
-                'scheduled_departure': {'$gte': today_start.isoformat(), '$lte': today_end.isoformat()}
-            })
-
-            # Delayed flights
-            delayed_flights = list(mongo_db['flights'].find({
-                'delay_minutes': {'$gt': 0},
-                'scheduled_departure': {'$gte': today_start.isoformat(), '$lte': today_end.isoformat()}
-            }))
-
-            # Active disruptions
-            active_disruptions = list(mongo_db['disruptions'].find({'status': 'active'}))
-            
-            on_time_flights = total_flights_today - len(delayed_flights)
-            on_time_percentage = round((on_time_flights / total_flights_today) * 100) if total_flights_today > 0 else 100
-            
-            metrics = {
-                'total_flights_today': total_flights_today,
-                'delayed_flights': len(delayed_flights),
-                'active_disruptions': len(active_disruptions),
-                'on_time_percentage': on_time_percentage
-            }
-            
-            # Upcoming flights (next 12 hours)
-            upcoming_flights = list(mongo_db['flights'].find({
-                'scheduled_departure': {'$gte': datetime.utcnow().isoformat(), '$lte': (datetime.utcnow() + timedelta(hours=12)).isoformat()}
-            }).sort('scheduled_departure', 1).limit(10))
-            
-            # Agents
-            agents = list(mongo_db['agents'].find())
-            agent_status = {}
-            for agent in agents:
-                agent_status[agent['name']] = {
-                    'name': agent['name'],
-                    'status': agent.get('status', 'unknown'),
-                    'current_task': agent.get('current_task'),
-                    'last_activity': agent.get('last_activity')
-                }
-            
-            # Recent communications
-            recent_communications = list(mongo_db['agent_communications'].find().sort('timestamp', -1).limit(10))
-            
+            data = dashboard_service.get_dashboard_data()
             return render_template('dashboard.html',
-                                metrics=metrics,
-                                active_disruptions=active_disruptions,
-                                delayed_flights=delayed_flights,
+                                metrics=data['metrics'],
+                                active_disruptions=data['active_disruptions'],
                                 resolved_today=12,  # Default value for resolved today
-                                upcoming_flights=upcoming_flights,
-                                agent_status=agent_status,
-                                recent_communications=recent_communications)
+                                upcoming_flights=data['upcoming_flights'],
+                                agent_status=data['agent_status'],
+                                recent_communications=data['recent_communications'])
         except Exception as e:
             logger.error(f"Error in dashboard route (MongoDB): {e}")
             return render_template('dashboard.html', error=str(e))
@@ -101,21 +172,28 @@ def register_routes(app):
             # Get all agents
             agents_list = list(mongo_db['agents'].find())
             
-            # Generate agent metrics
+            # Generate agent metrics from incrementally maintained counters and status rollups
             agent_metrics = {}
             demo_success_rates = [94, 98, 91, 89, 96]
+            comm_stats = communication_stats_service.get_stats()
+            performance = status_history_service.get_performance()
             for idx, agent in enumerate(agents_list):
-                sent_comms = mongo_db['agent_communications'].count_documents({'sender': agent['name']})
-                received_comms = mongo_db['agent_communications'].count_documents({'receiver': agent['name']})
+                stats = comm_stats.get(agent['name'], {})
+                perf = performance.get(agent['name'], {})
+                success_rate = perf.get('success_rate')
+                response_time = perf.get('average_response_time')
                 agent_metrics[agent['name']] = {
-                    'tasks_completed': sent_comms + received_comms,
-                    'success_rate': demo_success_rates[idx % len(demo_success_rates)],
-                    'average_response_time': 2.3,
+                    'tasks_completed': stats.get('total', 0),
+                    'success_rate': success_rate if success_rate is not None else demo_success_rates[idx % len(demo_success_rates)],
+                    # Task latency from the status rollups, else how long its messages wait to be processed
+                    'average_response_time': response_time if response_time is not None else (stats.get('response_time_p50') or 0.0),
+                    'utilization': round(perf.get('utilization', 0) * 100, 1),
                     'current_workload': 'Low' if agent.get('status') == 'idle' else 'Medium' if agent.get('status') == 'active' else 'High'
                 }
             
-            # Get recent communications
-            communications = list(mongo_db['agent_communications'].find().sort('timestamp', -1).limit(50))
+            # Get recent communications (summary fields only)
+            communications = [CommunicationStore.to_api(comm)
+                              for comm in communication_store.find(summary=True, limit=50)]
             
             return render_template('agents.html',
                                 agents=agents_list,
@@ -266,13 +344,13 @@ def register_routes(app):
             data = request.get_json()
             # Create new scenario document
             scenario_doc = {
-                'id': int(mongo_db['scenarios'].estimated_document_count()) + 1,
+                'id': sequence_service.next_id('scenarios'),
                 'name': data.get('name', 'Unnamed Scenario'),
                 'description': data.get('description', ''),
                 'scenario_type': data.get('scenario_type'),
                 'parameters': data.get('parameters', {}),
                 'status': 'running',
-                'created_at': datetime.utcnow().isoformat(),
+                'created_at': utcnow(),
                 'completed_at': None,
                 'results': None
             }
@@ -284,7 +362,7 @@ def register_routes(app):
             mongo_db['scenarios'].update_one({'id': scenario_doc['id']}, {'$set': {
                 'results': scenario_result,
                 'status': 'completed',
-                'completed_at': datetime.utcnow().isoformat()
+                'completed_at': utcnow()
             }})
             return jsonify({
                 'success': True,
@@ -295,35 +373,107 @@ def register_routes(app):
             logger.error(f"Scenario creation error (MongoDB): {e}")
             return jsonify({'success': False, 'error': str(e)}), 500
 
+    @app.route('/api/agents/communication_stats')
+    def agent_communication_stats():
+        """API endpoint for per-agent communication counters and response-time percentiles"""
+        try:
+            return jsonify({'success': True, 'stats': communication_stats_service.get_stats()})
+        except Exception as e:
+            logger.error(f"Error getting communication stats (MongoDB): {e}")
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    @app.route('/api/agents/communication_stats/rebuild', methods=['POST'])
+    def rebuild_agent_communication_stats():
+        """API endpoint to recompute communication counters from the full history"""
+        try:
+            agents_rebuilt = communication_stats_service.rebuild()
+            return jsonify({'success': True, 'agents_rebuilt': agents_rebuilt})
+        except Exception as e:
+            logger.error(f"Error rebuilding communication stats (MongoDB): {e}")
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    @app.route('/api/agents/status_history')
+    def agent_status_history():
+        """API endpoint for raw agent status transitions, newest first"""
+        try:
+            history = status_history_service.get_history(
+                agent=request.args.get('agent'),
+                start=parse_datetime_param(request.args.get('start'), 'start'),
+                end=parse_datetime_param(request.args.get('end'), 'end'),
+                limit=parse_limit(request.args.get('limit'), default=100, maximum=1000)
+            )
+            return jsonify({'success': True, 'history': history})
+        except PaginationError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        except Exception as e:
+            logger.error(f"Error getting agent status history (MongoDB): {e}")
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    @app.route('/api/agents/rollups')
+    def agent_status_rollups():
+        """API endpoint for per-minute agent utilization and latency rollups (default: last hour)"""
+        try:
+            end = parse_datetime_param(request.args.get('end'), 'end')
+            start = parse_datetime_param(request.args.get('start'), 'start') or (end or utcnow()) - timedelta(hours=1)
+            rollups = status_history_service.get_rollups(request.args.get('agent'), start, end)
+            return jsonify({'success': True, 'rollups': rollups})
+        except PaginationError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        except Exception as e:
+            logger.error(f"Error getting agent status rollups (MongoDB): {e}")
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    @app.route('/api/agents/performance')
+    def agent_performance():
+        """API endpoint for per-agent utilization, success rate and response time over a window"""
+        try:
+            window = parse_limit(request.args.get('minutes'), default=Config.AGENT_PERFORMANCE_WINDOW_MINUTES,
+                                 maximum=Config.AGENT_STATUS_ROLLUP_RETENTION_DAYS * 1440)
+            return jsonify({'success': True, 'performance': status_history_service.get_performance(window)})
+        except PaginationError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        except Exception as e:
+            logger.error(f"Error getting agent performance (MongoDB): {e}")
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    @app.route('/api/agents/rollups/rebuild', methods=['POST'])
+    def rebuild_agent_status_rollups():
+        """API endpoint to recompute status rollups from the status history"""
+        try:
+            since = parse_datetime_param(request.args.get('since'), 'since')
+            return jsonify({'success': True, 'transitions_replayed': status_history_service.rebuild_rollups(since)})
+        except PaginationError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        except Exception as e:
+            logger.error(f"Error rebuilding agent status rollups (MongoDB): {e}")
+            return jsonify({'success': False, 'error': str(e)}), 500
+
     @app.route('/api/scenarios')
     def scenarios_api():
-        """API endpoint for scenarios (MongoDB version)"""
-        try:
-            scenarios = list(mongo_db['scenarios'].find().sort('created_at', -1))
-            scenarios_data = []
-            for scenario in scenarios:
-                try:
-                    parameters = scenario.get('parameters', {})
-                    results = scenario.get('results', {})
-                    if isinstance(parameters, str):
-                        parameters = json.loads(parameters)
-                    if isinstance(results, str):
-                        results = json.loads(results)
-                except:
-                    parameters = {}
-                    results = {}
-                scenarios_data.append({
-                    'id': scenario.get('id'),
-                    'name': scenario.get('name'),
-                    'description': scenario.get('description'),
-                    'scenario_type': scenario.get('scenario_type'),
-                    'parameters': parameters,
-                    'results': results,
-                    'status': scenario.get('status'),
-                    'created_at': scenario.get('created_at'),
-                    'completed_at': scenario.get('completed_at')
-                })
-            return jsonify(scenarios_data)
+        """API endpoint for scenarios with keyset pagination, field selection and filters (MongoDB version)"""
+        try:
+            fields = parse_fields(request.args.get('fields'), SCENARIO_API_FIELDS)
+            query = {}
+            for param in ('status', 'scenario_type'):
+                if request.args.get(param):
+                    query[param] = request.args[param]
+            scenarios, next_cursor = keyset_page(
+                mongo_db['scenarios'], query, 'created_at',
+                cursor=request.args.get('cursor'),
+                limit=parse_limit(request.args.get('limit')),
+                projection=build_projection(fields, SCENARIO_API_FIELDS, 'created_at')
+            )
+            scenarios_data = shape_documents(scenarios, fields, SCENARIO_API_FIELDS)
+            for scenario in scenarios_data:
+                for key in ('parameters', 'results'):
+                    if isinstance(scenario.get(key), str):
+                        try:
+                            scenario[key] = json.loads(scenario[key])
+                        except ValueError:
+                            scenario[key] = {}
+            return _paged_response(scenarios_data, next_cursor)
+        except PaginationError as e:
+            return jsonify({'error': str(e)}), 400
         except Exception as e:
             logger.error(f"Scenarios API error (MongoDB): {e}")
             return jsonify({'error': str(e)}), 500
@@ -417,9 +567,9 @@ def register_routes(app):
                 'results': results,
                 'export_timestamp': datetime.utcnow().isoformat()
             }
-            from flask import Response
+            # Stream the encoder's chunks instead of building the whole document in memory
             return Response(
-                json.dumps(export_data, indent=2),
+                stream_with_context(json.JSONEncoder(indent=2, default=str).iterencode(export_data)),
                 mimetype='application/json',
                 headers={'Content-Disposition': f'attachment; filename=scenario_{scenario_id}_results.json'}
             )
@@ -427,85 +577,249 @@ def register_routes(app):
             logger.error(f"Error exporting scenario results {scenario_id} (MongoDB): {e}")
             return jsonify({'success': False, 'error': str(e)}), 500
 
+    @app.route('/api/export/<dataset>')
+    def export_dataset(dataset):
+        """Stream a flights, disruptions or communications export as NDJSON or CSV, optionally gzipped"""
+        if dataset not in EXPORT_DATASETS:
+            return jsonify({'success': False, 'error': f"Unknown dataset: {dataset}"}), 404
+        export_format = request.args.get('format', 'ndjson').lower()
+        if export_format not in ('ndjson', 'csv'):
+            return jsonify({'success': False, 'error': 'format must be ndjson or csv'}), 400
+        try:
+            start = parse_datetime_param(request.args.get('start'), 'start')
+            end = parse_datetime_param(request.args.get('end'), 'end')
+            extra_query = {}
+            if dataset == 'communications':
+                for param in ('sender', 'receiver', 'message_type'):
+                    if request.args.get(param):
+                        extra_query[param] = request.args[param]
+                if request.args.get('disruption_id'):
+                    extra_query['disruption_id'] = request.args.get('disruption_id', type=int)
+            elif request.args.get('status'):
+                extra_query['status'] = request.args['status']
+            gzip_param = request.args.get('gzip')
+            if gzip_param is None:
+                compress = request.accept_encodings['gzip'] > 0
+            else:
+                compress = gzip_param.lower() in ('1', 'true', 'yes')
+
+            chunks = export_service.stream_export(dataset, export_format, start, end, compress, extra_query)
+            extension = 'csv' if export_format == 'csv' else 'ndjson'
+            headers = {
+                'Content-Disposition': f'attachment; filename={dataset}_export.{extension}',
+                'Vary': 'Accept-Encoding'
+            }
+            if compress:
+                headers['Content-Encoding'] = 'gzip'
+            mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+            return Response(stream_with_context(chunks), mimetype=mimetype, headers=headers)
+        except PaginationError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        except Exception as e:
+            logger.error(f"Error exporting {dataset} (MongoDB): {e}")
+            return jsonify({'success': False, 'error': str(e)}), 500
+
     @app.route('/api/flights')
     def flights_api():
-        """API endpoint for flights (MongoDB version)"""
-        try:
-            flights = list(mongo_db['flights'].find().sort('scheduled_departure', -1).limit(100))
-            flights_data = []
-            for flight in flights:
-                flights_data.append({
-                    'id': flight.get('id'),
-                    'flight_number': flight.get('flight_number'),
-                    'origin': flight.get('origin'),
-                    'destination': flight.get('destination'),
-                    'scheduled_departure': flight.get('scheduled_departure'),
-                    'actual_departure': flight.get('actual_departure'),
-                    'scheduled_arrival': flight.get('scheduled_arrival'),
-                    'actual_arrival': flight.get('actual_arrival'),
-                    'aircraft_id': flight.get('aircraft_id'),
-                    'crew_list': flight.get('crew_list'),
-                    'passenger_count': flight.get('passenger_count'),
-                    'status': flight.get('status'),
-                    'delay_minutes': flight.get('delay_minutes'),
-                    'disruption_type': flight.get('disruption_type')
-                })
-            return jsonify(flights_data)
+        """API endpoint for flights with keyset pagination, field selection and filters (MongoDB version)"""
+        try:
+            fields = parse_fields(request.args.get('fields'), FLIGHT_API_FIELDS)
+            query = {}
+            for param in ('status', 'origin', 'destination'):
+                if request.args.get(param):
+                    query[param] = request.args[param]
+            departure_from = parse_datetime_param(request.args.get('departure_from'), 'departure_from')
+            departure_to = parse_datetime_param(request.args.get('departure_to'), 'departure_to')
+            if departure_from or departure_to:
+                query['scheduled_departure'] = {}
+                if departure_from:
+                    query['scheduled_departure']['$gte'] = departure_from
+                if departure_to:
+                    query['scheduled_departure']['$lt'] = departure_to
+            flights, next_cursor = keyset_page(
+                mongo_db['flights'], query, 'scheduled_departure',
+                cursor=request.args.get('cursor'),
+                limit=parse_limit(request.args.get('limit')),
+                projection=build_projection(fields, FLIGHT_API_FIELDS, 'scheduled_departure')
+            )
+            return _paged_response(shape_documents(flights, fields, FLIGHT_API_FIELDS), next_cursor)
+        except PaginationError as e:
+            return jsonify({'error': str(e)}), 400
         except Exception as e:
             logger.error(f"Flights API error (MongoDB): {e}")
             return jsonify({'error': str(e)}), 500
 
+    @app.route('/api/flights/<int:flight_id>/misconnects')
+    def flight_misconnects(flight_id):
+        """API endpoint for onward connections a delay to this flight would break"""
+        try:
+            delay = request.args.get('delay', default=60, type=int)
+            graph = connection_graph.current()
+            impact = graph.misconnects({flight_id: delay}, limit=request.args.get('limit', default=20, type=int))
+            impact.pop('misconnecting_by_flight', None)
+            return jsonify({'success': True, 'flight_id': flight_id, 'delay_minutes': delay,
+                            'connections': graph.connections_from(flight_id), 'impact': impact,
+                            'graph': connection_graph.get_stats()})
+        except Exception as e:
+            logger.error(f"Error getting misconnects for flight {flight_id}: {e}")
+            return jsonify({'success': False, 'error': str(e)}), 500
+
     @app.route('/api/disruptions')
     def disruptions_api():
-        """API endpoint for disruptions (MongoDB version)"""
-        try:
-            disruptions = list(mongo_db['disruptions'].find().sort('created_at', -1))
-            disruptions_data = []
-            for disruption in disruptions:
-                disruptions_data.append({
-                    'id': disruption.get('id'),
-                    'type': disruption.get('type'),
-                    'severity': disruption.get('severity'),
-                    'description': disruption.get('description'),
-                    'affected_flights': disruption.get('affected_flight_list', []),
-                    'affected_airports': disruption.get('affected_airport_list', []),
-                    'start_time': disruption.get('start_time'),
-                    'end_time': disruption.get('end_time'),
-                    'estimated_end_time': disruption.get('estimated_end_time'),
-                    'status': disruption.get('status'),
-                    'created_at': disruption.get('created_at')
-                })
-            return jsonify(disruptions_data)
+        """API endpoint for disruptions with keyset pagination, field selection and filters (MongoDB version)"""
+        try:
+            fields = parse_fields(request.args.get('fields'), DISRUPTION_API_FIELDS)
+            query = {}
+            for param in ('status', 'type', 'severity'):
+                if request.args.get(param):
+                    query[param] = request.args[param]
+            if request.args.get('airport'):
+                query['affected_airport_list'] = request.args['airport']
+            created_from = parse_datetime_param(request.args.get('created_from'), 'created_from')
+            created_to = parse_datetime_param(request.args.get('created_to'), 'created_to')
+            if created_from or created_to:
+                query['created_at'] = {}
+                if created_from:
+                    query['created_at']['$gte'] = created_from
+                if created_to:
+                    query['created_at']['$lt'] = created_to
+            disruptions, next_cursor = keyset_page(
+                mongo_db['disruptions'], query, 'created_at',
+                cursor=request.args.get('cursor'),
+                limit=parse_limit(request.args.get('limit')),
+                projection=build_projection(fields, DISRUPTION_API_FIELDS, 'created_at')
+            )
+            disruptions_data = shape_documents(disruptions, fields, DISRUPTION_API_FIELDS,
+                                               defaults={'affected_flights': [], 'affected_airports': []})
+            return _paged_response(disruptions_data, next_cursor)
+        except PaginationError as e:
+            return jsonify({'error': str(e)}), 400
         except Exception as e:
             logger.error(f"Disruptions API error (MongoDB): {e}")
             return jsonify({'error': str(e)}), 500
 
+    @app.route('/api/disruptions', methods=['POST'])
+    def create_disruption():
+        """API endpoint to ingest a disruption and start prefetching its analysis (MongoDB version)"""
+        try:
+            data = request.get_json() or {}
+            if not data.get('type'):
+                return jsonify({'success': False, 'error': 'Disruption type is required'}), 400
+            now = utcnow()
+            disruption_doc = {
+                'id': sequence_service.next_id('disruptions'),
+                'type': str(data['type']),
+                'severity': data.get('severity', 'medium'),
+                'description': data.get('description', ''),
+                'affected_flight_list': data.get('affected_flights', []),
+                'affected_airport_list': data.get('affected_airports', []),
+                'start_time': data.get('start_time') or now,
+                'estimated_end_time': data.get('estimated_end_time'),
+                'status': data.get('status', 'active'),
+                'created_at': now
+            }
+            mongo_db['disruptions'].insert_one(with_bson_dates(disruption_doc, 'disruptions'))
+            prefetch_scheduled = schedule_disruption_prefetch(disruption_doc['id'])
+            logger.info(f"Disruption {disruption_doc['id']} ingested (prefetch scheduled: {prefetch_scheduled})")
+            return jsonify({
+                'success': True,
+                'disruption_id': disruption_doc['id'],
+                'prefetch_scheduled': prefetch_scheduled
+            }), 201
+        except Exception as e:
+            logger.error(f"Error ingesting disruption (MongoDB): {e}")
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    @app.route('/api/disruptions/<int:disruption_id>/close', methods=['POST'])
+    def close_disruption(disruption_id):
+        """API endpoint to mark a disruption resolved or cancelled and free what was booked for it (MongoDB version)"""
+        try:
+            data = request.get_json(silent=True) or {}
+            status = data.get('status', 'resolved')
+            if status not in CLOSED_DISRUPTION_STATUSES:
+                return jsonify({'success': False, 'error': f"status must be one of {', '.join(CLOSED_DISRUPTION_STATUSES)}"}), 400
+            now = utcnow()
+            result = mongo_db['disruptions'].update_one({'id': disruption_id},
+                                                        {'$set': {'status': status, 'end_time': now, 'updated_at': now}})
+            if not result.matched_count:
+                return jsonify({'success': False, 'error': 'Disruption not found'}), 404
+            maintenance_scheduler.release(disruption_id)
+            ground_resources.release(disruption_id)
+            logger.info(f"Disruption {disruption_id} {status}; maintenance bookings and ground resources released")
+            return jsonify({'success': True, 'disruption_id': disruption_id, 'status': status})
+        except Exception as e:
+            logger.error(f"Error closing disruption {disruption_id} (MongoDB): {e}")
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    @app.route('/api/admin/mongo_pool')
+    def mongo_pool_stats():
+        """API endpoint for MongoDB connection pool configuration and usage"""
+        try:
+            return jsonify({'success': True, 'stats': client_factory.get_pool_stats()})
+        except Exception as e:
+            logger.error(f"Error getting MongoDB pool stats: {e}")
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    @app.route('/api/admin/flight_cache')
+    def flight_cache_stats():
+        """API endpoint for flight read-through cache statistics"""
+        return jsonify({'success': True, 'stats': flight_repository.get_stats()})
+
+    @app.route('/api/admin/route_index')
+    def route_index_stats():
+        """API endpoint for the in-memory route schedule index used by alternative flight search"""
+        return jsonify({'success': True, 'stats': route_index.get_stats()})
+
+    @app.route('/api/admin/crew_roster')
+    def crew_roster_stats():
+        """API endpoint for the in-memory crew roster index used by crew impact analysis"""
+        return jsonify({'success': True, 'stats': crew_roster.get_stats()})
+
+    @app.route('/api/admin/unit_of_work')
+    def unit_of_work_stats():
+        """API endpoint for batched write counters and the round-trips they saved"""
+        return jsonify({'success': True, 'stats': get_unit_of_work_totals()})
+
+    @app.route('/api/admin/communications/retention')
+    def communication_retention_stats():
+        """API endpoint for communication retention settings and raw/archived volume"""
+        try:
+            return jsonify({'success': True, 'stats': communication_retention.get_stats()})
+        except Exception as e:
+            logger.error(f"Error getting communication retention stats: {e}")
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    @app.route('/api/admin/communications/archive', methods=['POST'])
+    def archive_communications():
+        """API endpoint to archive communications older than the retention cutoff now"""
+        try:
+            result = communication_retention.archive(dry_run=request.args.get('dry_run', '').lower() == 'true')
+            return jsonify({'success': True, 'result': result})
+        except Exception as e:
+            logger.error(f"Error archiving communications: {e}")
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    @app.route('/api/prefetch/status')
+    def prefetch_status():
+        """API endpoint for disruption prefetch queue and cache statistics"""
+        prefetcher = get_prefetcher()
+        if not prefetcher:
+            return jsonify({'success': True, 'enabled': False})
+        return jsonify({'success': True, 'enabled': True, 'stats': prefetcher.get_stats()})
+
     @app.route('/api/communications/<int:disruption_id>')
     def get_communications(disruption_id):
         """API endpoint to get communications for a specific disruption (MongoDB version)"""
         try:
-            # Get communications from MongoDB
-            communications = list(mongo_db['agent_communications'].find({'disruption_id': disruption_id}).sort('timestamp', -1).limit(20))
-            comm_list = []
-            for comm in communications:
-                try:
-                    content_dict = json.loads(comm.get('content', '{}')) if comm.get('content') else {}
-                except:
-                    content_dict = {}
-                comm_data = {
-                    'id': comm.get('id'),
-                    'sender': comm.get('sender'),
-                    'receiver': comm.get('receiver'),
-                    'message_type': comm.get('message_type'),
-                    'content': comm.get('content'),
-                    'content_dict': content_dict,
-                    'timestamp': comm.get('timestamp'),
-                    'processed': comm.get('processed')
-                }
-                comm_list.append(comm_data)
+            # Get communications from MongoDB; ?summary=true skips the full agent result payloads
+            communications = communication_store.find({'disruption_id': disruption_id},
+                                                      summary=request.args.get('summary', '').lower() == 'true',
+                                                      limit=20)
+            comm_list = [CommunicationStore.to_api(comm) for comm in communications]
             return jsonify({
                 'success': True,
-                'communications': comm_list
+                'communications': comm_list,
+                'archive': communication_store.get_summary(disruption_id)
             })
         except Exception as e:
             logger.error(f"Error getting communications for disruption {disruption_id} (MongoDB): {e}")
@@ -519,24 +833,9 @@ def register_routes(app):
         """API endpoint to get recent communications for agent chatter (MongoDB version)"""
         try:
             # Get recent communications from the database
-            communications = list(mongo_db['agent_communications'].find().sort('timestamp', -1).limit(10))
-            comm_list = []
-            for comm in communications:
-                try:
-                    content_dict = json.loads(comm.get('content', '{}')) if comm.get('content') else {}
-                except:
-                    content_dict = {}
-                comm_data = {
-                    'id': comm.get('id'),
-                    'sender': comm.get('sender'),
-                    'receiver': comm.get('receiver'),
-                    'message_type': comm.get('message_type'),
-                    'content': comm.get('content'),
-                    'content_dict': content_dict,
-                    'timestamp': comm.get('timestamp'),
-                    'processed': comm.get('processed')
-                }
-                comm_list.append(comm_data)
+            communications = communication_store.find(summary=request.args.get('summary', '').lower() == 'true',
+                                                      limit=10)
+            comm_list = [CommunicationStore.to_api(comm) for comm in communications]
             # If no communications in database, return mock data
             if not comm_list:
                 comm_list = [
@@ -545,7 +844,7 @@ def register_routes(app):
                         'sender': 'Passenger Rebooking Agent',
                         'receiver': 'Customer Communication Agent',
                         'message_type': 'status_update',
-                        'content': 'Processing 15 rebookings for weather disruption',
+                        'content': {'message': 'Processing 15 rebookings for weather disruption'},
                         'timestamp': datetime.utcnow().isoformat(),
                         'processed': True
                     },
@@ -554,7 +853,7 @@ def register_routes(app):
                         'sender': 'Crew Scheduling Agent',
                         'receiver': 'Airport Resource Agent',
                         'message_type': 'status_update',
-                        'content': 'Duty time compliance check completed',
+                        'content': {'message': 'Duty time compliance check completed'},
                         'timestamp': (datetime.utcnow() - timedelta(minutes=5)).isoformat(),
                         'processed': True
                     },
@@ -563,7 +862,7 @@ def register_routes(app):
                         'sender': 'Aircraft Maintenance Agent',
                         'receiver': 'Crew Scheduling Agent',
                         'message_type': 'status_update',
-                        'content': 'Aircraft inspection scheduled for Gate 15',
+                        'content': {'message': 'Aircraft inspection scheduled for Gate 15'},
                         'timestamp': (datetime.utcnow() - timedelta(minutes=8)).isoformat(),
                         'processed': True
                     },
@@ -572,7 +871,7 @@ def register_routes(app):
                         'sender': 'Customer Communication Agent',
                         'receiver': 'Passenger Rebooking Agent',
                         'message_type': 'status_update',
-                        'content': 'Passenger notifications sent - 234 SMS delivered',
+                        'content': {'message': 'Passenger notifications sent - 234 SMS delivered'},
                         'timestamp': (datetime.utcnow() - timedelta(minutes=12)).isoformat(),
                         'processed': True
                     }
@@ -650,16 +949,8 @@ def register_routes(app):
         """Test endpoint to create and retrieve a communication record (MongoDB version)"""
         try:
             # Create a test communication record
-            test_comm = {
-                'id': int(mongo_db['agent_communications'].estimated_document_count()) + 1,
-                'sender': 'Test Agent',
-                'receiver': 'Test Receiver',
-                'message_type': 'test_message',
-                'content': '{"test": "data"}',
-                'processed': False,
-                'disruption_id': 999,
-                'timestamp': datetime.utcnow().isoformat()
-            }
+            test_comm = communication_store.build('Test Agent', 'Test Receiver', 'test_message', {'test': 'data'}, 999,
+                                                  id=sequence_service.next_id('agent_communications'))
             mongo_db['agent_communications'].insert_one(test_comm)
             # Retrieve the record
             retrieved_comm = mongo_db['agent_communications'].find_one({'disruption_id': 999, 'sender': 'Test Agent'})
@@ -691,17 +982,14 @@ def register_routes(app):
         """API endpoint to create a test communication (MongoDB version)"""
         try:
             data = request.get_json() or {}
-            test_comm = {
-                'id': int(mongo_db['agent_communications'].estimated_document_count()) + 1,
-                'sender': data.get('sender', 'Test Agent'),
-                'receiver': data.get('receiver', 'Test Receiver'),
-                'message_type': data.get('message_type', 'test'),
-                'content': json.dumps(data.get('message', {'test': 'data', 'disruption_id': disruption_id})),
-                'processed': False,
-                'disruption_id': disruption_id,
-                'timestamp': datetime.utcnow().isoformat()
-            }
-            mongo_db['agent_communications'].insert_one(test_comm)
+            test_comm = communication_store.send(
+                data.get('sender', 'Test Agent'),
+                data.get('receiver', 'Test Receiver'),
+                data.get('message_type', 'test'),
+                data.get('message', {'test': 'data', 'disruption_id': disruption_id}),
+                disruption_id,
+                id=sequence_service.next_id('agent_communications')
+            )
             logger.info(f"Test communication created for disruption {disruption_id} (MongoDB)")
             return jsonify({
                     'success': True,
@@ -870,11 +1158,12 @@ def timeago_filter(dt):
         return "Never"
     
     now = datetime.utcnow()
-    if isinstance(dt, str):
-        try:
-            dt = datetime.fromisoformat(dt.replace('Z', '+00:00'))
-        except:
+    if not isinstance(dt, datetime):
+        # Legacy ISO strings from before the BSON date migration
+        parsed = to_datetime(dt)
+        if parsed is None:
             return dt
+        dt = parsed
     
     diff = now - dt
     
@@ -0,0 +1,135 @@
+import logging
+import math
+from typing import Any, Dict, List, Optional
+from pymongo import UpdateOne
+from mongo_utils import mongo_db
+from services.date_utils import to_datetime, utcnow
+from services.unit_of_work import deferred_bulk_write, deferred_update
+
+STATS_COLLECTION = 'agent_comm_stats'
+
+def _percentile(samples: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of a small sample"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return round(ordered[rank], 3)
+
+class AgentCommunicationStatsService:
+    """Keeps per-agent sent/received counters, last activity and response times.
+
+    Counters are updated as messages are written, so reading them costs one
+    small query regardless of how much communication history exists.
+    rebuild() recomputes everything from agent_communications in a single
+    $group aggregation for backfills and repairs.
+    """
+
+    # Response-time samples kept per agent for percentile estimates
+    RESPONSE_TIME_SAMPLES = 200
+
+    def record_message(self, sender: str, receiver: str, timestamp=None):
+        """Increment sent/received counters for one written message"""
+        try:
+            last_activity = to_datetime(timestamp) or utcnow()
+            deferred_bulk_write(STATS_COLLECTION, [
+                UpdateOne({'agent': sender},
+                          {'$inc': {'sent': 1}, '$max': {'last_activity': last_activity}},
+                          upsert=True),
+                UpdateOne({'agent': receiver},
+                          {'$inc': {'received': 1}, '$max': {'last_activity': last_activity}},
+                          upsert=True)
+            ])
+        except Exception as e:
+            logging.error(f"Error recording communication stats: {e}")
+
+    def record_response_time(self, agent: str, sent_at, processed_at=None):
+        """Record how long a message waited before the receiving agent processed it"""
+        try:
+            sent = to_datetime(sent_at)
+            processed = to_datetime(processed_at) or utcnow()
+            if sent is None:
+                return
+            seconds = max(0.0, (processed - sent).total_seconds())
+            deferred_update(
+                STATS_COLLECTION,
+                {'agent': agent},
+                {'$push': {'response_times': {'$each': [seconds], '$slice': -self.RESPONSE_TIME_SAMPLES}}},
+                upsert=True
+            )
+        except Exception as e:
+            logging.error(f"Error recording response time for {agent}: {e}")
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Get counters and response-time percentiles keyed by agent name"""
+        stats = {}
+        try:
+            for doc in mongo_db[STATS_COLLECTION].find({}, {'_id': 0}):
+                samples = doc.get('response_times', [])
+                sent = doc.get('sent', 0)
+                received = doc.get('received', 0)
+                stats[doc['agent']] = {
+                    'sent': sent,
+                    'received': received,
+                    'total': sent + received,
+                    'last_activity': doc.get('last_activity'),
+                    'response_time_p50': _percentile(samples, 50),
+                    'response_time_p95': _percentile(samples, 95),
+                    'response_time_p99': _percentile(samples, 99)
+                }
+        except Exception as e:
+            logging.error(f"Error reading communication stats: {e}")
+        return stats
+
+    def rebuild(self) -> int:
+        """Recompute all counters from agent_communications in one aggregation"""
+        pipeline = [
+            {'$project': {
+                'timestamp': 1,
+                'participants': [
+                    {'agent': '$sender', 'sent': 1, 'received': 0, 'response_time': None},
+                    {'agent': '$receiver', 'sent': 0, 'received': 1, 'response_time': {
+                        '$cond': [
+                            {'$and': [{'$eq': ['$processed', True]}, {'$ifNull': ['$processed_at', False]}]},
+                            {'$divide': [{'$subtract': [{'$toDate': '$processed_at'}, {'$toDate': '$timestamp'}]}, 1000]},
+                            None
+                        ]
+                    }}
+                ]
+            }},
+            {'$unwind': '$participants'},
+            # Order samples last (oldest to newest) so $lastN keeps the newest response times
+            {'$addFields': {'has_response_time': {'$cond': [{'$eq': ['$participants.response_time', None]}, 0, 1]}}},
+            {'$sort': {'has_response_time': 1, 'timestamp': 1}},
+            {'$group': {
+                '_id': '$participants.agent',
+                'sent': {'$sum': '$participants.sent'},
+                'received': {'$sum': '$participants.received'},
+                'last_activity': {'$max': '$timestamp'},
+                'response_times': {'$lastN': {'input': '$participants.response_time', 'n': self.RESPONSE_TIME_SAMPLES}}
+            }}
+        ]
+        try:
+            rebuilt = []
+            for doc in mongo_db['agent_communications'].aggregate(pipeline, allowDiskUse=True):
+                if not doc['_id']:
+                    continue
+                rebuilt.append({
+                    'agent': doc['_id'],
+                    'sent': doc['sent'],
+                    'received': doc['received'],
+                    'last_activity': doc['last_activity'],
+                    'response_times': [t for t in doc.get('response_times', []) if t is not None]
+                })
+            mongo_db[STATS_COLLECTION].delete_many({})
+            if rebuilt:
+                mongo_db[STATS_COLLECTION].insert_many(rebuilt)
+            logging.info(f"Rebuilt communication stats for {len(rebuilt)} agents")
+            return len(rebuilt)
+        except Exception as e:
+            logging.error(f"Error rebuilding communication stats: {e}")
+            return 0
+
+    def reset(self):
+        """Clear all counters (used when communications are wiped)"""
+        mongo_db[STATS_COLLECTION].delete_many({})
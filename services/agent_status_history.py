@@ -0,0 +1,181 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from pymongo import UpdateOne
+from config import Config
+from mongo_utils import mongo_db
+from services.date_utils import utcnow
+from services.unit_of_work import deferred_bulk_write, deferred_insert
+
+HISTORY_COLLECTION = 'agent_status_history'
+ROLLUPS_COLLECTION = 'agent_status_rollups'
+
+# Time spent in this status counts as busy time, and leaving it completes (or fails) a task
+BUSY_STATUS = 'processing'
+FAILED_STATUS = 'error'
+
+def _status_value(status: Any) -> Optional[str]:
+    return getattr(status, 'value', status)
+
+def _minute(moment: datetime) -> datetime:
+    return moment.replace(second=0, microsecond=0)
+
+def _split_by_minute(start: datetime, end: datetime) -> Iterator[Tuple[datetime, float]]:
+    """Yield (minute, seconds) for each minute bucket the interval [start, end) overlaps"""
+    cursor = start
+    while cursor < end:
+        bucket = _minute(cursor)
+        bucket_end = min(end, bucket + timedelta(minutes=1))
+        yield bucket, (bucket_end - cursor).total_seconds()
+        cursor = bucket_end
+
+def _rollup_increments(previous_status: Optional[str], entered_at: Optional[datetime],
+                       status: Optional[str], at: datetime) -> Dict[datetime, Dict[str, Dict[str, float]]]:
+    """Per-minute rollup updates for one status transition"""
+    updates = {_minute(at): {'$inc': {'transitions': 1}}}
+    if previous_status != BUSY_STATUS or entered_at is None or entered_at > at:
+        return updates
+    for bucket, seconds in _split_by_minute(entered_at, at):
+        updates.setdefault(bucket, {'$inc': {}})['$inc']['busy_seconds'] = seconds
+    latency = (at - entered_at).total_seconds()
+    ended = updates[_minute(at)]
+    ended['$inc'].update({
+        'errors' if status == FAILED_STATUS else 'tasks_completed': 1,
+        'latency_total_seconds': latency,
+        'latency_count': 1
+    })
+    ended['$max'] = {'latency_max_seconds': latency}
+    return updates
+
+class AgentStatusHistoryService:
+    """Appends agent status transitions to a time-series collection and keeps per-minute rollups.
+
+    Every transition is one insert into agent_status_history (metaField
+    'agent') plus upserts into agent_status_rollups: busy seconds, completed
+    and failed tasks, and task latency per agent per minute. Utilization and
+    response-time reads only touch the rollups; rebuild_rollups() replays the
+    history for backfills and repairs.
+    """
+
+    def record_transition(self, agent: str, status: Any, task: Optional[str] = None,
+                          previous_status: Any = None, entered_at: Optional[datetime] = None,
+                          at: Optional[datetime] = None):
+        """Record that an agent moved from previous_status (held since entered_at) to status"""
+        if not Config.AGENT_STATUS_HISTORY_ENABLED:
+            return
+        try:
+            at = at or utcnow()
+            status = _status_value(status)
+            previous_status = _status_value(previous_status)
+            event = {
+                'timestamp': at,
+                'agent': agent,
+                'status': status,
+                'previous_status': previous_status,
+                'task': task
+            }
+            if entered_at is not None:
+                event['previous_duration_seconds'] = max(0.0, (at - entered_at).total_seconds())
+            deferred_insert(HISTORY_COLLECTION, event)
+            self._apply_rollups(agent, _rollup_increments(previous_status, entered_at, status, at))
+        except Exception as e:
+            logging.error(f"Error recording status history for {agent}: {e}")
+
+    def _apply_rollups(self, agent: str, updates: Dict[datetime, Dict[str, Dict[str, float]]]):
+        deferred_bulk_write(ROLLUPS_COLLECTION, [
+            UpdateOne({'agent': agent, 'minute': minute}, update, upsert=True)
+            for minute, update in updates.items()
+        ])
+
+    def get_history(self, agent: Optional[str] = None, start: Optional[datetime] = None,
+                    end: Optional[datetime] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """Raw transitions, newest first"""
+        query = self._range_query('timestamp', agent, start, end)
+        return list(mongo_db[HISTORY_COLLECTION].find(query, {'_id': 0}).sort('timestamp', -1).limit(limit))
+
+    def get_rollups(self, agent: Optional[str] = None, start: Optional[datetime] = None,
+                    end: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Per-minute rollups with utilization and average latency, oldest first"""
+        query = self._range_query('minute', agent, start, end)
+        return [self._shape(doc) for doc in mongo_db[ROLLUPS_COLLECTION].find(query, {'_id': 0}).sort('minute', 1)]
+
+    def get_performance(self, window_minutes: int = None) -> Dict[str, Dict[str, Any]]:
+        """Per-agent utilization, success rate and average response time over the last window_minutes"""
+        window_minutes = window_minutes or Config.AGENT_PERFORMANCE_WINDOW_MINUTES
+        since = _minute(utcnow()) - timedelta(minutes=window_minutes - 1)
+        pipeline = [
+            {'$match': {'minute': {'$gte': since}}},
+            {'$group': {
+                '_id': '$agent',
+                'busy_seconds': {'$sum': '$busy_seconds'},
+                'tasks_completed': {'$sum': '$tasks_completed'},
+                'errors': {'$sum': '$errors'},
+                'latency_total_seconds': {'$sum': '$latency_total_seconds'},
+                'latency_count': {'$sum': '$latency_count'},
+                'latency_max_seconds': {'$max': '$latency_max_seconds'}
+            }}
+        ]
+        performance = {}
+        try:
+            for doc in mongo_db[ROLLUPS_COLLECTION].aggregate(pipeline):
+                agent = doc.pop('_id')
+                performance[agent] = self._shape(doc, window_minutes * 60)
+                performance[agent]['window_minutes'] = window_minutes
+        except Exception as e:
+            logging.error(f"Error reading agent performance rollups: {e}")
+        return performance
+
+    @staticmethod
+    def _range_query(field: str, agent: Optional[str], start: Optional[datetime], end: Optional[datetime]) -> Dict[str, Any]:
+        query = {}
+        if agent:
+            query['agent'] = agent
+        if start or end:
+            query[field] = {}
+            if start:
+                query[field]['$gte'] = start
+            if end:
+                query[field]['$lt'] = end
+        return query
+
+    @staticmethod
+    def _shape(doc: Dict[str, Any], period_seconds: float = 60) -> Dict[str, Any]:
+        """Add derived utilization, success rate and average latency to a rollup"""
+        busy = doc.get('busy_seconds') or 0
+        completed = doc.get('tasks_completed') or 0
+        errors = doc.get('errors') or 0
+        latency_count = doc.get('latency_count') or 0
+        return dict(
+            doc,
+            busy_seconds=round(busy, 3),
+            tasks_completed=completed,
+            errors=errors,
+            utilization=round(min(1.0, busy / period_seconds), 4),
+            success_rate=round(completed / (completed + errors) * 100, 1) if completed + errors else None,
+            average_response_time=round(doc.get('latency_total_seconds', 0) / latency_count, 3) if latency_count else None
+        )
+
+    def rebuild_rollups(self, since: Optional[datetime] = None) -> int:
+        """Recompute rollups by replaying the history in time order"""
+        query = {'timestamp': {'$gte': since}} if since else {}
+        try:
+            if since:
+                mongo_db[ROLLUPS_COLLECTION].delete_many({'minute': {'$gte': _minute(since)}})
+            else:
+                mongo_db[ROLLUPS_COLLECTION].delete_many({})
+            replayed = 0
+            for event in mongo_db[HISTORY_COLLECTION].find(query).sort([('agent', 1), ('timestamp', 1)]):
+                entered_at = None
+                if event.get('previous_duration_seconds') is not None:
+                    entered_at = event['timestamp'] - timedelta(seconds=event['previous_duration_seconds'])
+                updates = _rollup_increments(event.get('previous_status'), entered_at, event.get('status'), event['timestamp'])
+                if since:
+                    # Busy time before the cutoff belongs to rollups that were kept
+                    updates = {minute: update for minute, update in updates.items() if minute >= _minute(since)}
+                self._apply_rollups(event['agent'], updates)
+                replayed += 1
+            logging.info(f"Rebuilt agent status rollups from {replayed} transitions")
+            return replayed
+        except Exception as e:
+            logging.error(f"Error rebuilding agent status rollups: {e}")
+            return 0
@@ -1,4 +1,5 @@
 from mongo_utils import mongo_db
+from services.flight_repository import flight_repository
 from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional
 from models import Flight, Disruption, AgentCommunication, DisruptionType
@@ -15,7 +16,7 @@ class BusinessMetricsService:
         disruption = mongo_db['disruptions'].find_one({'id': disruption_id})
         if not disruption:
             return None
-        affected_flights = list(mongo_db['flights'].find({'id': {'$in': disruption.get('affected_flight_list', [])}}))
+        affected_flights = flight_repository.get_many(disruption.get('affected_flight_list', []))
         # ... rest of logic, using dicts ...
         # Replace all ORM model access with dict access
         # Replace all .query with mongo_db['collection'].find/find_one
@@ -31,7 +32,7 @@ class BusinessMetricsService:
                 return {"error": "Disruption not found"}
             
             # Get affected flights
-            affected_flights = list(mongo_db['flights'].find({'id': {'$in': disruption.get('affected_flight_list', [])}}))
+            affected_flights = flight_repository.get_many(disruption.get('affected_flight_list', []))
             
             # Calculate various business metrics
             metrics = {
@@ -440,8 +441,10 @@ class BusinessMetricsService:
     def _get_coordination_effectiveness(self, disruption_id: int) -> Dict[str, Any]:
         """Analyze coordination effectiveness"""
         # Get communications for this disruption
-        communications = list(mongo_db['agent_communications'].find({'disruption_id': disruption_id}))
-        total_messages = len(communications)
+        # Live messages plus those already compacted into the disruption's archive summary
+        total_messages = mongo_db['agent_communications'].count_documents({'disruption_id': disruption_id})
+        archive = mongo_db['communication_summaries'].find_one({'disruption_id': disruption_id}, {'message_count': 1})
+        total_messages += (archive or {}).get('message_count', 0)
         return {
             "communication_metrics": {
                 "total_messages": total_messages,
@@ -0,0 +1,148 @@
+import logging
+import threading
+from datetime import timedelta
+from typing import Any, Dict, List
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from config import Config
+from mongo_utils import mongo_db
+from services.communication_store import COMMUNICATIONS_COLLECTION, SUMMARIES_COLLECTION
+from services.date_utils import utcnow
+
+DUPLICATE_KEY = 11000
+
+def _field_key(value: Any) -> str:
+    """Make a sender/message type usable as a document key"""
+    return str(value or 'unknown').replace('.', '_').replace('$', '_')
+
+class CommunicationRetentionService:
+    """Compacts old agent_communications into per-disruption summaries.
+
+    Raw messages older than COMMUNICATION_ARCHIVE_AFTER_HOURS are folded into
+    one communication_summaries document per disruption (counts by type and
+    sender, first/last timestamps, last status) and then deleted. The TTL
+    index on timestamp removes anything the archiver never reaches.
+    """
+
+    def __init__(self, archive_after_hours: int = None, batch_size: int = 1000):
+        self.archive_after_hours = archive_after_hours if archive_after_hours is not None else Config.COMMUNICATION_ARCHIVE_AFTER_HOURS
+        self.batch_size = batch_size
+        self._worker = None
+        self._stop = threading.Event()
+        self.last_run = None
+
+    def archive(self, dry_run: bool = False) -> Dict[str, Any]:
+        """Fold every communication older than the archive cutoff into its disruption summary"""
+        cutoff = utcnow() - timedelta(hours=self.archive_after_hours)
+        expired = {'timestamp': {'$lt': cutoff}}
+        if dry_run:
+            archived = mongo_db[COMMUNICATIONS_COLLECTION].count_documents(expired)
+            disruptions = set(mongo_db[COMMUNICATIONS_COLLECTION].distinct('disruption_id', expired))
+        else:
+            archived = 0
+            disruptions = set()
+            while True:
+                batch = list(mongo_db[COMMUNICATIONS_COLLECTION].find(
+                    expired, {'sender': 1, 'message_type': 1, 'disruption_id': 1, 'timestamp': 1, 'content.status': 1}
+                ).sort('_id', 1).limit(self.batch_size))
+                if not batch:
+                    break
+                self._write_summaries(batch)
+                mongo_db[COMMUNICATIONS_COLLECTION].delete_many({'_id': {'$in': [doc['_id'] for doc in batch]}})
+                disruptions.update(doc.get('disruption_id') for doc in batch)
+                archived += len(batch)
+        result = {
+            'cutoff': cutoff,
+            'archived': archived,
+            'disruptions': len(disruptions),
+            'dry_run': dry_run
+        }
+        if not dry_run:
+            self.last_run = dict(result, finished_at=utcnow())
+        logging.info(f"Communication archive: {archived} messages from {len(disruptions)} disruptions older than {cutoff}")
+        return result
+
+    def _write_summaries(self, batch: List[Dict[str, Any]]):
+        """Upsert one summary per disruption for this batch.
+
+        Each update is guarded by the batch's first _id, so re-running a batch
+        whose raw messages survived a crash does not count it twice.
+        """
+        batch_id = batch[0]['_id']
+        grouped = {}
+        for doc in batch:
+            grouped.setdefault(doc.get('disruption_id'), []).append(doc)
+        operations = []
+        status_updates = []
+        for disruption_id, docs in grouped.items():
+            increments = {'message_count': len(docs)}
+            for doc in docs:
+                type_key = f"by_message_type.{_field_key(doc.get('message_type'))}"
+                sender_key = f"by_sender.{_field_key(doc.get('sender'))}"
+                increments[type_key] = increments.get(type_key, 0) + 1
+                increments[sender_key] = increments.get(sender_key, 0) + 1
+            dated = sorted((doc for doc in docs if doc.get('timestamp')), key=lambda doc: doc['timestamp'])
+            timestamps = [doc['timestamp'] for doc in dated]
+            update = {
+                '$inc': increments,
+                '$set': {'last_batch_id': batch_id, 'archived_at': utcnow()}
+            }
+            if timestamps:
+                update['$min'] = {'first_timestamp': min(timestamps)}
+                update['$max'] = {'last_timestamp': max(timestamps)}
+            operations.append(UpdateOne(
+                {'disruption_id': disruption_id, 'last_batch_id': {'$ne': batch_id}}, update, upsert=True
+            ))
+            statuses = [doc for doc in dated if isinstance(doc.get('content'), dict) and doc['content'].get('status')]
+            if statuses:
+                # Batches run in _id order, not time order, so only move last_status forward in time
+                latest = statuses[-1]
+                status_updates.append(UpdateOne(
+                    {'disruption_id': disruption_id, '$or': [{'last_status_at': {'$exists': False}},
+                                                             {'last_status_at': {'$lt': latest['timestamp']}}]},
+                    {'$set': {'last_status': latest['content']['status'], 'last_status_at': latest['timestamp']}}
+                ))
+        try:
+            mongo_db[SUMMARIES_COLLECTION].bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            # An upsert that hits the unique disruption_id index means that summary already has this batch
+            errors = [error for error in e.details.get('writeErrors', []) if error.get('code') != DUPLICATE_KEY]
+            if errors:
+                raise
+        if status_updates:
+            mongo_db[SUMMARIES_COLLECTION].bulk_write(status_updates, ordered=False)
+
+    def start_archiver(self, interval_minutes: int = None):
+        """Run archive() periodically in a daemon thread (once per process)"""
+        interval_minutes = Config.COMMUNICATION_ARCHIVE_INTERVAL_MINUTES if interval_minutes is None else interval_minutes
+        if interval_minutes <= 0 or (self._worker and self._worker.is_alive()):
+            return
+        self._stop.clear()
+        self._worker = threading.Thread(target=self._run, args=(interval_minutes * 60,),
+                                        name='communication-archiver', daemon=True)
+        self._worker.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self, interval_seconds: float):
+        while not self._stop.wait(interval_seconds):
+            try:
+                self.archive()
+            except Exception as e:
+                logging.error(f"Communication archive error: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Raw vs archived volume and the retention settings in force"""
+        return {
+            'live_window_hours': Config.COMMUNICATION_LIVE_WINDOW_HOURS,
+            'archive_after_hours': self.archive_after_hours,
+            'ttl_days': Config.COMMUNICATION_TTL_DAYS,
+            'raw_messages': mongo_db[COMMUNICATIONS_COLLECTION].estimated_document_count(),
+            'summaries': mongo_db[SUMMARIES_COLLECTION].estimated_document_count(),
+            'archiver_running': bool(self._worker and self._worker.is_alive()),
+            'last_run': self.last_run
+        }
+
+# Shared by the app's background archiver and the admin endpoint
+communication_retention = CommunicationRetentionService()
@@ -0,0 +1,154 @@
+import json
+import logging
+from datetime import date, datetime, timedelta
+from enum import Enum
+from typing import Any, Dict, List, Optional
+from pymongo import UpdateOne
+from config import Config
+from mongo_utils import mongo_db
+from services.agent_stats_service import AgentCommunicationStatsService
+from services.date_utils import utcnow
+from services.unit_of_work import deferred_insert
+
+COMMUNICATIONS_COLLECTION = 'agent_communications'
+SUMMARIES_COLLECTION = 'communication_summaries'
+
+# 1: content stored as a JSON string; 2: content stored as an embedded document
+SCHEMA_VERSION = 2
+
+# Fields the dashboard/agents views need; skips the (potentially large) agent result payloads
+SUMMARY_PROJECTION = {
+    '_id': 1, 'id': 1, 'sender': 1, 'receiver': 1, 'message_type': 1, 'disruption_id': 1,
+    'processed': 1, 'timestamp': 1, 'schema_version': 1,
+    'content.disruption_id': 1, 'content.flight_id': 1, 'content.message': 1, 'content.status': 1
+}
+
+def to_document(value: Any) -> Any:
+    """Make a value BSON-encodable: string keys, lists for tuples/sets, enum values"""
+    if isinstance(value, dict):
+        return {str(key): to_document(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple, set)):
+        return [to_document(item) for item in value]
+    if isinstance(value, Enum):
+        return to_document(value.value)
+    if isinstance(value, datetime) or value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, date):
+        return datetime.combine(value, datetime.min.time())
+    return str(value)
+
+def content_from_legacy(content: Any) -> Dict[str, Any]:
+    """Turn a schema-1 JSON string (or plain text) into an embedded document"""
+    if isinstance(content, dict):
+        return content
+    if not content:
+        return {}
+    try:
+        parsed = json.loads(content)
+    except (TypeError, ValueError):
+        return {'text': str(content)}
+    return parsed if isinstance(parsed, dict) else {'value': parsed}
+
+def read_content(comm: Dict[str, Any]) -> Dict[str, Any]:
+    """Content of a stored communication, tolerating rows not yet migrated"""
+    return content_from_legacy(comm.get('content'))
+
+def live_window_start(now: datetime = None) -> datetime:
+    """Oldest timestamp hot-path queries look at; older chatter is archived or expired"""
+    return (now or utcnow()) - timedelta(hours=Config.COMMUNICATION_LIVE_WINDOW_HOURS)
+
+def live_query(query: Dict[str, Any] = None) -> Dict[str, Any]:
+    """Bound a communications filter to the live window"""
+    bounded = dict(query or {})
+    bounded['timestamp'] = {'$gte': live_window_start()}
+    return bounded
+
+class CommunicationStore:
+    """Writes and reads agent_communications with content as an embedded document"""
+
+    def __init__(self, stats_service: AgentCommunicationStatsService = None):
+        self.stats = stats_service or AgentCommunicationStatsService()
+
+    def build(self, sender: str, receiver: str, message_type: str, content: Any,
+              disruption_id: Optional[int] = None, **extra) -> Dict[str, Any]:
+        """Build a communication document ready for insertion"""
+        doc = {
+            'sender': sender,
+            'receiver': receiver,
+            'message_type': message_type,
+            'content': to_document(content_from_legacy(content)),
+            'schema_version': SCHEMA_VERSION,
+            'processed': False,
+            'timestamp': utcnow()
+        }
+        if disruption_id is not None:
+            doc['disruption_id'] = disruption_id
+        doc.update(extra)
+        return doc
+
+    def send(self, sender: str, receiver: str, message_type: str, content: Any,
+             disruption_id: Optional[int] = None, **extra) -> Dict[str, Any]:
+        """Insert a communication and update the sender/receiver counters"""
+        doc = self.build(sender, receiver, message_type, content, disruption_id, **extra)
+        deferred_insert(COMMUNICATIONS_COLLECTION, doc)
+        self.stats.record_message(sender, receiver, doc['timestamp'])
+        return doc
+
+    def find(self, query: Dict[str, Any] = None, summary: bool = False, sort_direction: int = -1,
+             limit: int = 0, live_only: bool = True) -> List[Dict[str, Any]]:
+        """Fetch communications newest first (or oldest first), optionally only summary fields.
+
+        By default only the live window is read, so the sort never walks the
+        whole collection; pass live_only=False for historical queries.
+        """
+        projection = SUMMARY_PROJECTION if summary else None
+        query = live_query(query) if live_only else (query or {})
+        cursor = mongo_db[COMMUNICATIONS_COLLECTION].find(query, projection).sort('timestamp', sort_direction)
+        if limit:
+            cursor = cursor.limit(limit)
+        return list(cursor)
+
+    def get_summary(self, disruption_id: int) -> Optional[Dict[str, Any]]:
+        """Archived summary of a disruption's communications, if any have been compacted"""
+        return mongo_db[SUMMARIES_COLLECTION].find_one({'disruption_id': disruption_id}, {'_id': 0, 'last_batch_id': 0})
+
+    @staticmethod
+    def to_api(comm: Dict[str, Any]) -> Dict[str, Any]:
+        """Shape a stored communication for JSON responses and templates"""
+        content = read_content(comm)
+        return {
+            'id': comm.get('id'),
+            'sender': comm.get('sender'),
+            'receiver': comm.get('receiver'),
+            'message_type': comm.get('message_type'),
+            'disruption_id': comm.get('disruption_id'),
+            'content': content,
+            'content_dict': content,
+            'timestamp': comm.get('timestamp'),
+            'processed': comm.get('processed')
+        }
+
+def migrate_legacy_content(batch_size: int = 1000, dry_run: bool = False) -> Dict[str, int]:
+    """Rewrite schema-1 rows (JSON string content) as embedded documents in _id-ordered batches"""
+    legacy = {'$or': [{'schema_version': {'$exists': False}}, {'schema_version': {'$lt': SCHEMA_VERSION}}]}
+    scanned = updated = 0
+    last_id = None
+    while True:
+        query = legacy if last_id is None else {'$and': [legacy, {'_id': {'$gt': last_id}}]}
+        batch = list(mongo_db[COMMUNICATIONS_COLLECTION].find(query, {'content': 1}).sort('_id', 1).limit(batch_size))
+        if not batch:
+            break
+        last_id = batch[-1]['_id']
+        operations = [
+            UpdateOne({'_id': doc['_id']}, {'$set': {
+                'content': to_document(content_from_legacy(doc.get('content'))),
+                'schema_version': SCHEMA_VERSION
+            }})
+            for doc in batch
+        ]
+        scanned += len(batch)
+        if not dry_run:
+            mongo_db[COMMUNICATIONS_COLLECTION].bulk_write(operations, ordered=False)
+        updated += len(operations)
+    logging.info(f"Communication content migration: {updated} of {scanned} legacy rows converted")
+    return {'scanned': scanned, 'updated': updated}
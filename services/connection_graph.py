@@ -0,0 +1,155 @@
+from typing import Any, Dict, Iterable, List, Optional
+import numpy as np
+from config import Config
+from models import AIRPORTS
+from services.flight_window import FlightWindowService, epoch_minutes
+
+# Share of an inbound flight's passengers estimated to connect (no PNR data yet)
+CONNECTING_SHARE = 0.3
+
+GRAPH_FIELDS = {'_id': 0, 'id': 1, 'flight_number': 1, 'origin': 1, 'destination': 1,
+                'scheduled_departure': 1, 'scheduled_arrival': 1, 'passenger_count': 1}
+
+class ConnectionGraph:
+    """Inbound -> outbound connections at every airport for a window of flights.
+
+    Flights are numbered 0..n-1. Connections are stored as parallel arrays
+    sorted by inbound flight, with offsets giving each inbound flight's
+    slice (CSR), so one flight's onward connections are a slice and a
+    network-wide delay query is a handful of array operations. A connection
+    exists when the outbound leg leaves between the minimum connect time and
+    CONNECTION_MAX_MINUTES after the inbound leg lands, and doesn't fly
+    straight back to where the inbound leg came from. slack is how many
+    minutes of inbound delay the connection can absorb.
+
+    Without itinerary data, each inbound flight's CONNECTING_SHARE of
+    passengers is spread evenly over its onward connections.
+    """
+
+    def __init__(self, flights: List[Dict[str, Any]], mct_domestic: int, mct_international: int, max_connect: int):
+        self.flight_ids = [flight['id'] for flight in flights]
+        self.flight_numbers = [flight.get('flight_number', '') for flight in flights]
+        self.index = {flight_id: position for position, flight_id in enumerate(self.flight_ids)}
+        count = len(flights)
+
+        airports = sorted({flight.get('origin', '') for flight in flights} | {flight.get('destination', '') for flight in flights})
+        airport_codes = {airport: code for code, airport in enumerate(airports)}
+        origin = np.array([airport_codes[flight.get('origin', '')] for flight in flights], dtype=np.int32)
+        destination = np.array([airport_codes[flight.get('destination', '')] for flight in flights], dtype=np.int32)
+        international_airport = np.array([AIRPORTS.get(airport, {}).get('hub') == 'international' for airport in airports], dtype=bool)
+        international = international_airport[origin] | international_airport[destination] if count else np.zeros(0, dtype=bool)
+        departure = epoch_minutes([flight['scheduled_departure'] for flight in flights]) if count else np.zeros(0, dtype=np.int64)
+        arrival = epoch_minutes([flight['scheduled_arrival'] for flight in flights]) if count else np.zeros(0, dtype=np.int64)
+        passengers = np.array([flight.get('passenger_count') or 0 for flight in flights], dtype=np.float64)
+
+        sources, targets = [], []
+        for airport in range(len(airports)):
+            inbound = np.flatnonzero(destination == airport)
+            outbound = np.flatnonzero(origin == airport)
+            if not len(inbound) or not len(outbound):
+                continue
+            outbound = outbound[np.argsort(departure[outbound], kind='stable')]
+            outbound_departure = departure[outbound]
+            # Widest possible window per inbound flight; the per-pair connect time is applied below
+            low = np.searchsorted(outbound_departure, arrival[inbound] + mct_domestic, side='left')
+            high = np.searchsorted(outbound_departure, arrival[inbound] + max_connect, side='right')
+            degree = high - low
+            total = int(degree.sum())
+            if not total:
+                continue
+            # Expand each [low, high) range into explicit outbound positions
+            starts = np.repeat(low - np.cumsum(degree) + degree, degree)
+            sources.append(np.repeat(inbound, degree))
+            targets.append(outbound[starts + np.arange(total)])
+        source = np.concatenate(sources) if sources else np.zeros(0, dtype=np.int64)
+        target = np.concatenate(targets) if targets else np.zeros(0, dtype=np.int64)
+
+        mct = np.where(international[source] | international[target], mct_international, mct_domestic)
+        slack = departure[target] - arrival[source] - mct
+        keep = (slack >= 0) & (destination[target] != origin[source])
+        source, target, slack = source[keep], target[keep], slack[keep]
+
+        order = np.argsort(source, kind='stable')
+        self.source = source[order]
+        self.target = target[order]
+        self.slack = slack[order]
+        degree = np.bincount(self.source, minlength=count)
+        self.offsets = np.concatenate(([0], np.cumsum(degree)))
+        share = np.divide(passengers * CONNECTING_SHARE, degree, out=np.zeros(count), where=degree > 0)
+        self.passengers = share[self.source]
+        self.connecting = np.where(degree > 0, passengers * CONNECTING_SHARE, 0.0)
+
+    @property
+    def size(self) -> Dict[str, int]:
+        return {'flights': len(self.flight_ids), 'connections': int(len(self.source))}
+
+    def connections_from(self, flight_id) -> List[Dict[str, Any]]:
+        """Onward connections of one inbound flight"""
+        position = self.index.get(flight_id)
+        if position is None:
+            return []
+        start, end = self.offsets[position], self.offsets[position + 1]
+        return [{
+            'flight_id': self.flight_ids[self.target[edge]],
+            'flight_number': self.flight_numbers[self.target[edge]],
+            'slack_minutes': int(self.slack[edge]),
+            'passengers': round(float(self.passengers[edge]), 1)
+        } for edge in range(start, end)]
+
+    def connecting_passengers(self, flight_ids: Iterable) -> Dict[Any, int]:
+        """Estimated passengers on each flight who connect onward"""
+        return {flight_id: int(self.connecting[self.index[flight_id]]) if flight_id in self.index else 0
+                for flight_id in flight_ids}
+
+    def misconnects(self, delays: Dict[Any, float], limit: Optional[int] = None) -> Dict[str, Any]:
+        """Connections, onward flights and passengers that break if flights are delayed.
+
+        delays maps flight id -> minutes of delay. A connection breaks when its
+        inbound flight's delay, less any delay to the outbound flight itself,
+        exceeds its slack.
+        """
+        count = len(self.flight_ids)
+        delay = np.zeros(count, dtype=np.float64)
+        for flight_id, minutes in delays.items():
+            position = self.index.get(flight_id)
+            if position is not None:
+                delay[position] = minutes or 0
+        broken = (delay[self.source] - delay[self.target]) > self.slack
+        by_onward = np.bincount(self.target[broken], weights=self.passengers[broken], minlength=count)
+        connections_by_onward = np.bincount(self.target[broken], minlength=count)
+        by_inbound = np.bincount(self.source[broken], weights=self.passengers[broken], minlength=count)
+
+        onward = np.flatnonzero(connections_by_onward)
+        onward = onward[np.argsort(-by_onward[onward], kind='stable')]
+        if limit is not None:
+            onward = onward[:limit]
+        inbound = np.flatnonzero(by_inbound)
+        return {
+            'connections_broken': int(broken.sum()),
+            'passengers_misconnecting': int(round(by_inbound.sum())),
+            'onward_flights_affected': int(np.count_nonzero(connections_by_onward)),
+            'onward_flights': [{
+                'flight_id': self.flight_ids[position],
+                'flight_number': self.flight_numbers[position],
+                'connections_broken': int(connections_by_onward[position]),
+                'passengers_misconnecting': int(round(by_onward[position]))
+            } for position in onward],
+            'misconnecting_by_flight': {self.flight_ids[position]: int(round(by_inbound[position])) for position in inbound}
+        }
+
+class ConnectionGraphService(FlightWindowService):
+    """Builds the connection graph for the current operating window and rebuilds it after a TTL"""
+
+    description = 'connection graph'
+    fields = GRAPH_FIELDS
+
+    def __init__(self, ttl_seconds: float = None):
+        super().__init__(ttl_seconds if ttl_seconds is not None else Config.CONNECTION_GRAPH_TTL_SECONDS,
+                         Config.CONNECTION_GRAPH_LOOKBACK_HOURS, Config.CONNECTION_GRAPH_HORIZON_HOURS)
+
+    def _create(self, flights: List[Dict[str, Any]]) -> ConnectionGraph:
+        return ConnectionGraph(flights, Config.CONNECTION_MCT_DOMESTIC_MINUTES,
+                               Config.CONNECTION_MCT_INTERNATIONAL_MINUTES, Config.CONNECTION_MAX_MINUTES)
+
+# Shared by every agent in the process
+connection_graph = ConnectionGraphService()
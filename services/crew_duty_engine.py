@@ -0,0 +1,208 @@
+from typing import Any, Dict, List
+import numpy as np
+from config import Config
+from models import AIRPORTS
+from services.flight_window import FlightWindowService, epoch_minutes
+
+# FAR 117 Table B: maximum unaugmented flight duty period in hours, by
+# scheduled report hour (acclimated local time) and number of segments (1..7+)
+FDP_LIMIT_HOURS = [
+    (0, 3, [9, 9, 9, 9, 9, 9, 9]),
+    (4, 4, [10, 10, 10, 10, 9, 9, 9]),
+    (5, 5, [12, 12, 12, 12, 11.5, 11, 10.5]),
+    (6, 6, [13, 13, 12, 12, 11.5, 11, 10.5]),
+    (7, 11, [14, 14, 13, 13, 12.5, 12, 11.5]),
+    (12, 12, [13, 13, 13, 13, 12.5, 12, 11.5]),
+    (13, 16, [12, 12, 12, 12, 11.5, 11, 10.5]),
+    (17, 21, [12, 12, 11, 11, 10, 9, 9]),
+    (22, 22, [11, 11, 10, 10, 9, 9, 9]),
+    (23, 23, [10, 10, 10, 9, 9, 9, 9]),
+]
+
+# FAR 117 Table A: maximum unaugmented flight time in hours, by report hour
+FLIGHT_TIME_LIMIT_HOURS = [
+    (0, 4, 8),
+    (5, 19, 9),
+    (20, 23, 8),
+]
+
+MAX_SEGMENTS = 7
+
+# Rest before a crew's first duty in the window is unknown; treat it as sufficient
+UNKNOWN_REST_MINUTES = 10 ** 6
+
+DUTY_FIELDS = {'_id': 0, 'id': 1, 'flight_number': 1, 'origin': 1, 'crew_list': 1,
+               'scheduled_departure': 1, 'scheduled_arrival': 1}
+
+def _fdp_table() -> np.ndarray:
+    table = np.zeros((24, MAX_SEGMENTS), dtype=np.int64)
+    for first, last, limits in FDP_LIMIT_HOURS:
+        table[first:last + 1] = [int(hours * 60) for hours in limits]
+    return table
+
+def _flight_time_table() -> np.ndarray:
+    table = np.zeros(24, dtype=np.int64)
+    for first, last, hours in FLIGHT_TIME_LIMIT_HOURS:
+        table[first:last + 1] = hours * 60
+    return table
+
+# Minutes, indexed [report hour, segments - 1] and [report hour]
+FDP_LIMIT_MINUTES = _fdp_table()
+FLIGHT_TIME_LIMIT_MINUTES = _flight_time_table()
+
+class CrewDutyState:
+    """Every crew member's duty periods in a window of flights, as NumPy arrays.
+
+    Each crew member's flights are grouped into duty periods wherever the
+    gap between them reaches the minimum rest. Per duty: report time (first
+    departure less the report allowance), FDP end (last arrival), segments,
+    flight minutes, rest before, and the FDP and flight-time limits looked
+    up from the report hour at the departure airport. check() applies delays
+    to every duty containing a delayed flight in one pass.
+    """
+
+    def __init__(self, flights: List[Dict[str, Any]], report_minutes: int, min_rest_minutes: int):
+        self.min_rest_minutes = min_rest_minutes
+        self.report_minutes = report_minutes
+        self.flight_ids = [flight['id'] for flight in flights]
+        self.flight_numbers = [flight.get('flight_number', '') for flight in flights]
+        self.flight_index = {flight_id: position for position, flight_id in enumerate(self.flight_ids)}
+        departure = epoch_minutes([flight['scheduled_departure'] for flight in flights]) if flights else np.zeros(0, dtype=np.int64)
+        arrival = epoch_minutes([flight['scheduled_arrival'] for flight in flights]) if flights else np.zeros(0, dtype=np.int64)
+        utc_offset = np.array([AIRPORTS.get(flight.get('origin'), {}).get('utc_offset', 0) * 60 for flight in flights],
+                              dtype=np.int64)
+
+        crew_codes: Dict[str, int] = {}
+        assignment_crew, assignment_flight = [], []
+        for position, flight in enumerate(flights):
+            for crew_id in dict.fromkeys(flight.get('crew_list') or []):
+                assignment_crew.append(crew_codes.setdefault(crew_id, len(crew_codes)))
+                assignment_flight.append(position)
+        self.crew_ids = list(crew_codes)
+        crew = np.array(assignment_crew, dtype=np.int64)
+        flight = np.array(assignment_flight, dtype=np.int64)
+
+        # Sort assignments by crew member, then departure, and cut duty periods at rest-length gaps
+        order = np.lexsort((departure[flight], crew)) if len(crew) else np.zeros(0, dtype=np.int64)
+        crew, flight = crew[order], flight[order]
+        new_duty = np.ones(len(crew), dtype=bool)
+        if len(crew) > 1:
+            new_duty[1:] = (crew[1:] != crew[:-1]) | (departure[flight[1:]] - arrival[flight[:-1]] >= min_rest_minutes)
+        self.departure = departure
+        self.assignment_duty = np.cumsum(new_duty) - 1
+        self.assignment_flight = flight
+        starts = np.flatnonzero(new_duty)
+
+        self.duty_crew = crew[starts]
+        self.duty_first_flight = flight[starts]
+        self.report = departure[flight[starts]] - report_minutes
+        self.fdp_end = np.maximum.reduceat(arrival[flight], starts) if len(starts) else np.zeros(0, dtype=np.int64)
+        self.segments = np.diff(np.append(starts, len(crew)))
+        self.flight_minutes = (np.add.reduceat(arrival[flight] - departure[flight], starts)
+                               if len(starts) else np.zeros(0, dtype=np.int64))
+        self.rest_before = np.full(len(starts), UNKNOWN_REST_MINUTES, dtype=np.int64)
+        if len(starts) > 1:
+            same_crew = self.duty_crew[1:] == self.duty_crew[:-1]
+            self.rest_before[1:] = np.where(same_crew, self.report[1:] - self.fdp_end[:-1], UNKNOWN_REST_MINUTES)
+        report_hour = ((self.report + utc_offset[flight[starts]]) // 60) % 24
+        self.fdp_limit = FDP_LIMIT_MINUTES[report_hour, np.minimum(self.segments, MAX_SEGMENTS) - 1]
+        self.flight_time_limit = FLIGHT_TIME_LIMIT_MINUTES[report_hour]
+
+    @property
+    def size(self) -> Dict[str, int]:
+        return {'flights': len(self.flight_ids), 'crew_members': len(self.crew_ids), 'duty_periods': int(len(self.report))}
+
+    def check(self, delays: Dict[Any, float], at_risk_minutes: int = None) -> Dict[str, Any]:
+        """Legality and remaining FDP margin of every duty period containing a delayed flight.
+
+        delays maps flight id -> minutes. A duty's FDP grows by the largest
+        delay among its flights; ground delay doesn't add flight time.
+        """
+        at_risk_minutes = Config.CREW_DUTY_AT_RISK_MINUTES if at_risk_minutes is None else at_risk_minutes
+        delay = np.zeros(len(self.flight_ids), dtype=np.int64)
+        involved = np.zeros(len(self.flight_ids), dtype=bool)
+        for flight_id, minutes in delays.items():
+            position = self.flight_index.get(flight_id)
+            if position is not None:
+                delay[position] = max(0, int(minutes or 0))
+                involved[position] = True
+
+        duties = len(self.report)
+        duty_delay = np.zeros(duties, dtype=np.int64)
+        np.maximum.at(duty_delay, self.assignment_duty, delay[self.assignment_flight])
+        checked = np.zeros(duties, dtype=bool)
+        np.logical_or.at(checked, self.assignment_duty, involved[self.assignment_flight])
+
+        projected_fdp = self.fdp_end + duty_delay - self.report
+        fdp_margin = self.fdp_limit - projected_fdp
+        flight_time_margin = self.flight_time_limit - self.flight_minutes
+        rest_ok = self.rest_before >= self.min_rest_minutes
+        legal = (fdp_margin >= 0) & (flight_time_margin >= 0) & rest_ok
+        illegal = checked & ~legal
+        at_risk = checked & legal & (fdp_margin < at_risk_minutes)
+
+        # Name the most-delayed flight of each flagged duty
+        flagged = np.flatnonzero(illegal | at_risk)
+        named_flight = self.duty_first_flight.copy()
+        candidates = np.flatnonzero((illegal | at_risk)[self.assignment_duty] & involved[self.assignment_flight])
+        order = np.lexsort((-delay[self.assignment_flight[candidates]], self.assignment_duty[candidates]))
+        duty_of, first = np.unique(self.assignment_duty[candidates[order]], return_index=True)
+        named_flight[duty_of] = self.assignment_flight[candidates[order][first]]
+
+        # FDP still to fly from reporting for the named flight to the delayed release
+        remaining_fdp = self.fdp_end + duty_delay - (self.departure[named_flight] - self.report_minutes)
+
+        violation_type = np.select(
+            [fdp_margin < 0, flight_time_margin < 0, ~rest_ok],
+            ['fdp_exceeded', 'flight_time_exceeded', 'insufficient_rest'], default='fdp_margin_low')
+        violations, warnings = [], []
+        for duty, crew, flight, kind, fdp, limit, margin, flight_margin, rest, segments, is_illegal, remaining in zip(
+                flagged.tolist(), self.duty_crew[flagged].tolist(), named_flight[flagged].tolist(),
+                violation_type[flagged].tolist(), projected_fdp[flagged].tolist(), self.fdp_limit[flagged].tolist(),
+                fdp_margin[flagged].tolist(), flight_time_margin[flagged].tolist(), self.rest_before[flagged].tolist(),
+                self.segments[flagged].tolist(), illegal[flagged].tolist(), remaining_fdp[flagged].tolist()):
+            entry = {
+                'crew_id': self.crew_ids[crew],
+                'flight': self.flight_numbers[flight],
+                'flight_id': self.flight_ids[flight],
+                'violation_type': kind,
+                'estimated_duty_time': f"{fdp / 60:.1f} hours",
+                'fdp_limit_hours': round(limit / 60, 1),
+                'fdp_margin_minutes': margin,
+                'flight_time_margin_minutes': flight_margin,
+                'rest_before_minutes': rest if rest < UNKNOWN_REST_MINUTES else None,
+                'segments': segments,
+                'remaining_fdp_minutes': remaining,
+                'action_required': 'crew_substitution' if is_illegal else 'monitor'
+            }
+            (violations if is_illegal else warnings).append(entry)
+
+        checked_margin = fdp_margin[checked]
+        return {
+            'crews_checked': int(len(np.unique(self.duty_crew[checked]))),
+            'duty_periods_checked': int(checked.sum()),
+            'illegal': int(illegal.sum()),
+            'at_risk': int(at_risk.sum()),
+            'min_fdp_margin_minutes': int(checked_margin.min()) if len(checked_margin) else None,
+            'violations': violations,
+            'at_risk_crews': warnings
+        }
+
+class CrewDutyService(FlightWindowService):
+    """Builds crew duty state for the current operating window and rebuilds it after a TTL"""
+
+    description = 'crew duty state'
+    fields = DUTY_FIELDS
+
+    def __init__(self, ttl_seconds: float = None):
+        super().__init__(ttl_seconds if ttl_seconds is not None else Config.CREW_DUTY_TTL_SECONDS,
+                         Config.CREW_DUTY_LOOKBACK_HOURS, Config.CREW_DUTY_HORIZON_HOURS)
+
+    def _keep(self, flight: Dict[str, Any]) -> bool:
+        return super()._keep(flight) and bool(flight.get('crew_list'))
+
+    def _create(self, flights: List[Dict[str, Any]]) -> CrewDutyState:
+        return CrewDutyState(flights, Config.CREW_REPORT_MINUTES, Config.CREW_MIN_REST_MINUTES)
+
+# Shared by every agent in the process
+crew_duty = CrewDutyService()
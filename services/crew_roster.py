@@ -0,0 +1,258 @@
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from config import Config
+from mongo_utils import mongo_db
+from services.date_utils import to_datetime
+from services.index_utils import ChangeWatermark, DepartureSchedule
+
+# Cancelled legs aren't flown, so they drop out of a crew's sequence
+UNCREWED_STATUS = 'cancelled'
+
+LEG_FIELDS = {'_id': 0, 'id': 1, 'flight_number': 1, 'origin': 1, 'destination': 1, 'aircraft_id': 1,
+              'scheduled_departure': 1, 'scheduled_arrival': 1, 'status': 1, 'crew_list': 1, 'updated_at': 1}
+
+CREW_FIELDS = {'_id': 0, 'crew_id': 1, 'base': 1, 'role': 1, 'qualifications': 1, 'status': 1, 'updated_at': 1}
+
+# The index reads _id as well, to move its change watermarks
+INDEXED_LEG_FIELDS = dict(LEG_FIELDS, _id=1)
+INDEXED_CREW_FIELDS = dict(CREW_FIELDS, _id=1)
+
+# Enough of a flight that lost its crew to drop its legs and move the watermark
+UNCREWED_FIELDS = {'_id': 1, 'id': 1, 'status': 1, 'updated_at': 1}
+
+CREWED = {'crew_list.0': {'$exists': True}}
+
+def _leg(doc: Dict[str, Any], departure: datetime) -> Dict[str, Any]:
+    return {
+        'flight_id': doc.get('id'),
+        'flight_number': doc.get('flight_number', ''),
+        'origin': doc.get('origin', ''),
+        'destination': doc.get('destination', ''),
+        'aircraft_type': str(doc.get('aircraft_id') or '').split('-')[0],
+        'scheduled_departure': departure,
+        'scheduled_arrival': to_datetime(doc.get('scheduled_arrival'))
+    }
+
+def _crew_record(doc: Dict[str, Any]) -> Dict[str, Any]:
+    return {field: value for field, value in doc.items() if field != '_id'}
+
+class CrewRosterIndex:
+    """In-memory crew roster: each crew member's legs in departure order, and
+    the crew on each flight.
+
+    Built once from the crews collection and the crew_list of every flight,
+    then kept current the same way as the route index: only flights and
+    crews past their change watermarks are re-read (uncrewed flights just
+    enough to drop them), and a periodic full rebuild catches deletes and
+    writes without updated_at.
+    Crew impact and "what does this crew fly next" become dictionary and
+    bisect lookups instead of scans over flights.
+    """
+
+    def __init__(self, refresh_seconds: float = None, rebuild_seconds: float = None):
+        self.enabled = Config.CREW_ROSTER_ENABLED
+        self.refresh_seconds = refresh_seconds if refresh_seconds is not None else Config.CREW_ROSTER_REFRESH_SECONDS
+        self.rebuild_seconds = rebuild_seconds if rebuild_seconds is not None else Config.CREW_ROSTER_REBUILD_SECONDS
+        self._crews: Dict[Any, Dict[str, Any]] = {}
+        self._legs: Dict[Any, DepartureSchedule] = {}
+        # flight id -> (leg, crew ids) of its current entry, for the reverse lookup and incremental moves
+        self._flights: Dict[Any, Tuple[Dict[str, Any], Tuple]] = {}
+        self._lock = threading.RLock()
+        self._watermarks = {'flights': ChangeWatermark(), 'crews': ChangeWatermark()}
+        self._built_at = None
+        self._refreshed_at = None
+        self.builds = 0
+        self.refreshes = 0
+        self.changes_applied = 0
+
+    def _apply_flight(self, doc: Dict[str, Any]):
+        """Add, move or drop one flight's legs according to its current document"""
+        flight_id = doc.get('id')
+        existing = self._flights.pop(flight_id, None)
+        if existing is not None:
+            leg, crew_ids = existing
+            for crew_id in crew_ids:
+                legs = self._legs.get(crew_id)
+                if legs is not None:
+                    legs.remove(leg['scheduled_departure'], flight_id)
+                    if not legs:
+                        del self._legs[crew_id]
+        departure = to_datetime(doc.get('scheduled_departure'))
+        crew_ids = tuple(dict.fromkeys(doc.get('crew_list') or []))
+        if doc.get('status') == UNCREWED_STATUS or departure is None or not crew_ids:
+            return
+        for crew_id in crew_ids:
+            self._legs.setdefault(crew_id, DepartureSchedule()).add(departure, flight_id)
+        self._flights[flight_id] = (_leg(doc, departure), crew_ids)
+
+    def _changed(self, collection: str, query: Dict[str, Any], fields: Dict[str, int]) -> List[Dict[str, Any]]:
+        return list(mongo_db[collection].find(self._watermarks[collection].changed_query(query), fields))
+
+    def _reset_watermarks(self):
+        for watermark in self._watermarks.values():
+            watermark.reset()
+
+    def build(self) -> int:
+        """Rebuild the whole roster from the crews collection and every crewed flight"""
+        started = time.perf_counter()
+        crews = list(mongo_db['crews'].find({}, INDEXED_CREW_FIELDS))
+        flights = list(mongo_db['flights'].find(CREWED, INDEXED_LEG_FIELDS))
+        with self._lock:
+            self._crews = {}
+            self._legs = {}
+            self._flights = {}
+            self._reset_watermarks()
+            for crew in crews:
+                self._watermarks['crews'].advance(crew)
+                self._crews[crew.get('crew_id')] = _crew_record(crew)
+            for doc in flights:
+                self._apply_flight(doc)
+                self._watermarks['flights'].advance(doc)
+            self._built_at = self._refreshed_at = time.monotonic()
+            self.builds += 1
+        logging.info(f"Built crew roster: {len(self._crews)} crews, {len(self._legs)} crew members flying "
+                     f"{len(self._flights)} flights in {time.perf_counter() - started:.2f}s")
+        return len(flights)
+
+    def refresh(self) -> int:
+        """Apply flights and crews changed since the last build or refresh"""
+        if self._built_at is None:
+            return self.build()
+        crews = self._changed('crews', {}, INDEXED_CREW_FIELDS)
+        flights = self._changed('flights', CREWED, INDEXED_LEG_FIELDS)
+        flights += self._changed('flights', {'crew_list.0': {'$exists': False}}, UNCREWED_FIELDS)
+        with self._lock:
+            self._refreshed_at = time.monotonic()
+            self.refreshes += 1
+            if not crews and not flights:
+                return 0
+            for crew in crews:
+                self._watermarks['crews'].advance(crew)
+                self._crews[crew.get('crew_id')] = _crew_record(crew)
+            for doc in flights:
+                self._apply_flight(doc)
+                self._watermarks['flights'].advance(doc)
+            self.changes_applied += len(crews) + len(flights)
+        return len(crews) + len(flights)
+
+    def invalidate(self):
+        """Forget everything; the next lookup rebuilds"""
+        with self._lock:
+            self._crews = {}
+            self._legs = {}
+            self._flights = {}
+            self._reset_watermarks()
+            self._built_at = self._refreshed_at = None
+
+    def _ensure_current(self):
+        now = time.monotonic()
+        if self._built_at is None or now - self._built_at >= self.rebuild_seconds:
+            self.build()
+        elif now - self._refreshed_at >= self.refresh_seconds:
+            self.refresh()
+
+    def crews_on(self, flight_ids: Iterable) -> Dict[Any, List]:
+        """Crew ids on each flight"""
+        flight_ids = list(flight_ids)
+        if not self.enabled:
+            docs = mongo_db['flights'].find({'id': {'$in': flight_ids}}, {'_id': 0, 'id': 1, 'crew_list': 1})
+            found = {doc.get('id'): list(dict.fromkeys(doc.get('crew_list') or [])) for doc in docs}
+            return {flight_id: found.get(flight_id, []) for flight_id in flight_ids}
+        self._ensure_current()
+        with self._lock:
+            return {flight_id: list(self._flights[flight_id][1]) if flight_id in self._flights else []
+                    for flight_id in flight_ids}
+
+    def crew_ids_on(self, flight_ids: Iterable) -> Set:
+        """Distinct crew ids across the flights"""
+        return {crew_id for crew_ids in self.crews_on(flight_ids).values() for crew_id in crew_ids}
+
+    def crew(self, crew_id) -> Optional[Dict[str, Any]]:
+        """The crew member's roster record, if there is one"""
+        if not self.enabled:
+            return mongo_db['crews'].find_one({'crew_id': crew_id}, CREW_FIELDS)
+        self._ensure_current()
+        with self._lock:
+            crew = self._crews.get(crew_id)
+            return dict(crew) if crew is not None else None
+
+    def legs(self, crew_id, after: datetime = None) -> List[Dict[str, Any]]:
+        """The crew member's legs in departure order, optionally only those departing after a time"""
+        if not self.enabled:
+            query = {'crew_list': crew_id, 'status': {'$ne': UNCREWED_STATUS}}
+            if after is not None:
+                query['scheduled_departure'] = {'$gt': after}
+            return [_leg(doc, to_datetime(doc.get('scheduled_departure')))
+                    for doc in mongo_db['flights'].find(query, LEG_FIELDS).sort('scheduled_departure', 1)]
+        self._ensure_current()
+        with self._lock:
+            legs = self._legs.get(crew_id)
+            if legs is None:
+                return []
+            positions = legs.after(after) if after is not None else range(len(legs))
+            return [dict(self._flights[legs.flight_ids[position]][0]) for position in positions]
+
+    def downstream_legs(self, flight_ids: Iterable, limit: int = None) -> Dict[Any, List[Dict[str, Any]]]:
+        """Legs each crew member on the flights flies after the earliest of those flights they're on.
+
+        These are the legs a delay to the flights can propagate to through the crew.
+        """
+        flight_ids = list(flight_ids)
+        crews = self.crews_on(flight_ids)
+        departures = {}
+        if self.enabled:
+            with self._lock:
+                for flight_id in flight_ids:
+                    if flight_id in self._flights:
+                        departures[flight_id] = self._flights[flight_id][0]['scheduled_departure']
+        else:
+            for doc in mongo_db['flights'].find({'id': {'$in': flight_ids}}, {'_id': 0, 'id': 1, 'scheduled_departure': 1}):
+                departures[doc.get('id')] = to_datetime(doc.get('scheduled_departure'))
+        earliest = {}
+        for flight_id, crew_ids in crews.items():
+            departure = departures.get(flight_id)
+            if departure is None:
+                continue
+            for crew_id in crew_ids:
+                if crew_id not in earliest or departure < earliest[crew_id]:
+                    earliest[crew_id] = departure
+        downstream = {}
+        for crew_id, departure in earliest.items():
+            legs = self.legs(crew_id, after=departure)
+            if legs:
+                downstream[crew_id] = legs[:limit] if limit is not None else legs
+        return downstream
+
+    def reserves(self, bases: Iterable[str] = None) -> List[Dict[str, Any]]:
+        """Reserve crews, optionally only those based at the given airports"""
+        bases = set(bases) if bases is not None else None
+        if not self.enabled:
+            query = {'status': 'reserve'}
+            if bases is not None:
+                query['base'] = {'$in': list(bases)}
+            return list(mongo_db['crews'].find(query, CREW_FIELDS))
+        self._ensure_current()
+        with self._lock:
+            return [dict(crew) for crew in self._crews.values()
+                    if crew.get('status') == 'reserve' and (bases is None or crew.get('base') in bases)]
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            return {
+                'enabled': self.enabled,
+                'crews': len(self._crews),
+                'crew_members_flying': len(self._legs),
+                'flights': len(self._flights),
+                'builds': self.builds,
+                'refreshes': self.refreshes,
+                'changes_applied': self.changes_applied,
+                'seconds_since_build': round(now - self._built_at, 1) if self._built_at is not None else None,
+                'watermarks': {collection: watermark.as_dict() for collection, watermark in self._watermarks.items()}
+            }
+
+# Shared by every agent in the process
+crew_roster = CrewRosterIndex()
@@ -0,0 +1,131 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict
+from config import Config
+from mongo_utils import mongo_db
+from services.communication_store import live_window_start
+from services.ttl_cache import TTLCache
+
+FLIGHT_SUMMARY_FIELDS = {
+    '_id': 0, 'id': 1, 'flight_number': 1, 'origin': 1, 'destination': 1,
+    'scheduled_departure': 1, 'scheduled_arrival': 1, 'status': 1, 'delay_minutes': 1
+}
+DISRUPTION_SUMMARY_FIELDS = {
+    '_id': 0, 'id': 1, 'type': 1, 'severity': 1, 'description': 1,
+    'affected_flight_list': 1, 'affected_airport_list': 1, 'status': 1, 'start_time': 1
+}
+AGENT_SUMMARY_FIELDS = {'_id': 0, 'name': 1, 'status': 1, 'current_task': 1, 'last_activity': 1}
+COMMUNICATION_SUMMARY_FIELDS = {
+    '_id': 0, 'id': 1, 'sender': 1, 'receiver': 1, 'message_type': 1,
+    'disruption_id': 1, 'processed': 1, 'timestamp': 1
+}
+
+class DashboardService:
+    """Computes all dashboard metrics in one aggregation and shares the result for a short TTL"""
+
+    CACHE_KEY = 'dashboard'
+
+    def __init__(self, cache_ttl_seconds: int = None):
+        ttl = Config.DASHBOARD_CACHE_TTL_SECONDS if cache_ttl_seconds is None else cache_ttl_seconds
+        self.cache = TTLCache(ttl, max_entries=1)
+
+    def get_dashboard_data(self) -> Dict[str, Any]:
+        """Get dashboard metrics, served from cache while fresh"""
+        data = self.cache.get(self.CACHE_KEY)
+        if data is None:
+            data = self._aggregate_dashboard_data(datetime.utcnow())
+            self.cache.set(self.CACHE_KEY, data)
+        return data
+
+    def invalidate(self):
+        """Force the next request to recompute the dashboard"""
+        self.cache.invalidate(self.CACHE_KEY)
+
+    def _build_pipeline(self, now: datetime) -> list:
+        """Build the $facet pipeline over today's and upcoming flights.
+
+        The leading $match bounds the scan to the dashboard window on
+        scheduled_departure, so cost tracks that window, not collection size.
+        Disruptions, agents and communications are joined onto the single
+        facet output document with uncorrelated $lookup sub-pipelines.
+        """
+        today_start = datetime.combine(now.date(), datetime.min.time())
+        today_end = datetime.combine(now.date(), datetime.max.time())
+        upcoming_end = now + timedelta(hours=12)
+        today_range = {'$gte': today_start, '$lte': today_end}
+        upcoming_range = {'$gte': now, '$lte': upcoming_end}
+        window = {'$gte': min(today_start, now), '$lte': max(today_end, upcoming_end)}
+        return [
+            {'$match': {'scheduled_departure': window}},
+            {'$project': FLIGHT_SUMMARY_FIELDS},
+            {'$facet': {
+                'today': [
+                    {'$match': {'scheduled_departure': today_range}},
+                    {'$group': {
+                        '_id': None,
+                        'total': {'$sum': 1},
+                        'delayed': {'$sum': {'$cond': [{'$gt': ['$delay_minutes', 0]}, 1, 0]}}
+                    }}
+                ],
+                'upcoming_flights': [
+                    {'$match': {'scheduled_departure': upcoming_range}},
+                    {'$sort': {'scheduled_departure': 1}},
+                    {'$limit': 10}
+                ]
+            }},
+            {'$lookup': {
+                'from': 'disruptions',
+                'pipeline': [{'$match': {'status': 'active'}}, {'$project': DISRUPTION_SUMMARY_FIELDS}],
+                'as': 'active_disruptions'
+            }},
+            {'$lookup': {
+                'from': 'agents',
+                'pipeline': [{'$project': AGENT_SUMMARY_FIELDS}],
+                'as': 'agents'
+            }},
+            {'$lookup': {
+                'from': 'agent_communications',
+                'pipeline': [
+                    {'$match': {'timestamp': {'$gte': live_window_start(now)}}},
+                    {'$sort': {'timestamp': -1}},
+                    {'$limit': 10},
+                    {'$project': COMMUNICATION_SUMMARY_FIELDS}
+                ],
+                'as': 'recent_communications'
+            }}
+        ]
+
+    def _aggregate_dashboard_data(self, now: datetime) -> Dict[str, Any]:
+        """Run the dashboard aggregation and shape it for the template"""
+        result = next(mongo_db['flights'].aggregate(self._build_pipeline(now)), {})
+        today = (result.get('today') or [{}])[0]
+        total_flights_today = today.get('total', 0)
+        delayed_flights = today.get('delayed', 0)
+        active_disruptions = result.get('active_disruptions', [])
+        on_time_flights = total_flights_today - delayed_flights
+        on_time_percentage = round((on_time_flights / total_flights_today) * 100) if total_flights_today > 0 else 100
+
+        agent_status = {
+            agent['name']: {
+                'name': agent['name'],
+                'status': agent.get('status', 'unknown'),
+                'current_task': agent.get('current_task'),
+                'last_activity': agent.get('last_activity')
+            }
+            for agent in result.get('agents', []) if agent.get('name')
+        }
+
+        logging.debug(f"Dashboard aggregated: {total_flights_today} flights today, {delayed_flights} delayed")
+        return {
+            'metrics': {
+                'total_flights_today': total_flights_today,
+                'delayed_flights': delayed_flights,
+                'active_disruptions': len(active_disruptions),
+                'on_time_percentage': on_time_percentage
+            },
+            'active_disruptions': active_disruptions,
+            'upcoming_flights': result.get('upcoming_flights', []),
+            'agent_status': agent_status,
+            'recent_communications': result.get('recent_communications', []),
+            'generated_at': now.isoformat()
+        }
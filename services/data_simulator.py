@@ -1,38 +1,36 @@
 import random
 import logging
-from datetime import datetime, timedelta
+from datetime import timedelta
 from typing import List, Dict, Any
-from models import Flight, Disruption, DisruptionType
+from models import AIRCRAFT_TYPES, AIRPORTS, Flight, Disruption, DisruptionType
 import json
 from mongo_utils import mongo_db
+from services.flight_repository import flight_repository
+from services.connection_graph import connection_graph
+from services.crew_duty_engine import crew_duty
+from services.crew_roster import crew_roster
+from services.fleet_model import fleet
+from services.gate_allocation import gate_allocation
+from services.ground_resources import ground_resources
+from services.maintenance_scheduler import maintenance_scheduler
+from services.route_index import route_index
+from services.prefetch_service import invalidate_prefetched, schedule_disruption_prefetch
+from services.agent_stats_service import AgentCommunicationStatsService
+from services.sequence_service import SequenceService
+from services.date_utils import utcnow
+from services.unit_of_work import deferred_insert, flush_current
 
 class DataSimulator:
     """Simulates real-time operational data for IROPS scenarios"""
     
     def __init__(self):
+        self.sequences = SequenceService()
+        
         # Major US airports with realistic flight patterns
-        self.airports = {
-            "JFK": {"name": "John F. Kennedy International", "hub": "major", "region": "northeast"},
-            "LAX": {"name": "Los Angeles International", "hub": "major", "region": "west"},
-            "ORD": {"name": "O'Hare International", "hub": "major", "region": "midwest"},
-            "DFW": {"name": "Dallas/Fort Worth International", "hub": "major", "region": "south"},
-            "ATL": {"name": "Hartsfield-Jackson Atlanta", "hub": "major", "region": "southeast"},
-            "LHR": {"name": "London Heathrow", "hub": "international", "region": "europe"},
-            "CDG": {"name": "Charles de Gaulle", "hub": "international", "region": "europe"},
-            "NRT": {"name": "Narita International", "hub": "international", "region": "asia"},
-            "SIN": {"name": "Singapore Changi", "hub": "international", "region": "asia"},
-            "DXB": {"name": "Dubai International", "hub": "international", "region": "middle_east"}
-        }
+        self.airports = AIRPORTS
         
         # Realistic aircraft types with capacities
-        self.aircraft_types = {
-            "B737": {"name": "Boeing 737", "capacity": 180, "range": "domestic"},
-            "B787": {"name": "Boeing 787 Dreamliner", "capacity": 250, "range": "international"},
-            "A320": {"name": "Airbus A320", "capacity": 160, "range": "domestic"},
-            "A350": {"name": "Airbus A350", "capacity": 300, "range": "international"},
-            "B777": {"name": "Boeing 777", "capacity": 350, "range": "international"},
-            "E190": {"name": "Embraer E190", "capacity": 100, "range": "regional"}
-        }
+        self.aircraft_types = AIRCRAFT_TYPES
         
         # Realistic disruption scenarios with business impact
         self.disruption_scenarios = {
@@ -148,7 +146,7 @@ class DataSimulator:
     def generate_realistic_flights(self, count: int = 100) -> list:
         """Generate realistic flight data with proper scheduling and passenger loads (MongoDB)"""
         flights = []
-        base_time = datetime.utcnow()
+        base_time = utcnow()
         
         # Create flight patterns that make sense
         domestic_routes = [
@@ -165,6 +163,7 @@ class DataSimulator:
         
         all_routes = domestic_routes + international_routes
         
+        flight_ids = self.sequences.reserve('flights', count)
         for i in range(count):
             # Select route
             origin, destination = random.choice(all_routes)
@@ -222,25 +221,66 @@ class DataSimulator:
             # Fix disruption_type serialization
             disruption_type = random.choice([d.value for d in DisruptionType]) if is_delayed else None
             flight_doc = {
-                'id': i + 1,
+                'id': flight_ids[i],
                 'flight_number': f"AO{100 + i}",
                 'origin': origin,
                 'destination': destination,
-                'scheduled_departure': scheduled_departure.isoformat(),
-                'actual_departure': actual_departure.isoformat() if actual_departure else None,
-                'scheduled_arrival': scheduled_arrival.isoformat(),
-                'actual_arrival': actual_arrival.isoformat() if actual_arrival else None,
+                'scheduled_departure': scheduled_departure,
+                'actual_departure': actual_departure,
+                'scheduled_arrival': scheduled_arrival,
+                'actual_arrival': actual_arrival,
                 'aircraft_id': f"{aircraft_type}-{random.randint(100, 999)}",
                 'crew_list': [f"CREW_{random.randint(1000, 9999)}" for _ in range(random.randint(4, 8))],
                 'passenger_count': passenger_count,
+                'seat_capacity': aircraft_capacity,
                 'status': status,
                 'delay_minutes': delay_minutes,
-                'disruption_type': disruption_type
+                'disruption_type': disruption_type,
+                'version': 1,
+                'updated_at': base_time
             }
             flights.append(flight_doc)
         
         return flights
     
+    def generate_crews(self, flights, reserves_per_type: int = 2) -> list:
+        """Roster records for every crew member on the flights, plus reserves at each airport (MongoDB).
+
+        Crew members are based where their first leg in flights departs, so
+        pass flights in departure order.
+        """
+        now = utcnow()
+        crews = {}
+        flown_from = {}
+        for flight in flights:
+            aircraft_type = str(flight.get('aircraft_id') or '').split('-')[0]
+            flown_from.setdefault(flight['origin'], set()).add(aircraft_type)
+            for crew_id in flight.get('crew_list') or []:
+                crew = crews.setdefault(crew_id, {
+                    'crew_id': crew_id,
+                    'base': flight['origin'],
+                    'role': 'pilot' if int(crew_id.rsplit('_', 1)[-1]) % 2 else 'flight_attendant',
+                    'qualifications': [],
+                    'status': 'active',
+                    'updated_at': now
+                })
+                if aircraft_type not in crew['qualifications']:
+                    crew['qualifications'].append(aircraft_type)
+        # Reserves at every airport, rated on the types flown from it
+        for airport, aircraft_types in sorted(flown_from.items()):
+            for aircraft_type in sorted(aircraft_types):
+                for i in range(1, reserves_per_type + 1):
+                    crew_id = f"RESERVE_{airport}_{aircraft_type}_{i}"
+                    crews[crew_id] = {
+                        'crew_id': crew_id,
+                        'base': airport,
+                        'role': 'pilot',
+                        'qualifications': [aircraft_type],
+                        'status': 'reserve',
+                        'updated_at': now
+                    }
+        return list(crews.values())
+    
     def create_realistic_disruption_scenario(self, scenario_type: str = None) -> dict:
         """Create a realistic disruption scenario with proper business impact (MongoDB)"""
         if not scenario_type:
@@ -265,8 +305,8 @@ class DataSimulator:
             'description': scenario_config["description"],
             'affected_flight_list': affected_flight_ids,
             'affected_airport_list': affected_airports,
-            'start_time': datetime.utcnow() - timedelta(minutes=random.randint(5, 60)),
-            'estimated_end_time': datetime.utcnow() + timedelta(hours=scenario_config["duration_hours"]),
+            'start_time': utcnow() - timedelta(minutes=random.randint(5, 60)),
+            'estimated_end_time': utcnow() + timedelta(hours=scenario_config["duration_hours"]),
             'status': "active",
             'total_passengers': total_passengers,
             'total_delay_minutes': total_delay_minutes
@@ -278,19 +318,38 @@ class DataSimulator:
         logging.info("Seeding database with realistic airline disruption scenarios...")
         # Clear existing data
         mongo_db['agent_communications'].delete_many({})
+        AgentCommunicationStatsService().reset()
         mongo_db['disruptions'].delete_many({})
         mongo_db['flights'].delete_many({})
+        flight_repository.invalidate()
+        route_index.invalidate()
+        connection_graph.invalidate()
+        crew_duty.invalidate()
+        crew_roster.invalidate()
+        fleet.invalidate()
+        gate_allocation.invalidate()
+        maintenance_scheduler.reset()
+        ground_resources.reset()
+        invalidate_prefetched()
+        mongo_db['crews'].delete_many({})
         mongo_db['scenarios'].delete_many({})
+        for sequence in ('agent_communications', 'disruptions', 'flights', 'scenarios'):
+            self.sequences.reset(sequence)
         # Generate realistic flights
         logging.info("Generating realistic flight data...")
         flights = self.generate_realistic_flights(120)
         if flights:
             mongo_db['flights'].insert_many(flights)
         logging.info(f"Created {len(flights)} realistic flights")
+        crews = self.generate_crews(sorted(flights, key=lambda f: f['scheduled_departure']))
+        if crews:
+            mongo_db['crews'].insert_many(crews)
+        logging.info(f"Created {len(crews)} crew roster records")
         # Create disruption scenarios for each type
         logging.info("Creating realistic disruption scenarios...")
         disruption_types = ["weather", "mechanical", "crew", "airport", "traffic"]
         disruptions = []
+        disruption_ids = self.sequences.reserve('disruptions', len(disruption_types))
         for idx, disruption_type in enumerate(disruption_types):
             scenario_config = random.choice(self.disruption_scenarios[disruption_type]["scenarios"])
             affected_airports = scenario_config["affected_airports"]
@@ -306,18 +365,18 @@ class DataSimulator:
             affected_flight_ids = [f['id'] for f in affected_flights]
             # Ensure disruption_type is a non-blank string and id is a unique integer
             disruption_doc = {
-                'id': idx + 1,
+                'id': disruption_ids[idx],
                 'type': str(disruption_type) if disruption_type else 'unknown',
                 'severity': scenario_config["severity"] or 'unknown',
                 'description': scenario_config["description"] or '',
                 'affected_flight_list': affected_flight_ids,
                 'affected_airport_list': affected_airports,
-                'start_time': (datetime.utcnow() - timedelta(minutes=random.randint(5, 60))).isoformat(),
-                'estimated_end_time': (datetime.utcnow() + timedelta(hours=scenario_config["duration_hours"])).isoformat(),
+                'start_time': utcnow() - timedelta(minutes=random.randint(5, 60)),
+                'estimated_end_time': utcnow() + timedelta(hours=scenario_config["duration_hours"]),
                 'status': "active",
-                'created_at': datetime.utcnow().isoformat()
+                'created_at': utcnow()
             }
-            mongo_db['disruptions'].insert_one(disruption_doc)
+            deferred_insert('disruptions', disruption_doc)
             disruptions.append(disruption_doc)
             logging.info(f"Created {disruption_doc['type']} disruption: {disruption_doc['description']}")
         # Create demo scenarios in Scenario collection
@@ -359,19 +418,24 @@ class DataSimulator:
                 "disruption_id": disruptions[4]['id'] if len(disruptions) > 4 else None
             }
         ]
+        scenario_ids = self.sequences.reserve('scenarios', len(scenario_templates))
         for idx, template in enumerate(scenario_templates):
             scenario_doc = {
-                'id': idx + 1,
+                'id': scenario_ids[idx],
                 'name': template["name"],
                 'description': template["description"],
                 'scenario_type': template["scenario_type"],
                 'parameters': template["parameters"],
                 'status': 'completed',
-                'created_at': (datetime.utcnow() - timedelta(hours=random.randint(1, 12))).isoformat(),
-                'completed_at': (datetime.utcnow() + timedelta(minutes=random.randint(10, 60))).isoformat(),
+                'created_at': utcnow() - timedelta(hours=random.randint(1, 12)),
+                'completed_at': utcnow() + timedelta(minutes=random.randint(10, 60)),
                 'disruption_id': template["disruption_id"]
             }
-            mongo_db['scenarios'].insert_one(scenario_doc)
+            deferred_insert('scenarios', scenario_doc)
+        # Prefetch reads the disruptions back, so write any batched inserts first
+        flush_current()
+        for disruption_doc in disruptions:
+            schedule_disruption_prefetch(disruption_doc['id'])
         logging.info("Demo scenarios created in Scenario collection.")
         logging.info("Database seeded successfully with realistic scenarios!")
         return {
@@ -397,7 +461,7 @@ class DataSimulator:
             severity = disruption.get('severity', 'unknown')
             summary["by_severity"][severity] = summary["by_severity"].get(severity, 0) + 1
             affected_flight_ids = disruption.get('affected_flight_list', [])
-            affected_flights = list(mongo_db['flights'].find({'id': {'$in': affected_flight_ids}}))
+            affected_flights = flight_repository.get_many(affected_flight_ids)
             summary["total_flights_affected"] += len(affected_flights)
             summary["total_passengers_affected"] += sum(f.get('passenger_count', 0) for f in affected_flights)
         return summary
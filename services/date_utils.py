@@ -0,0 +1,53 @@
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+# Fields stored as BSON dates, per collection
+DATE_FIELDS = {
+    'flights': ['scheduled_departure', 'actual_departure', 'scheduled_arrival', 'actual_arrival', 'updated_at'],
+    'disruptions': ['start_time', 'end_time', 'estimated_end_time', 'created_at'],
+    'agent_communications': ['timestamp', 'processed_at'],
+    'agents': ['last_activity'],
+    'scenarios': ['created_at', 'completed_at'],
+    'agent_comm_stats': ['last_activity'],
+}
+
+def utcnow() -> datetime:
+    """Naive UTC now at BSON (millisecond) precision, so stored and in-memory values compare equal"""
+    now = datetime.utcnow()
+    return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+def to_datetime(value: Any) -> Optional[datetime]:
+    """Coerce a datetime, ISO-8601 string or epoch seconds into a naive UTC datetime"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            return value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return datetime.fromtimestamp(value, timezone.utc).replace(tzinfo=None)
+    if isinstance(value, str):
+        try:
+            return to_datetime(datetime.fromisoformat(value.replace('Z', '+00:00')))
+        except ValueError:
+            return None
+    return None
+
+def to_iso(value: Any) -> Optional[str]:
+    """Render a stored date (or legacy ISO string) as an ISO-8601 string"""
+    parsed = to_datetime(value)
+    return parsed.isoformat() if parsed else None
+
+def with_bson_dates(doc: Dict[str, Any], collection: str) -> Dict[str, Any]:
+    """Convert a document's declared date fields to datetimes in place before writing it"""
+    for field in DATE_FIELDS.get(collection, []):
+        parsed = to_datetime(doc.get(field))
+        if parsed is not None:
+            doc[field] = parsed
+    return doc
+
+def json_default(value: Any):
+    """json.dumps default= hook: dates as ISO-8601, anything else (ObjectId etc.) as str"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
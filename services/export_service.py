@@ -0,0 +1,124 @@
+import csv
+import io
+import json
+import logging
+import zlib
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from pymongo import ASCENDING
+from mongo_utils import mongo_db
+from services.date_utils import json_default
+
+# Dataset name -> collection, time field used for range filters, and exported columns
+EXPORT_DATASETS = {
+    'flights': {
+        'collection': 'flights',
+        'time_field': 'scheduled_departure',
+        'columns': ['id', 'flight_number', 'origin', 'destination', 'scheduled_departure',
+                    'actual_departure', 'scheduled_arrival', 'actual_arrival', 'aircraft_id',
+                    'crew_list', 'passenger_count', 'status', 'delay_minutes', 'disruption_type']
+    },
+    'disruptions': {
+        'collection': 'disruptions',
+        'time_field': 'created_at',
+        'columns': ['id', 'type', 'severity', 'description', 'affected_flight_list',
+                    'affected_airport_list', 'start_time', 'end_time', 'estimated_end_time',
+                    'status', 'created_at']
+    },
+    'communications': {
+        'collection': 'agent_communications',
+        'time_field': 'timestamp',
+        'columns': ['id', 'sender', 'receiver', 'message_type', 'disruption_id',
+                    'processed', 'timestamp', 'content']
+    }
+}
+
+class ExportService:
+    """Streams collection exports as NDJSON or CSV chunks with constant memory use"""
+
+    def __init__(self, batch_size: int = 1000, chunk_bytes: int = 64 * 1024):
+        self.batch_size = batch_size
+        self.chunk_bytes = chunk_bytes
+
+    def iter_documents(self, dataset: str, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                       extra_query: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+        """Iterate a dataset's documents in time order using a batched server cursor"""
+        spec = EXPORT_DATASETS[dataset]
+        time_field = spec['time_field']
+        query = dict(extra_query or {})
+        if start or end:
+            query[time_field] = {}
+            if start:
+                query[time_field]['$gte'] = start
+            if end:
+                query[time_field]['$lt'] = end
+        projection = {'_id': 0}
+        projection.update({column: 1 for column in spec['columns']})
+        cursor = (mongo_db[spec['collection']]
+                  .find(query, projection)
+                  .sort([(time_field, ASCENDING), ('id', ASCENDING)])
+                  .batch_size(self.batch_size))
+        try:
+            for doc in cursor:
+                yield doc
+        finally:
+            cursor.close()
+
+    def ndjson_chunks(self, docs: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+        """Encode documents as newline-delimited JSON, yielding ~chunk_bytes at a time"""
+        buffer = []
+        size = 0
+        for doc in docs:
+            line = json.dumps(doc, default=json_default, separators=(',', ':')) + '\n'
+            buffer.append(line)
+            size += len(line)
+            if size >= self.chunk_bytes:
+                yield ''.join(buffer).encode('utf-8')
+                buffer, size = [], 0
+        if buffer:
+            yield ''.join(buffer).encode('utf-8')
+
+    def csv_chunks(self, docs: Iterable[Dict[str, Any]], columns: List[str]) -> Iterator[bytes]:
+        """Encode documents as CSV with a header row; list/dict cells are JSON encoded"""
+        text = io.StringIO()
+        writer = csv.writer(text)
+        writer.writerow(columns)
+        for doc in docs:
+            row = []
+            for column in columns:
+                value = doc.get(column)
+                if isinstance(value, (list, dict)):
+                    value = json.dumps(value, default=json_default)
+                elif isinstance(value, datetime):
+                    value = value.isoformat()
+                row.append('' if value is None else value)
+            writer.writerow(row)
+            if text.tell() >= self.chunk_bytes:
+                yield text.getvalue().encode('utf-8')
+                text.seek(0)
+                text.truncate(0)
+        if text.tell():
+            yield text.getvalue().encode('utf-8')
+
+    def gzip_chunks(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """Gzip a chunk stream incrementally"""
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        for chunk in chunks:
+            compressed = compressor.compress(chunk)
+            if compressed:
+                yield compressed
+        yield compressor.flush()
+
+    def stream_export(self, dataset: str, export_format: str = 'ndjson', start: Optional[datetime] = None,
+                      end: Optional[datetime] = None, compress: bool = False,
+                      extra_query: Optional[Dict[str, Any]] = None) -> Iterator[bytes]:
+        """Build the byte stream for a dataset export"""
+        docs = self.iter_documents(dataset, start, end, extra_query)
+        if export_format == 'csv':
+            chunks = self.csv_chunks(docs, EXPORT_DATASETS[dataset]['columns'])
+        else:
+            chunks = self.ndjson_chunks(docs)
+        if compress:
+            chunks = self.gzip_chunks(chunks)
+        logging.info(f"Streaming {dataset} export as {export_format}{' (gzip)' if compress else ''}")
+        return chunks
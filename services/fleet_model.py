@@ -0,0 +1,292 @@
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from config import Config
+from models import AIRCRAFT_TYPES
+from services.date_utils import utcnow
+from services.flight_window import FlightWindowService, epoch_minute, epoch_minutes, from_epoch_minute
+from services.reserve_assignment import INFEASIBLE, hungarian
+
+# Flying another type means re-crewing and re-planning loads; count it as this much delay
+TYPE_CHANGE_PENALTY_MINUTES = 30
+
+FLEET_FIELDS = {'_id': 0, 'id': 1, 'flight_number': 1, 'origin': 1, 'destination': 1, 'aircraft_id': 1,
+                'scheduled_departure': 1, 'scheduled_arrival': 1, 'passenger_count': 1}
+
+def aircraft_type(aircraft_id) -> str:
+    """Type of a tail; aircraft_id is "<type>-<tail>" """
+    return str(aircraft_id or '').split('-')[0]
+
+class FleetModel:
+    """Every tail's rotation in a window of flights, as NumPy arrays.
+
+    Tails are numbered 0..n-1 with their type interned once (tail_type
+    indexes types, and each type's capacity and range are looked up once).
+    Legs are sorted by tail then departure, with offsets giving each tail's
+    slice (CSR), so a rotation is a slice and "where is every tail at time
+    t" is a handful of array operations.
+
+    recover() plans grounded tails: each either waits for its repair, is
+    covered by a spare (a tail on the ground at the same airport with
+    nothing left to fly), or swaps rotations with a tail on the ground there.
+    The cost of an option is the delay it propagates down both rotations,
+    and the options are matched with the Hungarian method so no replacement
+    tail is used twice.
+    """
+
+    def __init__(self, flights: List[Dict[str, Any]], min_turn_minutes: int):
+        self.min_turn_minutes = min_turn_minutes
+        flights = [flight for flight in flights if flight.get('aircraft_id')]
+        self.tail_ids = sorted({str(flight['aircraft_id']) for flight in flights})
+        self.tail_index = {tail_id: position for position, tail_id in enumerate(self.tail_ids)}
+
+        self.types = sorted({aircraft_type(tail_id) for tail_id in self.tail_ids})
+        type_codes = {name: code for code, name in enumerate(self.types)}
+        self.tail_type = np.array([type_codes[aircraft_type(tail_id)] for tail_id in self.tail_ids], dtype=np.int64)
+        self.type_capacity = np.array([AIRCRAFT_TYPES.get(name, {}).get('capacity', 0) for name in self.types], dtype=np.int64)
+        self.type_range = [AIRCRAFT_TYPES.get(name, {}).get('range', '') for name in self.types]
+
+        self.airports = sorted({flight.get('origin', '') for flight in flights} | {flight.get('destination', '') for flight in flights})
+        airport_codes = {airport: code for code, airport in enumerate(self.airports)}
+        tail = np.array([self.tail_index[str(flight['aircraft_id'])] for flight in flights], dtype=np.int64)
+        departure = epoch_minutes([flight['scheduled_departure'] for flight in flights]) if flights else np.zeros(0, dtype=np.int64)
+        order = np.lexsort((departure, tail)) if flights else np.zeros(0, dtype=np.int64)
+        self.leg_tail = tail[order]
+        self.leg_departure = departure[order]
+        self.leg_arrival = (epoch_minutes([flight['scheduled_arrival'] for flight in flights]) if flights
+                            else np.zeros(0, dtype=np.int64))[order]
+        self.leg_origin = np.array([airport_codes[flight.get('origin', '')] for flight in flights], dtype=np.int64)[order]
+        self.leg_destination = np.array([airport_codes[flight.get('destination', '')] for flight in flights], dtype=np.int64)[order]
+        self.leg_passengers = np.array([flight.get('passenger_count') or 0 for flight in flights], dtype=np.int64)[order]
+        self.leg_flight_ids = [flights[position]['id'] for position in order.tolist()]
+        self.leg_flight_numbers = [flights[position].get('flight_number', '') for position in order.tolist()]
+        self.offsets = np.concatenate(([0], np.cumsum(np.bincount(self.leg_tail, minlength=len(self.tail_ids)))))
+
+    @property
+    def size(self) -> Dict[str, int]:
+        return {'tails': len(self.tail_ids), 'types': len(self.types), 'legs': int(len(self.leg_tail))}
+
+    def aircraft_type(self, tail_id) -> str:
+        position = self.tail_index.get(tail_id)
+        return self.types[self.tail_type[position]] if position is not None else aircraft_type(tail_id)
+
+    def capacity(self, tail_id) -> int:
+        position = self.tail_index.get(tail_id)
+        if position is None:
+            return AIRCRAFT_TYPES.get(aircraft_type(tail_id), {}).get('capacity', 0)
+        return int(self.type_capacity[self.tail_type[position]])
+
+    def _leg(self, leg: int) -> Dict[str, Any]:
+        return {
+            'flight_id': self.leg_flight_ids[leg],
+            'flight_number': self.leg_flight_numbers[leg],
+            'origin': self.airports[self.leg_origin[leg]],
+            'destination': self.airports[self.leg_destination[leg]],
+            'scheduled_departure': from_epoch_minute(self.leg_departure[leg]),
+            'scheduled_arrival': from_epoch_minute(self.leg_arrival[leg])
+        }
+
+    def rotation(self, tail_id, after: datetime = None) -> List[Dict[str, Any]]:
+        """The tail's legs in departure order, optionally only those departing at or after a time"""
+        position = self.tail_index.get(tail_id)
+        if position is None:
+            return []
+        start, end = int(self.offsets[position]), int(self.offsets[position + 1])
+        if after is not None:
+            start += int(np.searchsorted(self.leg_departure[start:end], epoch_minute(after), side='left'))
+        return [self._leg(leg) for leg in range(start, end)]
+
+    def positions(self, at: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Where every tail is at minute at: (airport code, on the ground, free from minute, next leg or -1)"""
+        tails = len(self.tail_ids)
+        if not tails:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, np.zeros(0, dtype=bool), empty, empty
+        first, end = self.offsets[:-1], self.offsets[1:]
+        flown = np.add.reduceat((self.leg_arrival <= at).astype(np.int64), first)
+        last = first + flown - 1
+        has_last = flown > 0
+        next_leg = np.where(first + flown < end, first + flown, -1)
+        airport = np.where(has_last, self.leg_destination[np.maximum(last, 0)], self.leg_origin[first])
+        on_ground = (next_leg < 0) | (self.leg_departure[np.maximum(next_leg, 0)] > at)
+        free_from = np.where(has_last, self.leg_arrival[np.maximum(last, 0)] + self.min_turn_minutes, np.iinfo(np.int64).min)
+        return airport, on_ground, free_from, next_leg
+
+    def available_tails(self, airport: str, at: datetime, type_name: str = None) -> List[Dict[str, Any]]:
+        """Tails on the ground at an airport at a time with nothing left to fly in the window"""
+        code = self.airports.index(airport) if airport in self.airports else -1
+        if code < 0:
+            return []
+        minute = epoch_minute(at)
+        location, on_ground, free_from, next_leg = self.positions(minute)
+        idle = (location == code) & on_ground & (next_leg < 0)
+        if type_name is not None:
+            idle &= self.tail_type == (self.types.index(type_name) if type_name in self.types else -1)
+        return [{
+            'aircraft_id': self.tail_ids[position],
+            'aircraft_type': self.types[self.tail_type[position]],
+            'location': airport,
+            'available_from': from_epoch_minute(max(free_from[position], minute)).isoformat(),
+            'status': 'ready'
+        } for position in np.flatnonzero(idle).tolist()]
+
+    def _propagated_delay(self, start: int, end: int, ready: int) -> Tuple[int, int]:
+        """Delay minutes and delayed legs when the legs start..end-1 are flown by a tail free at minute ready"""
+        total = delayed = 0
+        free = ready
+        for leg in range(start, end):
+            delay = max(0, free - int(self.leg_departure[leg]))
+            if not delay:
+                break
+            total += delay
+            delayed += 1
+            free = int(self.leg_arrival[leg]) + delay + self.min_turn_minutes
+        return total, delayed
+
+    def _compatible(self, tail: int, start: int, end: int) -> Optional[int]:
+        """Penalty for the tail flying legs start..end-1, or None if it can't"""
+        if start >= end:
+            return 0
+        legs_type = self.tail_type[self.leg_tail[start]]
+        if self.tail_type[tail] == legs_type:
+            return 0
+        if (self.type_range[self.tail_type[tail]] == self.type_range[legs_type]
+                and self.type_capacity[self.tail_type[tail]] >= self.leg_passengers[start:end].max()):
+            return TYPE_CHANGE_PENALTY_MINUTES
+        return None
+
+    def recover(self, groundings: Dict[Any, datetime], now: datetime = None, swap_window_minutes: int = None,
+                candidates_per_tail: int = None) -> Dict[str, Any]:
+        """Cheapest wait/spare/swap option for each grounded tail.
+
+        groundings maps aircraft_id -> when its repair is expected to finish.
+        A replacement must be on the ground at the grounded tail's next
+        departure airport within swap_window_minutes of that departure.
+        """
+        started = time.perf_counter()
+        swap_window = swap_window_minutes if swap_window_minutes is not None else Config.FLEET_SWAP_WINDOW_MINUTES
+        candidates_per_tail = candidates_per_tail or Config.FLEET_SWAP_CANDIDATES
+        now_minute = epoch_minute(now or utcnow())
+        grounded_tails = {self.tail_index[tail_id] for tail_id in groundings if tail_id in self.tail_index}
+
+        rows = []
+        for tail_id, ready_at in groundings.items():
+            tail = self.tail_index.get(tail_id)
+            if tail is None:
+                continue
+            start, end = int(self.offsets[tail]), int(self.offsets[tail + 1])
+            start += int(np.searchsorted(self.leg_departure[start:end], now_minute, side='left'))
+            ready = max(epoch_minute(ready_at), now_minute)
+            baseline, baseline_legs = self._propagated_delay(start, end, ready)
+            row = {'tail': tail, 'tail_id': tail_id, 'start': start, 'end': end, 'ready': ready,
+                   'baseline': baseline, 'baseline_legs': baseline_legs, 'options': []}
+            rows.append(row)
+            if start >= end or not baseline:
+                continue
+
+            # Tails on the ground at the departure airport by the end of the swap window
+            airport = self.leg_origin[start]
+            location, on_ground, free_from, next_leg = self.positions(int(self.leg_departure[start]) + swap_window)
+            nearby = np.flatnonzero((location == airport) & on_ground)
+            for candidate in nearby.tolist():
+                if candidate in grounded_tails:
+                    continue
+                candidate_start = int(next_leg[candidate])
+                candidate_end = int(self.offsets[candidate + 1])
+                if candidate_start < 0:
+                    candidate_start = candidate_end
+                elif self.leg_origin[candidate_start] != airport:
+                    continue
+                penalty = self._compatible(candidate, start, end)
+                swap_penalty = self._compatible(tail, candidate_start, candidate_end)
+                if penalty is None or swap_penalty is None:
+                    continue
+                covered, covered_legs = self._propagated_delay(start, end, int(free_from[candidate]))
+                swapped, swapped_legs = self._propagated_delay(candidate_start, candidate_end, ready)
+                row['options'].append((covered + swapped + penalty + swap_penalty, candidate,
+                                       candidate_start, candidate_end, covered + swapped, covered_legs + swapped_legs))
+            # Sparse pruning: keep each grounded tail's cheapest replacements
+            row['options'].sort(key=lambda option: option[0])
+            del row['options'][candidates_per_tail:]
+
+        # Columns: every candidate tail, then one "wait for the repair" column per grounded tail
+        columns = sorted({option[1] for row in rows for option in row['options']})
+        column_of = {candidate: position for position, candidate in enumerate(columns)}
+        cost = np.full((len(rows), len(columns) + len(rows)), INFEASIBLE)
+        for index, row in enumerate(rows):
+            cost[index, len(columns) + index] = row['baseline']
+            for option in row['options']:
+                cost[index, column_of[option[1]]] = option[0]
+
+        plans = []
+        for index, column in sorted(hungarian(cost)) if rows else []:
+            row = rows[index]
+            plan = {
+                'aircraft_id': row['tail_id'],
+                'aircraft_type': self.types[self.tail_type[row['tail']]],
+                'airport': self.airports[self.leg_origin[row['start']]] if row['start'] < row['end'] else None,
+                'ready_at': from_epoch_minute(row['ready']).isoformat(),
+                'legs_remaining': row['end'] - row['start'],
+                'baseline_delay_minutes': row['baseline'],
+                'delayed_legs_if_waiting': row['baseline_legs']
+            }
+            if column < len(columns):
+                option = next(option for option in row['options'] if option[1] == columns[column])
+                _, candidate, candidate_start, candidate_end, delay, delayed_legs = option
+                plan.update({
+                    'action': 'swap' if candidate_start < candidate_end else 'spare',
+                    'replacement_aircraft': self.tail_ids[candidate],
+                    'replacement_type': self.types[self.tail_type[candidate]],
+                    'delay_minutes': delay,
+                    'delayed_legs': delayed_legs,
+                    'flights_covered': self.leg_flight_numbers[row['start']:row['end']],
+                    'flights_taken_over': self.leg_flight_numbers[candidate_start:candidate_end]
+                })
+            else:
+                plan.update({
+                    'action': 'wait' if row['start'] < row['end'] else 'no_flying_affected',
+                    'replacement_aircraft': None,
+                    'replacement_type': None,
+                    'delay_minutes': row['baseline'],
+                    'delayed_legs': row['baseline_legs'],
+                    'flights_covered': [],
+                    'flights_taken_over': []
+                })
+            plan['delay_saved_minutes'] = row['baseline'] - plan['delay_minutes']
+            plans.append(plan)
+
+        result = {
+            'plans': plans,
+            'unknown_aircraft': [tail_id for tail_id in groundings if tail_id not in self.tail_index],
+            'totals': {
+                'grounded': len(plans),
+                'swaps': sum(1 for plan in plans if plan['action'] == 'swap'),
+                'spares': sum(1 for plan in plans if plan['action'] == 'spare'),
+                'baseline_delay_minutes': sum(plan['baseline_delay_minutes'] for plan in plans),
+                'delay_minutes': sum(plan['delay_minutes'] for plan in plans)
+            },
+            'solve_ms': round((time.perf_counter() - started) * 1000, 2)
+        }
+        logging.info(f"Planned recovery of {len(plans)} grounded aircraft: {result['totals']} in {result['solve_ms']}ms")
+        return result
+
+class FleetService(FlightWindowService):
+    """Builds the fleet model for the current operating window and rebuilds it after a TTL"""
+
+    description = 'fleet model'
+    fields = FLEET_FIELDS
+
+    def __init__(self, ttl_seconds: float = None):
+        super().__init__(ttl_seconds if ttl_seconds is not None else Config.FLEET_MODEL_TTL_SECONDS,
+                         Config.FLEET_MODEL_LOOKBACK_HOURS, Config.FLEET_MODEL_HORIZON_HOURS)
+
+    def _keep(self, flight: Dict[str, Any]) -> bool:
+        return super()._keep(flight) and bool(flight.get('aircraft_id'))
+
+    def _create(self, flights: List[Dict[str, Any]]) -> FleetModel:
+        return FleetModel(flights, Config.FLEET_MIN_TURN_MINUTES)
+
+# Shared by every agent in the process
+fleet = FleetService()
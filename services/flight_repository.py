@@ -0,0 +1,153 @@
+import copy
+import logging
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+from config import Config
+from mongo_utils import mongo_db
+from services.date_utils import utcnow
+from services.ttl_cache import TTLCache
+
+class FlightRepository:
+    """Read-through, LRU-bounded cache of flight documents keyed by flight id.
+
+    Entries are invalidated from a change stream on the flights collection.
+    Deployments without change streams (standalone mongod) fall back to
+    polling updated_at, which update() and the seeder maintain. The TTL is
+    only a safety net for missed invalidations.
+    """
+
+    def __init__(self, max_entries: int = None, ttl_seconds: float = None, poll_seconds: float = None):
+        self.enabled = Config.FLIGHT_CACHE_ENABLED
+        self.cache = TTLCache(ttl_seconds or Config.FLIGHT_CACHE_TTL_SECONDS,
+                              max_entries or Config.FLIGHT_CACHE_MAX_ENTRIES)
+        self.poll_seconds = poll_seconds or Config.FLIGHT_CACHE_POLL_SECONDS
+        # Change events only carry _id, so remember which flight id each cached _id belongs to
+        self._ids_by_object_id = {}
+        self._lock = threading.Lock()
+        self._listener = None
+        self._stop = threading.Event()
+        self.invalidation_mode = 'none'
+        self.invalidations = 0
+
+    def _copy(self, doc: Dict[str, Any]) -> Dict[str, Any]:
+        # Callers may mutate what they get back; never hand out the cached object
+        return copy.deepcopy(doc)
+
+    def _remember(self, doc: Dict[str, Any]):
+        with self._lock:
+            if len(self._ids_by_object_id) > self.cache.max_entries * 4:
+                self._ids_by_object_id.clear()
+                self.cache.clear()
+            self._ids_by_object_id[doc.get('_id')] = doc['id']
+        self.cache.set(doc['id'], doc)
+
+    def get(self, flight_id) -> Optional[Dict[str, Any]]:
+        """Get one flight by id"""
+        flights = self.get_many([flight_id])
+        return flights[0] if flights else None
+
+    def get_many(self, flight_ids: Iterable) -> List[Dict[str, Any]]:
+        """Get flights by id in request order; only cache misses go to MongoDB, in one $in query"""
+        flight_ids = list(flight_ids or [])
+        if not flight_ids:
+            return []
+        if not self.enabled:
+            return list(mongo_db['flights'].find({'id': {'$in': flight_ids}}))
+        found = {}
+        missing = []
+        for flight_id in flight_ids:
+            doc = self.cache.get(flight_id)
+            if doc is None:
+                missing.append(flight_id)
+            else:
+                found[flight_id] = doc
+        if missing:
+            # Also (re)starts the listener in forked workers, which don't inherit threads
+            self.start_invalidation_listener()
+            for doc in mongo_db['flights'].find({'id': {'$in': missing}}):
+                self._remember(doc)
+                found[doc['id']] = doc
+        return [self._copy(found[flight_id]) for flight_id in dict.fromkeys(flight_ids) if flight_id in found]
+
+    def update(self, flight_id, changes: Dict[str, Any]):
+        """Update a flight, bumping its version/updated_at so other processes' caches notice"""
+        result = mongo_db['flights'].update_one(
+            {'id': flight_id},
+            {'$set': dict(changes, updated_at=utcnow()), '$inc': {'version': 1}}
+        )
+        self.invalidate([flight_id])
+        return result
+
+    def invalidate(self, flight_ids: Iterable = None):
+        """Drop specific flights, or everything when flight_ids is None"""
+        if flight_ids is None:
+            self.cache.clear()
+            with self._lock:
+                self._ids_by_object_id.clear()
+        else:
+            for flight_id in flight_ids:
+                self.cache.invalidate(flight_id)
+        self.invalidations += 1
+
+    def start_invalidation_listener(self):
+        """Start the background change-stream (or polling) invalidation thread once"""
+        if not self.enabled or (self._listener and self._listener.is_alive()):
+            return
+        self._stop.clear()
+        self._listener = threading.Thread(target=self._listen, name='flight-cache-invalidation', daemon=True)
+        self._listener.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _listen(self):
+        try:
+            self.invalidation_mode = 'change_stream'
+            self._watch_change_stream()
+        except Exception as e:
+            # Standalone servers (and test doubles) don't support change streams
+            logging.info(f"Flight cache change stream unavailable ({e}); polling updated_at every {self.poll_seconds}s")
+            self.invalidation_mode = 'polling'
+            self._poll_updates()
+        self.invalidation_mode = 'stopped'
+
+    def _watch_change_stream(self):
+        pipeline = [{'$match': {'operationType': {'$in': ['update', 'replace', 'delete', 'drop', 'invalidate', 'rename']}}}]
+        with mongo_db['flights'].watch(pipeline) as stream:
+            while not self._stop.is_set():
+                change = stream.try_next()
+                if change is None:
+                    time.sleep(0.2)
+                    continue
+                if change['operationType'] in ('drop', 'invalidate', 'rename'):
+                    self.invalidate()
+                    continue
+                with self._lock:
+                    flight_id = self._ids_by_object_id.pop(change['documentKey']['_id'], None)
+                if flight_id is not None:
+                    self.invalidate([flight_id])
+
+    def _poll_updates(self):
+        watermark = utcnow()
+        while not self._stop.wait(self.poll_seconds):
+            try:
+                changed = list(mongo_db['flights'].find({'updated_at': {'$gt': watermark}}, {'_id': 0, 'id': 1, 'updated_at': 1}))
+                if changed:
+                    watermark = max(doc['updated_at'] for doc in changed)
+                    self.invalidate([doc['id'] for doc in changed])
+            except Exception as e:
+                logging.error(f"Flight cache polling error: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = self.cache.get_stats()
+        stats.update({
+            'enabled': self.enabled,
+            'max_entries': self.cache.max_entries,
+            'invalidation_mode': self.invalidation_mode,
+            'invalidations': self.invalidations
+        })
+        return stats
+
+# Shared by every agent and service in the process
+flight_repository = FlightRepository()
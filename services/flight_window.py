@@ -0,0 +1,90 @@
+import logging
+from abc import ABC, abstractmethod
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List
+import numpy as np
+from mongo_utils import mongo_db
+from services.date_utils import to_datetime, utcnow
+
+_EPOCH = datetime(1970, 1, 1)
+
+def epoch_minutes(values: List[datetime]) -> np.ndarray:
+    """Whole minutes since the epoch of each naive UTC datetime, as an int64 array"""
+    return np.array(values, dtype='datetime64[m]').astype(np.int64)
+
+def epoch_minute(value: datetime) -> int:
+    return int((value.replace(tzinfo=None) - _EPOCH).total_seconds() // 60)
+
+def from_epoch_minute(minute: int) -> datetime:
+    return _EPOCH + timedelta(minutes=int(minute))
+
+class FlightWindowService(ABC):
+    """Builds a snapshot of the flights in the current operating window and rebuilds it after a TTL.
+
+    The window runs from lookback_hours before now to horizon_hours after.
+    Subclasses set description and fields, narrow the flights with _keep()
+    and turn them into the snapshot with _create(); the snapshot's size
+    dict is reported by get_stats().
+    """
+
+    description = 'flight window'
+    fields: Dict[str, int] = {}
+
+    def __init__(self, ttl_seconds: float, lookback_hours: float, horizon_hours: float):
+        self.ttl_seconds = ttl_seconds
+        self.lookback_hours = lookback_hours
+        self.horizon_hours = horizon_hours
+        self._snapshot = None
+        self._built_at = None
+        self._lock = threading.Lock()
+        self.build_seconds = None
+
+    def _keep(self, flight: Dict[str, Any]) -> bool:
+        return bool(flight['scheduled_departure'] and flight['scheduled_arrival'])
+
+    @abstractmethod
+    def _create(self, flights: List[Dict[str, Any]]):
+        """The snapshot of the kept flights; it must have a size dict"""
+
+    def _flights(self, start: datetime, end: datetime) -> Iterator[Dict[str, Any]]:
+        for flight in mongo_db['flights'].find({'scheduled_departure': {'$gte': start, '$lte': end},
+                                                'status': {'$ne': 'cancelled'}}, self.fields):
+            flight['scheduled_departure'] = to_datetime(flight.get('scheduled_departure'))
+            flight['scheduled_arrival'] = to_datetime(flight.get('scheduled_arrival'))
+            if self._keep(flight):
+                yield flight
+
+    def build(self, start: datetime = None, end: datetime = None):
+        """Build the snapshot from flights departing in [start, end]"""
+        started = time.perf_counter()
+        now = utcnow()
+        start = start or now - timedelta(hours=self.lookback_hours)
+        end = end or now + timedelta(hours=self.horizon_hours)
+        snapshot = self._create(list(self._flights(start, end)))
+        self.build_seconds = round(time.perf_counter() - started, 3)
+        logging.info(f"Built {self.description}: {snapshot.size} in {self.build_seconds}s")
+        return snapshot
+
+    def current(self):
+        """The snapshot for the current window, rebuilt once it is older than the TTL"""
+        with self._lock:
+            if self._snapshot is None or time.monotonic() - self._built_at >= self.ttl_seconds:
+                self._snapshot = self.build()
+                self._built_at = time.monotonic()
+            return self._snapshot
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+            self._built_at = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        return {
+            'built': snapshot is not None,
+            'build_seconds': self.build_seconds,
+            'age_seconds': round(time.monotonic() - self._built_at, 1) if self._built_at is not None else None,
+            **(snapshot.size if snapshot is not None else {})
+        }
@@ -0,0 +1,288 @@
+import heapq
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from config import Config
+from models import AIRPORTS
+from services.date_utils import to_datetime, utcnow
+from services.flight_window import FlightWindowService, epoch_minute, from_epoch_minute
+
+GATE_FIELDS = {'_id': 0, 'id': 1, 'flight_number': 1, 'origin': 1, 'destination': 1,
+               'scheduled_departure': 1, 'scheduled_arrival': 1, 'status': 1}
+
+def gate_count(airport: str) -> int:
+    """Contact gates we hold at an airport"""
+    if AIRPORTS.get(airport, {}).get('hub') == 'major':
+        return Config.GATES_PER_MAJOR_HUB
+    return Config.GATES_PER_INTERNATIONAL_HUB
+
+def movement_intervals(flight: Dict[str, Any], delay: float = 0) -> List[Tuple[str, str, int, int]]:
+    """(airport, movement, start, end) minutes a flight holds a stand at each end.
+
+    A departure holds its gate from boarding until it pushes back, so a
+    delayed departure keeps the gate longer; an arrival holds one from
+    block-in until it is turned or towed off, so it just moves later.
+    """
+    departure = to_datetime(flight.get('scheduled_departure'))
+    arrival = to_datetime(flight.get('scheduled_arrival'))
+    delay = int(delay or 0)
+    intervals = []
+    if departure is not None and flight.get('origin'):
+        pushback = epoch_minute(departure) + delay
+        intervals.append((flight['origin'], 'departure', epoch_minute(departure) - Config.GATE_DEPARTURE_MINUTES, pushback))
+    if arrival is not None and flight.get('destination'):
+        block_in = epoch_minute(arrival) + delay
+        intervals.append((flight['destination'], 'arrival', block_in, block_in + Config.GATE_ARRIVAL_MINUTES))
+    return intervals
+
+class GateTimeline:
+    """Occupancy of one gate or remote stand: non-overlapping intervals sorted by start"""
+
+    __slots__ = ('name', 'remote', 'starts', 'ends', 'movements')
+
+    def __init__(self, name: str, remote: bool = False):
+        self.name = name
+        self.remote = remote
+        # Parallel arrays; intervals never overlap, so ends are sorted too
+        self.starts: List[int] = []
+        self.ends: List[int] = []
+        self.movements: List[Tuple] = []
+
+    def overlapping(self, start: int, end: int, buffer: int) -> range:
+        """Positions of the intervals closer than buffer minutes to [start, end)"""
+        return range(bisect_right(self.ends, start - buffer), bisect_left(self.starts, end + buffer))
+
+    def is_free(self, start: int, end: int, buffer: int) -> bool:
+        return not self.overlapping(start, end, buffer)
+
+    def idle_before(self, start: int) -> int:
+        """Minutes the gate will have stood empty when an interval starts here"""
+        position = bisect_right(self.ends, start)
+        return start - self.ends[position - 1] if position else start
+
+    def occupied_at(self, minute: int) -> bool:
+        position = bisect_right(self.starts, minute)
+        return bool(position) and self.ends[position - 1] > minute
+
+    def add(self, start: int, end: int, movement: Tuple):
+        position = bisect_right(self.starts, start)
+        self.starts.insert(position, start)
+        self.ends.insert(position, end)
+        self.movements.insert(position, movement)
+
+    def remove(self, start: int, movement: Tuple) -> bool:
+        position = bisect_left(self.starts, start)
+        while position < len(self.starts) and self.starts[position] == start:
+            if self.movements[position] == movement:
+                del self.starts[position]
+                del self.ends[position]
+                del self.movements[position]
+                return True
+            position += 1
+        return False
+
+class AirportGates:
+    """Gate and remote-stand timelines at one airport.
+
+    partition() lays the schedule out with greedy interval partitioning:
+    movements in start order take the gate that frees up earliest (a heap of
+    gate free times) if it has turned with the buffer to spare, else open
+    the next gate, else the next remote stand. reallocate() lifts delayed
+    movements off their gates and re-places them in start order, keeping
+    the planned gate when it is still clear and otherwise taking the clear
+    gate with the least idle time before it, so gaps are packed tightly.
+    """
+
+    def __init__(self, airport: str, gates: int, remote_stands: int, buffer_minutes: int):
+        self.airport = airport
+        self.buffer = buffer_minutes
+        self.timelines = ([GateTimeline(f"{airport}-G{number}") for number in range(1, gates + 1)] +
+                          [GateTimeline(f"{airport}-R{number}", remote=True) for number in range(1, remote_stands + 1)])
+        self.gates = gates
+        # (flight id, movement) -> (timeline index, start, end, flight number)
+        self.assigned: Dict[Tuple, Tuple[int, int, int, str]] = {}
+        self.unassigned: List[Tuple] = []
+
+    def partition(self, movements: List[Tuple[int, int, Tuple, str]]):
+        """Assign (start, end, key, flight number) movements from scratch"""
+        movements = sorted(movements, key=lambda movement: (movement[0], movement[1]))
+        contact: List[Tuple[int, int]] = []
+        remote: List[Tuple[int, int]] = []
+        pools = ((contact, 0, self.gates), (remote, self.gates, len(self.timelines)))
+        opened = [0, self.gates]
+        for start, end, key, flight_number in movements:
+            index = None
+            for pool, (heap, first, last) in enumerate(pools):
+                if heap and heap[0][0] + self.buffer <= start:
+                    index = heapq.heapreplace(heap, (end, heap[0][1]))[1]
+                elif opened[pool] < last:
+                    index = opened[pool]
+                    opened[pool] += 1
+                    heapq.heappush(heap, (end, index))
+                if index is not None:
+                    break
+            if index is None:
+                self.unassigned.append(key)
+                continue
+            self.timelines[index].add(start, end, key)
+            self.assigned[key] = (index, start, end, flight_number)
+
+    def _place(self, start: int, end: int, preferred: Optional[int]) -> Optional[int]:
+        if preferred is not None and self.timelines[preferred].is_free(start, end, self.buffer):
+            return preferred
+        best, best_idle = None, None
+        for index, timeline in enumerate(self.timelines):
+            if best is not None and timeline.remote and not self.timelines[best].remote:
+                break
+            if timeline.is_free(start, end, self.buffer):
+                idle = timeline.idle_before(start)
+                if best is None or idle < best_idle:
+                    best, best_idle = index, idle
+        return best
+
+    def reallocate(self, moved: Dict[Tuple, Tuple[int, int, str]]) -> List[Dict[str, Any]]:
+        """Re-place delayed movements ({key: (start, end, flight number)}) without changing the plan"""
+        lifted = {}
+        for key in moved:
+            if key in self.assigned:
+                index, start, end, _ = self.assigned[key]
+                self.timelines[index].remove(start, key)
+                lifted[key] = (index, start, end)
+
+        queue = [(start, end, key, flight_number) for key, (start, end, flight_number) in moved.items()]
+        heapq.heapify(queue)
+        placed = []
+        results = []
+        while queue:
+            start, end, key, flight_number = heapq.heappop(queue)
+            original = lifted.get(key, (None,))[0]
+            index = self._place(start, end, original)
+            conflicts = []
+            if original is not None and index != original:
+                timeline = self.timelines[original]
+                conflicts = sorted({self._flight_number(timeline.movements[position], moved)
+                                    for position in timeline.overlapping(start, end, self.buffer)})
+            if index is not None:
+                self.timelines[index].add(start, end, key)
+                placed.append((index, start, key))
+            results.append({
+                'flight_id': key[0],
+                'flight_number': flight_number,
+                'movement': key[1],
+                'airport': self.airport,
+                'original_gate': self.timelines[original].name if original is not None else None,
+                'new_gate': self.timelines[index].name if index is not None else None,
+                'remote_stand': index is not None and self.timelines[index].remote,
+                'start': from_epoch_minute(start).isoformat(),
+                'end': from_epoch_minute(end).isoformat(),
+                'conflicts_with': conflicts
+            })
+
+        # Put the plan back the way it was
+        for index, start, key in placed:
+            self.timelines[index].remove(start, key)
+        for key, (index, start, end) in lifted.items():
+            self.timelines[index].add(start, end, key)
+        return results
+
+    def _flight_number(self, key: Tuple, moved: Dict[Tuple, Tuple[int, int, str]]) -> str:
+        if key in moved:
+            return moved[key][2]
+        return self.assigned[key][3] if key in self.assigned else str(key[0])
+
+    def availability(self, minute: int) -> Dict[str, int]:
+        contact = self.timelines[:self.gates]
+        remote = self.timelines[self.gates:]
+        return {
+            'gates': len(contact),
+            'gates_available': sum(1 for timeline in contact if not timeline.occupied_at(minute)),
+            'remote_stands': len(remote),
+            'remote_stands_available': sum(1 for timeline in remote if not timeline.occupied_at(minute)),
+            'movements': len(self.assigned),
+            'unassigned_movements': len(self.unassigned)
+        }
+
+class GatePlan:
+    """Planned gate for every movement in a window of flights, per airport"""
+
+    def __init__(self, flights: Iterable[Dict[str, Any]], buffer_minutes: int = None, remote_stands: int = None):
+        self.buffer_minutes = buffer_minutes if buffer_minutes is not None else Config.GATE_BUFFER_MINUTES
+        self.remote_stands = remote_stands if remote_stands is not None else Config.REMOTE_STANDS_PER_AIRPORT
+        self.airports: Dict[str, AirportGates] = {}
+        by_airport: Dict[str, List] = {}
+        for flight in flights:
+            for airport, movement, start, end in movement_intervals(flight):
+                by_airport.setdefault(airport, []).append((start, end, (flight.get('id'), movement),
+                                                           flight.get('flight_number', '')))
+        for airport, movements in by_airport.items():
+            self.airport(airport).partition(movements)
+        self._lock = threading.Lock()
+
+    def airport(self, airport: str) -> AirportGates:
+        if airport not in self.airports:
+            self.airports[airport] = AirportGates(airport, gate_count(airport), self.remote_stands, self.buffer_minutes)
+        return self.airports[airport]
+
+    @property
+    def size(self) -> Dict[str, int]:
+        return {'airports': len(self.airports),
+                'movements': sum(len(gates.assigned) for gates in self.airports.values()),
+                'unassigned_movements': sum(len(gates.unassigned) for gates in self.airports.values())}
+
+    def reallocate(self, flights: Iterable[Dict[str, Any]], delays: Dict[Any, float],
+                   airports: Iterable[str] = None) -> Dict[str, Any]:
+        """Gates for the flights' movements once delayed, optionally only at some airports.
+
+        Movements that keep their planned gate are left out of 'reassignments';
+        each that has to move names the flights it now collides with there.
+        """
+        started = time.perf_counter()
+        airports = set(airports) if airports is not None else None
+        moved: Dict[str, Dict[Tuple, Tuple[int, int, str]]] = {}
+        for flight in flights:
+            for airport, movement, start, end in movement_intervals(flight, delays.get(flight.get('id'), 0)):
+                if airports is None or airport in airports:
+                    moved.setdefault(airport, {})[(flight.get('id'), movement)] = (start, end, flight.get('flight_number', ''))
+        results = []
+        with self._lock:
+            for airport, movements in moved.items():
+                results.extend(self.airport(airport).reallocate(movements))
+        results.sort(key=lambda result: result['start'])
+        reassignments = [result for result in results if result['new_gate'] != result['original_gate']]
+        return {
+            'movements': results,
+            'reassignments': reassignments,
+            'conflicts': [{'flight_number': result['flight_number'], 'movement': result['movement'],
+                           'gate': result['original_gate'], 'conflicts_with': result['conflicts_with']}
+                          for result in reassignments if result['conflicts_with']],
+            'remote_stand_usage': sum(1 for result in results if result['remote_stand']),
+            'unplaced': [result for result in results if result['new_gate'] is None],
+            'solve_ms': round((time.perf_counter() - started) * 1000, 2)
+        }
+
+    def availability(self, airports: Iterable[str], at: datetime = None) -> Dict[str, Dict[str, int]]:
+        minute = epoch_minute(at or utcnow())
+        with self._lock:
+            return {airport: self.airport(airport).availability(minute) for airport in airports}
+
+class GateAllocationService(FlightWindowService):
+    """Builds the gate plan for the current operating window and rebuilds it after a TTL"""
+
+    description = 'gate plan'
+    fields = GATE_FIELDS
+
+    def __init__(self, ttl_seconds: float = None):
+        super().__init__(ttl_seconds if ttl_seconds is not None else Config.GATE_PLAN_TTL_SECONDS,
+                         Config.GATE_PLAN_LOOKBACK_HOURS, Config.GATE_PLAN_HORIZON_HOURS)
+
+    def _keep(self, flight: Dict[str, Any]) -> bool:
+        # A flight with only one end known still holds a stand there
+        return True
+
+    def _create(self, flights: List[Dict[str, Any]]) -> GatePlan:
+        return GatePlan(flights)
+
+# Shared by every agent in the process
+gate_allocation = GateAllocationService()
@@ -1,8 +1,100 @@
 import os
 import logging
+import hashlib
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
 import google.generativeai as genai
 from typing import Optional
 from config import Config
+from services.ttl_cache import TTLCache
+
+class PriorityRateLimiter:
+    """Sliding one-minute window limiter where background calls yield to interactive ones"""
+    
+    def __init__(self, calls_per_minute: int, interactive_reserve: int = 0):
+        self.calls_per_minute = max(1, calls_per_minute)
+        self.interactive_reserve = min(max(0, interactive_reserve), self.calls_per_minute - 1)
+        self._calls = deque()
+        self._interactive_in_flight = 0
+        self._stopped = False
+        self._condition = threading.Condition()
+    
+    def _prune(self, now: float):
+        while self._calls and now - self._calls[0] >= 60:
+            self._calls.popleft()
+    
+    @contextmanager
+    def interactive(self):
+        """Record an interactive call; interactive calls are never blocked"""
+        with self._condition:
+            self._prune(time.monotonic())
+            self._calls.append(time.monotonic())
+            self._interactive_in_flight += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._interactive_in_flight -= 1
+                self._condition.notify_all()
+    
+    def acquire_background(self, timeout: float) -> bool:
+        """Wait for a background slot; False if none freed up before the timeout or the limiter stopped"""
+        deadline = time.monotonic() + timeout
+        background_budget = self.calls_per_minute - self.interactive_reserve
+        with self._condition:
+            while True:
+                if self._stopped:
+                    return False
+                now = time.monotonic()
+                self._prune(now)
+                if not self._interactive_in_flight and len(self._calls) < background_budget:
+                    self._calls.append(now)
+                    return True
+                remaining = deadline - now
+                if remaining <= 0:
+                    return False
+                wait = 60 - (now - self._calls[0]) if self._calls else remaining
+                self._condition.wait(min(max(wait, 0.05), remaining))
+    
+    def stop_background(self):
+        """Refuse background calls from now on and wake any waiting for a slot"""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+    
+    def get_stats(self) -> dict:
+        """Get current window usage"""
+        with self._condition:
+            self._prune(time.monotonic())
+            return {
+                "calls_last_minute": len(self._calls),
+                "calls_per_minute": self.calls_per_minute,
+                "interactive_reserve": self.interactive_reserve,
+                "interactive_in_flight": self._interactive_in_flight
+            }
+
+# Texts generate_response returns in place of a model answer
+FALLBACK_RESPONSES = (
+    "AI service unavailable",
+    "AI analysis deferred",
+    "AI analysis temporarily unavailable",
+    "Unable to generate AI response"
+)
+
+def is_model_response(text: str) -> bool:
+    """Whether a generate_response result came from the model (or its cache) rather than a fallback"""
+    return not text.startswith(FALLBACK_RESPONSES)
+
+# Shared across every GeminiService instance (one per agent)
+_rate_limiter = PriorityRateLimiter(Config.GEMINI_RATE_LIMIT_PER_MINUTE, Config.GEMINI_INTERACTIVE_RESERVE_PER_MINUTE)
+_response_cache = TTLCache(Config.GEMINI_CACHE_TTL_SECONDS, Config.GEMINI_CACHE_MAX_ENTRIES)
+_call_context = threading.local()
+
+def stop_background_calls():
+    """Skip every background Gemini call from now on, e.g. while the process shuts down"""
+    _rate_limiter.stop_background()
 
 class GeminiService:
     """Service for integrating with Google Gemini AI"""
@@ -20,6 +112,17 @@ class GeminiService:
             logging.error(f"Failed to initialize Gemini service: {e}")
             self.model = None
     
+    @staticmethod
+    @contextmanager
+    def background_priority():
+        """Run Gemini calls made in this thread at background (prefetch) priority"""
+        previous = getattr(_call_context, 'background', False)
+        _call_context.background = True
+        try:
+            yield
+        finally:
+            _call_context.background = previous
+    
     def generate_response(self, prompt: str, context: str = None) -> str:
         """Generate AI response using Gemini"""
         try:
@@ -31,12 +134,27 @@ class GeminiService:
             if context:
                 full_prompt = f"Context: {context}\n\nRequest: {prompt}"
             
+            cache_key = hashlib.sha256(f"{self.model_name}\n{full_prompt}".encode('utf-8')).hexdigest()
+            cached = _response_cache.get(cache_key)
+            if cached is not None:
+                logging.debug("Gemini response served from cache")
+                return cached
+            
             # Generate response
-            response = self.model.generate_content(full_prompt)
+            if getattr(_call_context, 'background', False):
+                if not _rate_limiter.acquire_background(Config.PREFETCH_RATE_LIMIT_WAIT_SECONDS):
+                    logging.debug("Background Gemini call skipped - rate limit reserved for interactive requests or shutting down")
+                    return "AI analysis deferred - rate limit reserved for interactive requests"
+                response = self.model.generate_content(full_prompt)
+            else:
+                with _rate_limiter.interactive():
+                    response = self.model.generate_content(full_prompt)
             
             if response.text:
                 logging.debug(f"Gemini response generated successfully")
-                return response.text.strip()
+                text = response.text.strip()
+                _response_cache.set(cache_key, text)
+                return text
             else:
                 logging.warning("Gemini returned empty response")
                 return "Unable to generate AI response"
@@ -249,6 +367,8 @@ class GeminiService:
             "service_name": "Google Gemini AI",
             "model": self.model_name,
             "available": self.is_available(),
+            "rate_limiter": _rate_limiter.get_stats(),
+            "response_cache": _response_cache.get_stats(),
             "capabilities": [
                 "Disruption analysis",
                 "Passenger communication",
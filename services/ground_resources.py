@@ -0,0 +1,232 @@
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+import numpy as np
+from config import Config
+from models import AIRCRAFT_TYPES, AIRPORTS
+from mongo_utils import mongo_db
+from services.date_utils import utcnow
+from services.gate_allocation import movement_intervals
+from services.versioned_store import compare_and_set
+
+EQUIPMENT = ('pushback_tugs', 'belt_loaders', 'catering_trucks', 'fuel_trucks', 'ground_power_units')
+PERSONNEL = ('ground_handlers', 'baggage_handlers', 'customer_service')
+RESOURCES = EQUIPMENT + PERSONNEL
+
+COMMITMENTS_COLLECTION = 'ground_commitments'
+
+# What we can put on the ramp at each airport, by hub type
+POOL_SIZES = {
+    'major': (14, 18, 8, 8, 14, 45, 36, 18),
+    'international': (6, 8, 4, 4, 6, 20, 16, 8)
+}
+
+# Held for the whole time the aircraft is on the gate, in RESOURCES order
+MOVEMENT_NEEDS = {
+    'departure': (1, 2, 1, 1, 1, 3, 3, 2),
+    'arrival': (0, 2, 0, 0, 1, 2, 3, 1)
+}
+# On top of MOVEMENT_NEEDS for aircraft with more seats than this
+WIDEBODY_SEATS = 200
+WIDEBODY_EXTRA = (0, 1, 0, 0, 0, 1, 2, 1)
+
+_NEEDS = np.array([MOVEMENT_NEEDS['departure'], MOVEMENT_NEEDS['arrival'],
+                   np.add(MOVEMENT_NEEDS['departure'], WIDEBODY_EXTRA), np.add(MOVEMENT_NEEDS['arrival'], WIDEBODY_EXTRA)],
+                  dtype=np.int32)
+
+def _widebody(flight: Dict[str, Any]) -> bool:
+    return AIRCRAFT_TYPES.get(str(flight.get('aircraft_id') or '').split('-')[0], {}).get('capacity', 0) > WIDEBODY_SEATS
+
+class GroundResourcePool:
+    """Ground equipment and staff per airport, committed to disruptions over time buckets.
+
+    Each airport is one {'_id': airport, 'reservations': {disruption id:
+    {'first': bucket, 'granted': [[per resource] per bucket]}}, 'version': n}
+    document in the ground_commitments collection, so every worker process
+    sees the same commitments. What is committed over the next
+    GROUND_POOL_HORIZON_HOURS is the sum of an airport's reservations, one
+    int32 array of shape (buckets, resources); reservations that have
+    fallen out of the window are dropped on the next write. Demand for a
+    set of flights is built in one pass with a difference array over their
+    stand intervals (np.add.at at each start and end bucket, then a
+    cumsum), so computing or reserving it is a few array operations
+    whatever the number of flights. reserve() writes each airport back only
+    if its version hasn't moved since the read, and otherwise re-reads and
+    retries, so two coordinations at the same airport, in any process, can
+    never both take the last tug; whatever doesn't fit is reported as a
+    shortfall instead.
+    """
+
+    def __init__(self, bucket_minutes: int = None, horizon_hours: int = None, db=None):
+        self.db = db if db is not None else mongo_db
+        self.bucket_minutes = bucket_minutes or Config.GROUND_POOL_BUCKET_MINUTES
+        self.buckets = (horizon_hours or Config.GROUND_POOL_HORIZON_HOURS) * 60 // self.bucket_minutes
+        self.airports = sorted(AIRPORTS)
+        self.airport_index = {airport: position for position, airport in enumerate(self.airports)}
+        self.capacity = np.array([POOL_SIZES.get(AIRPORTS[airport].get('hub'), POOL_SIZES['international'])
+                                  for airport in self.airports], dtype=np.int32)
+        self.conflicts = 0
+
+    def _bucket(self, value: datetime) -> int:
+        return int((value - datetime(1970, 1, 1)).total_seconds() // 60) // self.bucket_minutes
+
+    def demand(self, flights: Iterable[Dict[str, Any]], delays: Dict[Any, float] = None,
+               airports: Iterable[str] = None, now: datetime = None) -> np.ndarray:
+        """Resources the flights need at each (airport, bucket) of the window starting at now"""
+        delays = delays or {}
+        airports = set(airports) if airports is not None else None
+        base = self._bucket(now or utcnow())
+        rows, starts, ends, kinds = [], [], [], []
+        for flight in flights:
+            widebody = _widebody(flight)
+            for airport, movement, start, end in movement_intervals(flight, delays.get(flight.get('id'), 0)):
+                if airport in self.airport_index and (airports is None or airport in airports):
+                    rows.append(self.airport_index[airport])
+                    starts.append(start)
+                    ends.append(end)
+                    kinds.append((0 if movement == 'departure' else 1) + (2 if widebody else 0))
+        demand = np.zeros((len(self.airports), self.buckets + 1, len(RESOURCES)), dtype=np.int32)
+        if rows:
+            rows = np.array(rows)
+            first = np.clip(np.array(starts) // self.bucket_minutes - base, 0, self.buckets)
+            last = np.clip(-(-np.array(ends) // self.bucket_minutes) - base, 0, self.buckets)
+            keep = first < last
+            needs = _NEEDS[np.array(kinds)[keep]]
+            np.add.at(demand, (rows[keep], first[keep]), needs)
+            np.add.at(demand, (rows[keep], last[keep]), -needs)
+        return np.cumsum(demand, axis=1, dtype=np.int32)[:, :self.buckets]
+
+    def _committed(self, doc: Optional[Dict[str, Any]], base: int, skip: str = None) -> np.ndarray:
+        """What an airport's reservations, other than skip's, hold over the window starting at base"""
+        committed = np.zeros((self.buckets, len(RESOURCES)), dtype=np.int32)
+        for key, reservation in ((doc or {}).get('reservations') or {}).items():
+            if key == skip:
+                continue
+            granted = np.asarray(reservation['granted'], dtype=np.int32)
+            offset = reservation['first'] - base
+            low, high = max(0, -offset), min(len(granted), self.buckets - offset)
+            if low < high:
+                committed[offset + low:offset + high] += granted[low:high]
+        return committed
+
+    def _expired(self, doc: Optional[Dict[str, Any]], base: int) -> List[str]:
+        return [key for key, reservation in ((doc or {}).get('reservations') or {}).items()
+                if reservation['first'] + len(reservation['granted']) <= base]
+
+    def _commit(self, airport: str, key: str, demand: Optional[np.ndarray], base: int) -> np.ndarray:
+        """Replace key's reservation at one airport with as much of demand as is free; returns the grant"""
+        capacity = self.capacity[self.airport_index[airport]]
+
+        def build_update(doc):
+            granted = np.zeros((self.buckets, len(RESOURCES)), dtype=np.int32)
+            if demand is not None:
+                free = np.maximum(capacity - self._committed(doc, base, skip=key), 0)
+                granted = np.minimum(demand, free)
+            unset = {f'reservations.{expired}': '' for expired in self._expired(doc, base) if expired != key}
+            update = {}
+            held = np.flatnonzero(granted.any(axis=1))
+            if len(held):
+                update['$set'] = {f'reservations.{key}': {'first': base + int(held[0]),
+                                                          'granted': granted[held[0]:held[-1] + 1].tolist()}}
+            else:
+                unset[f'reservations.{key}'] = ''
+            if unset:
+                update['$unset'] = unset
+            return update, granted
+
+        granted, conflicts = compare_and_set(self.db[COMMITMENTS_COLLECTION], airport, build_update,
+                                             initial={'reservations': {}})
+        self.conflicts += conflicts
+        return granted
+
+    def reserve(self, disruption_id, flights: Iterable[Dict[str, Any]], delays: Dict[Any, float] = None,
+                airports: Iterable[str] = None, now: datetime = None) -> Dict[str, Any]:
+        """Commit what the flights need to a disruption, replacing its earlier reservation"""
+        started = time.perf_counter()
+        now = now or utcnow()
+        base = self._bucket(now)
+        key = str(disruption_id)
+        demand = self.demand(flights, delays, airports, now)
+        rows = np.flatnonzero(demand.any(axis=(1, 2)))
+        # Airports the disruption held resources at before, but no longer needs, are freed
+        for doc in self.db[COMMITMENTS_COLLECTION].find({f'reservations.{key}': {'$exists': True},
+                                                         '_id': {'$nin': [self.airports[row] for row in rows]}},
+                                                        {'_id': 1}):
+            self._commit(doc['_id'], key, None, base)
+        granted = np.array([self._commit(self.airports[row], key, demand[row], base) for row in rows.tolist()],
+                           dtype=np.int32).reshape(len(rows), self.buckets, len(RESOURCES))
+        shortfall = demand[rows] - granted
+
+        by_airport = {}
+        for position, row in enumerate(rows.tolist()):
+            short_buckets = np.flatnonzero(shortfall[position].any(axis=1))
+            by_airport[self.airports[row]] = {
+                'peak_demand': dict(zip(RESOURCES, demand[row].max(axis=0).tolist())),
+                'reserved': dict(zip(RESOURCES, granted[position].max(axis=0).tolist())),
+                'shortfall': dict(zip(RESOURCES, shortfall[position].max(axis=0).tolist())),
+                'short_from': self._time(base + int(short_buckets[0])).isoformat() if len(short_buckets) else None
+            }
+        result = {
+            'airports': by_airport,
+            'fully_reserved': not shortfall.any(),
+            'solve_ms': round((time.perf_counter() - started) * 1000, 2)
+        }
+        logging.info(f"Reserved ground resources for disruption {disruption_id} at {len(by_airport)} airports "
+                     f"in {result['solve_ms']}ms; fully reserved: {result['fully_reserved']}")
+        return result
+
+    def release(self, disruption_id):
+        """Return everything reserved for a disruption to the pool"""
+        key = f'reservations.{disruption_id}'
+        # Commitments are derived from the reservations, so dropping one needs no version check
+        self.db[COMMITMENTS_COLLECTION].update_many({key: {'$exists': True}}, {'$unset': {key: ''}, '$inc': {'version': 1}})
+
+    def reset(self):
+        """Release every reservation at every airport"""
+        self.db[COMMITMENTS_COLLECTION].delete_many({})
+
+    def _time(self, bucket: int) -> datetime:
+        return datetime(1970, 1, 1) + timedelta(minutes=bucket * self.bucket_minutes)
+
+    def availability(self, airports: Iterable[str], now: datetime = None) -> Dict[str, Dict[str, Any]]:
+        """Free now and lowest free over the window, per resource, at each known airport"""
+        base = self._bucket(now or utcnow())
+        airports = [airport for airport in airports if airport in self.airport_index]
+        docs = {doc['_id']: doc for doc in self.db[COMMITMENTS_COLLECTION].find({'_id': {'$in': airports}})}
+        result = {}
+        for airport in airports:
+            row = self.airport_index[airport]
+            committed = self._committed(docs.get(airport), base)
+            free = self.capacity[row] - committed
+            utilization = (committed / self.capacity[row]).max(axis=0) * 100
+            result[airport] = {
+                'capacity': dict(zip(RESOURCES, self.capacity[row].tolist())),
+                'available': dict(zip(RESOURCES, free[0].tolist())),
+                'lowest_available': dict(zip(RESOURCES, free.min(axis=0).tolist())),
+                'peak_equipment_utilization': round(float(utilization[:len(EQUIPMENT)].max()), 1),
+                'peak_staff_utilization': round(float(utilization[len(EQUIPMENT):].max()), 1)
+            }
+        return result
+
+    def get_stats(self, now: datetime = None) -> Dict[str, Any]:
+        base = self._bucket(now or utcnow())
+        disruptions = set()
+        committed_now = {}
+        for doc in self.db[COMMITMENTS_COLLECTION].find({'_id': {'$in': self.airports}}):
+            expired = set(self._expired(doc, base))
+            disruptions.update(key for key in doc.get('reservations') or {} if key not in expired)
+            committed = self._committed(doc, base)[0]
+            if committed.any():
+                committed_now[doc['_id']] = dict(zip(RESOURCES, committed.tolist()))
+        return {
+            'bucket_minutes': self.bucket_minutes,
+            'buckets': self.buckets,
+            'window_start': self._time(base).isoformat(),
+            'disruptions_reserved': len(disruptions),
+            'commit_conflicts': self.conflicts,
+            'committed_now': committed_now
+        }
+
+# Shared by every agent in the process
+ground_resources = GroundResourcePool()
@@ -0,0 +1,87 @@
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from services.date_utils import to_datetime
+
+class DepartureSchedule:
+    """Flights sorted by scheduled departure, as parallel arrays.
+
+    departures[i] is flight_ids[i]'s departure and values[i] whatever the
+    owning index keeps per flight, so a time window is two bisects.
+    """
+
+    __slots__ = ('departures', 'flight_ids', 'values')
+
+    def __init__(self):
+        self.departures: List[datetime] = []
+        self.flight_ids: List[Any] = []
+        self.values: List[Any] = []
+
+    def __len__(self) -> int:
+        return len(self.departures)
+
+    def add(self, departure: datetime, flight_id, value: Any = None):
+        position = bisect_right(self.departures, departure)
+        self.departures.insert(position, departure)
+        self.flight_ids.insert(position, flight_id)
+        self.values.insert(position, value)
+
+    def remove(self, departure: datetime, flight_id) -> bool:
+        position = bisect_left(self.departures, departure)
+        while position < len(self.departures) and self.departures[position] == departure:
+            if self.flight_ids[position] == flight_id:
+                del self.departures[position]
+                del self.flight_ids[position]
+                del self.values[position]
+                return True
+            position += 1
+        return False
+
+    def window(self, start: datetime, end: datetime) -> range:
+        """Positions of the flights departing in [start, end]"""
+        return range(bisect_left(self.departures, start), bisect_right(self.departures, end))
+
+    def after(self, departure: datetime) -> range:
+        """Positions of the flights departing after departure"""
+        return range(bisect_right(self.departures, departure), len(self.departures))
+
+class ChangeWatermark:
+    """How far into a collection's (updated_at, _id) order changes have been applied.
+
+    changed_query() matches only documents strictly past the watermark, with
+    _id breaking ties between documents written in the same millisecond, so
+    a refresh with nothing new reads nothing even when a bulk load gave
+    every document the same updated_at. Writes that commit with an earlier
+    updated_at than one already seen are left to the periodic full rebuild.
+    """
+
+    __slots__ = ('updated_at', 'object_id')
+
+    def __init__(self):
+        self.updated_at: Optional[datetime] = None
+        self.object_id = None
+
+    def reset(self):
+        self.updated_at = None
+        self.object_id = None
+
+    def advance(self, doc: Dict[str, Any]):
+        """Move past a document just applied; it must carry _id and updated_at"""
+        updated_at = to_datetime(doc.get('updated_at'))
+        if updated_at is None or doc.get('_id') is None:
+            return
+        if (self.updated_at is None or updated_at > self.updated_at
+                or (updated_at == self.updated_at and doc['_id'] > self.object_id)):
+            self.updated_at = updated_at
+            self.object_id = doc['_id']
+
+    def changed_query(self, query: Dict[str, Any] = None) -> Dict[str, Any]:
+        """query narrowed to documents past the watermark"""
+        if self.updated_at is None:
+            return dict(query or {})
+        after = {'$or': [{'updated_at': {'$gt': self.updated_at}},
+                         {'updated_at': self.updated_at, '_id': {'$gt': self.object_id}}]}
+        return {'$and': [query, after]} if query else after
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {'updated_at': self.updated_at, '_id': str(self.object_id) if self.object_id is not None else None}
@@ -0,0 +1,325 @@
+import bisect
+import heapq
+import logging
+import re
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from config import Config
+from mongo_utils import mongo_db
+from services.date_utils import to_datetime, utcnow
+from services.versioned_store import compare_and_set
+
+# Lower runs first
+URGENCY_RANK = {'critical': 0, 'high': 1, 'medium': 2, 'low': 3}
+
+# Only unscheduled repairs need a hangar bay; inspections are done on the stand
+HANGAR_MAINTENANCE_TYPES = {'unscheduled'}
+
+DEFAULT_DURATION_HOURS = (1.0, 2.0)
+
+BOOKINGS_COLLECTION = 'maintenance_bookings'
+
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+
+def parse_duration_hours(text: Optional[str]) -> Tuple[float, float]:
+    """(low, high) hours of an estimate like '4-8 hours', '90 minutes' or '2 hours'"""
+    values = [float(value) for value in _NUMBER.findall(text or '')]
+    if not values:
+        return DEFAULT_DURATION_HOURS
+    if 'min' in (text or '').lower():
+        values = [value / 60 for value in values]
+    return min(values), max(values)
+
+class _Airport:
+    """Technicians and hangar bays at one airport during a simulation.
+
+    Everything holding resources, whether booked earlier or placed by this
+    simulation, is a [start, end) interval in minutes from now, so a task
+    only starts where it fits for its whole duration, including around
+    bookings that begin later.
+    """
+
+    def __init__(self, technicians: int, bays: int):
+        self.technicians = technicians
+        self.bays = bays
+        # (start minute, end minute, technicians, bay or 0), ordered by start
+        self.intervals: List[Tuple[float, float, int, int]] = []
+
+    def hold(self, start: float, end: float, technicians: int, bay: int):
+        bisect.insort(self.intervals, (start, end, technicians, bay))
+
+    def _overlapping(self, start: float, end: float) -> List[Tuple[float, float, int, int]]:
+        overlapping = []
+        for interval in self.intervals:
+            if interval[0] >= end:
+                break
+            if interval[1] > start:
+                overlapping.append(interval)
+        return overlapping
+
+    def _fit(self, start: float, duration: float, technicians: int, hangar: bool) -> Optional[int]:
+        """Bay (0 without one) for a task starting at start, or None if it doesn't fit"""
+        overlapping = self._overlapping(start, start + duration)
+        # Technicians in use only rise where an interval begins, so check the start and every such point
+        for minute in [start] + [interval[0] for interval in overlapping if interval[0] > start]:
+            in_use = sum(held for first, last, held, _ in overlapping if first <= minute < last)
+            if in_use + technicians > self.technicians:
+                return None
+        if not hangar:
+            return 0
+        taken = {bay for _, _, _, bay in overlapping if bay}
+        return next((bay for bay in range(1, self.bays + 1) if bay not in taken), None)
+
+    def place(self, earliest: float, duration: float, technicians: int, hangar: bool) -> Tuple[float, int]:
+        """Earliest (start, bay) from earliest on where the task fits, held from then on"""
+        # Resources only free up where an interval ends, so those are the only other candidate starts
+        for start in [earliest] + sorted({end for _, end, _, _ in self.intervals if end > earliest}):
+            bay = self._fit(start, duration, technicians, hangar)
+            if bay is not None:
+                self.hold(start, start + duration, technicians, bay)
+                return start, bay
+        raise ValueError('task needs more technicians or bays than the airport has')
+
+    def peaks(self) -> Tuple[int, int]:
+        """Most technicians and hangar bays in use at once"""
+        technicians = bays = peak_technicians = peak_bays = 0
+        # Ends sort before starts at the same minute, as intervals are [start, end)
+        events = sorted([(start, 1, held, bay) for start, _, held, bay in self.intervals] +
+                        [(end, -1, held, bay) for _, end, held, bay in self.intervals])
+        for _, sign, held, bay in events:
+            technicians += sign * held
+            bays += sign * (1 if bay else 0)
+            peak_technicians = max(peak_technicians, technicians)
+            peak_bays = max(peak_bays, bays)
+        return peak_technicians, peak_bays
+
+class MaintenanceScheduler:
+    """Discrete-event scheduler for maintenance tasks against technicians and hangar bays per airport.
+
+    Each airport's tasks wait in a heap keyed by (urgency, deadline), and
+    the head of the queue starts at the earliest time, no earlier than the
+    task ahead of it, when enough technicians and, for repairs, a hangar
+    bay stay free for its whole duration. Tasks booked for other
+    disruptions hold their technicians and bays over their real
+    [start, end) times, so concurrent disruptions at one airport share its
+    capacity instead of each assuming all of it.
+
+    Bookings live in the maintenance_bookings collection, one
+    {'_id': airport, 'bookings': {disruption id: [task]}, 'version': n}
+    document per airport, so every worker process schedules against the
+    same bookings. book() schedules each airport against its document as
+    read and writes it back only if its version hasn't moved, re-reading
+    and rescheduling otherwise. Bookings are kept until their disruption is
+    released or their work ends.
+    """
+
+    def __init__(self, technicians_per_airport: int = None, hangar_bays_per_airport: int = None, db=None):
+        self.db = db if db is not None else mongo_db
+        self.technicians_per_airport = technicians_per_airport or Config.MAINTENANCE_TECHNICIANS_PER_AIRPORT
+        self.hangar_bays_per_airport = hangar_bays_per_airport or Config.MAINTENANCE_HANGAR_BAYS_PER_AIRPORT
+        self.conflicts = 0
+
+    def _airport_state(self, doc: Optional[Dict[str, Any]], now: datetime, exclude: str = None) -> _Airport:
+        state = _Airport(self.technicians_per_airport, self.hangar_bays_per_airport)
+        for key, booked in ((doc or {}).get('bookings') or {}).items():
+            if key == exclude:
+                continue
+            for entry in booked:
+                start = (to_datetime(entry['start']) - now).total_seconds() / 60
+                end = (to_datetime(entry['end']) - now).total_seconds() / 60
+                if end > 0:
+                    state.hold(start, end, entry['technicians'], entry['hangar_bay'])
+        return state
+
+    @staticmethod
+    def _expired(doc: Dict[str, Any], now: datetime) -> List[str]:
+        return [key for key, booked in (doc.get('bookings') or {}).items()
+                if all(to_datetime(entry['end']) <= now for entry in booked)]
+
+    def _queues(self, tasks: Iterable[Dict[str, Any]], now: datetime,
+                pessimistic: bool) -> Tuple[Dict[str, List[Tuple]], List[Dict[str, Any]]]:
+        """Each airport's schedulable tasks as heap entries, and the tasks no airport can take"""
+        by_airport: Dict[str, List[Tuple]] = {}
+        unschedulable = []
+        for sequence, task in enumerate(tasks):
+            low, high = parse_duration_hours(task.get('estimated_duration'))
+            technicians = max(1, int(task.get('technicians_required') or 1))
+            hangar = task.get('maintenance_type') in HANGAR_MAINTENANCE_TYPES
+            if technicians > self.technicians_per_airport or (hangar and not self.hangar_bays_per_airport):
+                unschedulable.append({'aircraft_id': task.get('aircraft_id'), 'airport': task.get('airport'),
+                                      'reason': 'needs more technicians or bays than the airport has'})
+                continue
+            deadline = to_datetime(task.get('deadline'))
+            deadline_minutes = (deadline - now).total_seconds() / 60 if deadline else float('inf')
+            key = (URGENCY_RANK.get(task.get('urgency'), len(URGENCY_RANK)), deadline_minutes, sequence)
+            by_airport.setdefault(task.get('airport') or 'UNKNOWN', []).append(
+                (key, task, (high if pessimistic else low) * 60, technicians, hangar, deadline))
+        return by_airport, unschedulable
+
+    @staticmethod
+    def _schedule(airport: str, queue: List[Tuple], state: _Airport,
+                  now: datetime) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """Timeline of one airport's tasks placed on state, and the airport's summary"""
+        queue = list(queue)
+        heapq.heapify(queue)
+        timeline = []
+        clock = 0.0
+        while queue:
+            key, task, duration, technicians, hangar, deadline = heapq.heappop(queue)
+            # Strict priority: nothing starts before the task ahead of it in the queue
+            clock, bay = state.place(clock, duration, technicians, hangar)
+            start, end = now + timedelta(minutes=clock), now + timedelta(minutes=clock + duration)
+            timeline.append({
+                'aircraft_id': task.get('aircraft_id'),
+                'airport': airport,
+                'task': task.get('description', ''),
+                'urgency': task.get('urgency'),
+                'technicians': technicians,
+                'hangar_bay': bay,
+                'start': start.isoformat(),
+                'end': end.isoformat(),
+                'wait_minutes': int(clock),
+                'deadline': deadline.isoformat() if deadline else None,
+                'meets_deadline': deadline is None or end <= deadline
+            })
+        peak_technicians, peak_bays = state.peaks()
+        return timeline, {
+            'tasks': len(timeline),
+            'peak_technicians': peak_technicians,
+            'peak_hangar_bays': peak_bays,
+            'technicians': state.technicians,
+            'hangar_bays': state.bays
+        }
+
+    @staticmethod
+    def _result(timeline: List[Dict[str, Any]], unschedulable: List[Dict[str, Any]], airports: Dict[str, Any],
+                now: datetime, started: float) -> Dict[str, Any]:
+        timeline.sort(key=lambda entry: (entry['start'], URGENCY_RANK.get(entry['urgency'], len(URGENCY_RANK))))
+        eta = max((to_datetime(entry['end']) for entry in timeline), default=None)
+        return {
+            'timeline': timeline,
+            'unschedulable': unschedulable,
+            'airports': airports,
+            'eta': eta.isoformat() if eta else None,
+            'recovery_hours': round((eta - now).total_seconds() / 3600, 1) if eta else 0,
+            'late_tasks': sum(1 for entry in timeline if not entry['meets_deadline']),
+            'solve_ms': round((time.perf_counter() - started) * 1000, 2)
+        }
+
+    def simulate(self, tasks: Iterable[Dict[str, Any]], now: datetime = None, pessimistic: bool = True,
+                 exclude_disruption=None) -> Dict[str, Any]:
+        """Schedule tasks without booking them.
+
+        Tasks need 'aircraft_id' and 'airport', and may have 'urgency',
+        'estimated_duration', 'technicians_required', 'maintenance_type',
+        'deadline' and 'description'. Durations use the high end of each
+        estimate when pessimistic, else the low end.
+        """
+        started = time.perf_counter()
+        now = now or utcnow()
+        by_airport, unschedulable = self._queues(tasks, now, pessimistic)
+        exclude = str(exclude_disruption) if exclude_disruption is not None else None
+        docs = {doc['_id']: doc for doc in self.db[BOOKINGS_COLLECTION].find({'_id': {'$in': list(by_airport)}})}
+        timeline = []
+        airports = {}
+        for airport, queue in by_airport.items():
+            entries, airports[airport] = self._schedule(airport, queue, self._airport_state(docs.get(airport), now, exclude), now)
+            timeline += entries
+        return self._result(timeline, unschedulable, airports, now, started)
+
+    def _commit(self, airport: str, key: str, queue: Optional[List[Tuple]],
+                now: datetime) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """Schedule key's tasks at one airport against everyone else's bookings and replace its booking there"""
+
+        def build_update(doc):
+            unset = {f'bookings.{expired}': '' for expired in self._expired(doc, now) if expired != key}
+            update = {}
+            timeline, summary = [], None
+            if queue:
+                timeline, summary = self._schedule(airport, queue, self._airport_state(doc, now, key), now)
+                update['$set'] = {f'bookings.{key}': [{
+                    'aircraft_id': entry['aircraft_id'],
+                    'technicians': entry['technicians'],
+                    'hangar_bay': entry['hangar_bay'],
+                    'start': to_datetime(entry['start']),
+                    'end': to_datetime(entry['end'])
+                } for entry in timeline]}
+            else:
+                unset[f'bookings.{key}'] = ''
+            if unset:
+                update['$unset'] = unset
+            return update, (timeline, summary)
+
+        (timeline, summary), conflicts = compare_and_set(self.db[BOOKINGS_COLLECTION], airport, build_update,
+                                                         initial={'bookings': {}})
+        self.conflicts += conflicts
+        return timeline, summary
+
+    def book(self, disruption_id, tasks: Iterable[Dict[str, Any]], now: datetime = None) -> Dict[str, Any]:
+        """Schedule a disruption's tasks and hold their resources, replacing its earlier booking.
+
+        Returns the pessimistic schedule, with the optimistic ETA alongside.
+        """
+        started = time.perf_counter()
+        tasks = list(tasks)
+        now = now or utcnow()
+        key = str(disruption_id)
+        by_airport, unschedulable = self._queues(tasks, now, pessimistic=True)
+        # Airports the disruption booked before, but no longer needs, are freed
+        for doc in self.db[BOOKINGS_COLLECTION].find({f'bookings.{key}': {'$exists': True},
+                                                      '_id': {'$nin': list(by_airport)}}, {'_id': 1}):
+            self._commit(doc['_id'], key, None, now)
+        timeline = []
+        airports = {}
+        for airport, queue in by_airport.items():
+            entries, airports[airport] = self._commit(airport, key, queue, now)
+            timeline += entries
+        schedule = self._result(timeline, unschedulable, airports, now, started)
+        optimistic = self.simulate(tasks, now, pessimistic=False, exclude_disruption=disruption_id)
+        schedule['eta_optimistic'] = optimistic['eta']
+        schedule['recovery_hours_optimistic'] = optimistic['recovery_hours']
+        logging.info(f"Scheduled {len(schedule['timeline'])} maintenance tasks for disruption {disruption_id} "
+                     f"across {len(schedule['airports'])} airports; ETA {schedule['eta']} in {schedule['solve_ms']}ms")
+        return schedule
+
+    def release(self, disruption_id):
+        """Free everything booked for a disruption, whichever process booked it"""
+        key = f'bookings.{disruption_id}'
+        # Nothing else is derived from a booking, so dropping one needs no version check
+        self.db[BOOKINGS_COLLECTION].update_many({key: {'$exists': True}}, {'$unset': {key: ''}, '$inc': {'version': 1}})
+
+    def reset(self):
+        """Free every booking at every airport"""
+        self.db[BOOKINGS_COLLECTION].delete_many({})
+
+    def get_stats(self, now: datetime = None) -> Dict[str, Any]:
+        now = now or utcnow()
+        disruptions = set()
+        tasks_booked = 0
+        in_use: Dict[str, Dict[str, int]] = {}
+        for doc in self.db[BOOKINGS_COLLECTION].find():
+            expired = set(self._expired(doc, now))
+            for key, booked in (doc.get('bookings') or {}).items():
+                if key in expired:
+                    continue
+                disruptions.add(key)
+                for entry in booked:
+                    if to_datetime(entry['end']) <= now:
+                        continue
+                    tasks_booked += 1
+                    if to_datetime(entry['start']) <= now:
+                        usage = in_use.setdefault(doc['_id'], {'technicians': 0, 'hangar_bays': 0})
+                        usage['technicians'] += entry['technicians']
+                        usage['hangar_bays'] += 1 if entry['hangar_bay'] else 0
+        return {
+            'technicians_per_airport': self.technicians_per_airport,
+            'hangar_bays_per_airport': self.hangar_bays_per_airport,
+            'disruptions_booked': len(disruptions),
+            'tasks_booked': tasks_booked,
+            'commit_conflicts': self.conflicts,
+            'in_use': in_use
+        }
+
+# Shared by every agent in the process
+maintenance_scheduler = MaintenanceScheduler()
@@ -0,0 +1,123 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from pymongo import ASCENDING, DESCENDING
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+class PaginationError(ValueError):
+    """Raised for malformed cursors, limits or field selections (maps to HTTP 400)"""
+
+def encode_cursor(sort_value: Any, doc_id: Any) -> str:
+    """Encode the last row's sort key and id as an opaque URL-safe token"""
+    if isinstance(sort_value, datetime):
+        payload = {'v': sort_value.isoformat(), 't': 'date', 'id': doc_id}
+    else:
+        payload = {'v': sort_value, 'id': doc_id}
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(token: str) -> Tuple[Any, Any]:
+    """Decode a cursor produced by encode_cursor"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        value = payload['v']
+        if payload.get('t') == 'date':
+            value = datetime.fromisoformat(value)
+        return value, payload['id']
+    except Exception:
+        raise PaginationError("Invalid cursor")
+
+def parse_limit(value: Optional[str], default: int = DEFAULT_PAGE_SIZE, maximum: int = MAX_PAGE_SIZE) -> int:
+    """Parse the limit query parameter, clamped to [1, maximum]"""
+    if value in (None, ''):
+        return default
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise PaginationError("limit must be an integer")
+    return max(1, min(limit, maximum))
+
+def parse_fields(value: Optional[str], field_map: Dict[str, str]) -> List[str]:
+    """Parse fields=a,b,c into API field names, validated against field_map"""
+    if not value:
+        return list(field_map.keys())
+    fields = [f.strip() for f in value.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in field_map]
+    if unknown:
+        raise PaginationError(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+def build_projection(fields: Iterable[str], field_map: Dict[str, str], sort_field: str) -> Dict[str, int]:
+    """Map API field names to a Mongo projection that always carries the keyset columns"""
+    projection = {'_id': 0, 'id': 1, sort_field: 1}
+    for field in fields:
+        projection[field_map[field]] = 1
+    return projection
+
+def parse_datetime_param(value: Optional[str], name: str) -> Optional[datetime]:
+    """Parse an ISO-8601 query parameter"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).replace(tzinfo=None)
+    except ValueError:
+        raise PaginationError(f"{name} must be an ISO-8601 timestamp")
+
+def _seek_after(sort_field: str, last_value: Any, last_id: Any, descending: bool) -> List[Dict[str, Any]]:
+    """Clauses matching rows after (last_value, last_id) in (sort_field, id) order.
+
+    MongoDB sorts null and missing values before everything else, but range
+    operators never match them, so they get clauses of their own: after the
+    last valued row when descending, before the first one when ascending.
+    """
+    op = '$lt' if descending else '$gt'
+    if last_value is None:
+        clauses = [{sort_field: None, 'id': {op: last_id}}]
+        if not descending:
+            clauses.append({sort_field: {'$ne': None}})
+        return clauses
+    clauses = [
+        {sort_field: {op: last_value}},
+        {sort_field: last_value, 'id': {op: last_id}}
+    ]
+    if descending:
+        clauses.append({sort_field: None})
+    return clauses
+
+def keyset_page(collection, query: Dict[str, Any], sort_field: str, cursor: Optional[str] = None,
+                limit: int = DEFAULT_PAGE_SIZE, projection: Optional[Dict[str, int]] = None,
+                descending: bool = True) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Fetch one page ordered by (sort_field, id) and return it with the next cursor.
+
+    Seeks past the previous page with a range predicate instead of skip(),
+    so each page costs the same no matter how deep the client has paged.
+    """
+    page_query = dict(query)
+    if cursor:
+        last_value, last_id = decode_cursor(cursor)
+        seek = {'$or': _seek_after(sort_field, last_value, last_id, descending)}
+        page_query = {'$and': [page_query, seek]} if page_query else seek
+    direction = DESCENDING if descending else ASCENDING
+    docs = list(collection.find(page_query, projection)
+                .sort([(sort_field, direction), ('id', direction)])
+                .limit(limit + 1))
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        last = docs[-1]
+        next_cursor = encode_cursor(last.get(sort_field), last.get('id'))
+    return docs, next_cursor
+
+def shape_documents(docs: Iterable[Dict[str, Any]], fields: Iterable[str], field_map: Dict[str, str],
+                    defaults: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """Rename stored fields to their API names, keeping only the selected fields"""
+    defaults = defaults or {}
+    fields = list(fields)
+    return [
+        {field: doc.get(field_map[field], defaults.get(field)) for field in fields}
+        for doc in docs
+    ]
@@ -0,0 +1,106 @@
+import atexit
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+from config import Config
+from services.gemini_service import GeminiService, stop_background_calls
+
+# Interpreter exit joins executor threads, draining their queues, before atexit
+# handlers run; threading's own exit hooks run first, so shutdown goes there
+_register_exit = getattr(threading, '_register_atexit', atexit.register)
+
+class DisruptionPrefetchService:
+    """Warms assessment and LLM caches for new disruptions on low-priority background workers"""
+
+    def __init__(self, coordinator, max_workers: int = None):
+        self.coordinator = coordinator
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or Config.PREFETCH_WORKERS,
+            thread_name_prefix="disruption-prefetch"
+        )
+        self._pending = set()
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.failed = 0
+        _register_exit(self.shutdown)
+        logging.info("Disruption prefetch service initialized")
+
+    def schedule(self, disruption_id: int) -> bool:
+        """Queue a disruption for prefetch; duplicate requests are coalesced"""
+        with self._lock:
+            if disruption_id in self._pending:
+                return False
+            self._pending.add(disruption_id)
+        self.executor.submit(self._run, disruption_id)
+        logging.debug(f"Prefetch scheduled for disruption {disruption_id}")
+        return True
+
+    def _run(self, disruption_id: int):
+        """Prefetch a single disruption with background LLM priority"""
+        try:
+            with GeminiService.background_priority():
+                result = self.coordinator.prefetch_disruption(disruption_id)
+            if result.get("success"):
+                with self._lock:
+                    self.completed += 1
+                logging.info(f"Prefetch completed for disruption {disruption_id}: "
+                             f"{len(result['assessments'])} assessments, {len(result['ai_prompts'])} AI prompts warmed")
+            else:
+                with self._lock:
+                    self.failed += 1
+                logging.warning(f"Prefetch skipped for disruption {disruption_id}: {result.get('error')}")
+        except Exception as e:
+            with self._lock:
+                self.failed += 1
+            logging.error(f"Prefetch error for disruption {disruption_id}: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(disruption_id)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get prefetch queue statistics"""
+        with self._lock:
+            pending, completed, failed = len(self._pending), self.completed, self.failed
+        return {
+            "pending": pending,
+            "completed": completed,
+            "failed": failed,
+            "assessment_cache": self.coordinator.assessment_cache.get_stats()
+        }
+
+    def invalidate(self):
+        """Forget every prefetched assessment, e.g. after the disruptions were replaced"""
+        self.coordinator.assessment_cache.clear()
+
+    def shutdown(self):
+        """Stop accepting work, drop queued prefetches and skip the LLM calls of running ones"""
+        stop_background_calls()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+# Process-wide prefetcher, registered by routes.init_app once agents exist
+_prefetcher: Optional[DisruptionPrefetchService] = None
+
+def register_prefetcher(prefetcher: Optional[DisruptionPrefetchService]):
+    """Install the process-wide prefetcher used by disruption writers"""
+    global _prefetcher
+    _prefetcher = prefetcher
+
+def schedule_disruption_prefetch(disruption_id: int) -> bool:
+    """Queue a prefetch for a newly inserted disruption; no-op when disabled"""
+    if not Config.PREFETCH_ENABLED or _prefetcher is None or disruption_id is None:
+        return False
+    try:
+        return _prefetcher.schedule(disruption_id)
+    except Exception as e:
+        logging.error(f"Failed to schedule prefetch for disruption {disruption_id}: {e}")
+        return False
+
+def invalidate_prefetched():
+    """Drop prefetched assessments; disruption ids are reused after a reseed"""
+    if _prefetcher is not None:
+        _prefetcher.invalidate()
+
+def get_prefetcher() -> Optional[DisruptionPrefetchService]:
+    """Get the registered prefetcher, if any"""
+    return _prefetcher
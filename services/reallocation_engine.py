@@ -0,0 +1,250 @@
+import heapq
+import logging
+import time
+from datetime import timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from config import Config
+from services.connection_graph import CONNECTING_SHARE
+from services.date_utils import to_datetime
+from services.route_index import route_index
+
+# Passenger tiers in placement priority: when seats run short, earlier tiers
+# get them first, and delay only orders passengers within a tier.
+TIER_PRIORITY = ('connecting', 'point_to_point')
+
+def passenger_tiers(flight: Dict[str, Any], connecting: Optional[int] = None) -> Dict[str, int]:
+    """Split a flight's passengers into reallocation tiers"""
+    passengers = int(flight.get('passenger_count') or 0)
+    if connecting is None:
+        connecting = int(passengers * CONNECTING_SHARE)
+    connecting = min(passengers, connecting)
+    return {'connecting': connecting, 'point_to_point': passengers - connecting}
+
+class _FlowNetwork:
+    """Residual graph for successive-shortest-path min-cost flow"""
+
+    def __init__(self, nodes: int):
+        self.graph: List[List[List[int]]] = [[] for _ in range(nodes)]
+
+    def add_edge(self, source: int, target: int, capacity: int, cost: int):
+        # Edge: [target, residual capacity, cost, index of the reverse edge in graph[target]]
+        self.graph[source].append([target, capacity, cost, len(self.graph[target])])
+        self.graph[target].append([source, 0, -cost, len(self.graph[source]) - 1])
+
+    def min_cost_flow(self, source: int, sink: int) -> Tuple[int, int]:
+        """Push as much flow as possible from source to sink at minimum cost"""
+        nodes = len(self.graph)
+        potential = [0] * nodes
+        flow = cost = 0
+        while True:
+            # Dijkstra on reduced costs; all costs start non-negative so zero potentials are valid
+            distance = [None] * nodes
+            previous: List[Optional[Tuple[int, int]]] = [None] * nodes
+            distance[source] = 0
+            heap = [(0, source)]
+            while heap:
+                dist, node = heapq.heappop(heap)
+                if dist > distance[node]:
+                    continue
+                for index, (target, capacity, edge_cost, _) in enumerate(self.graph[node]):
+                    if capacity <= 0:
+                        continue
+                    candidate = dist + edge_cost + potential[node] - potential[target]
+                    if distance[target] is None or candidate < distance[target]:
+                        distance[target] = candidate
+                        previous[target] = (node, index)
+                        heapq.heappush(heap, (candidate, target))
+            if distance[sink] is None:
+                return flow, cost
+            for node in range(nodes):
+                if distance[node] is not None:
+                    potential[node] += distance[node]
+            push = None
+            node = sink
+            while node != source:
+                parent, index = previous[node]
+                capacity = self.graph[parent][index][1]
+                push = capacity if push is None else min(push, capacity)
+                node = parent
+            node = sink
+            while node != source:
+                parent, index = previous[node]
+                edge = self.graph[parent][index]
+                edge[1] -= push
+                self.graph[node][edge[3]][1] += push
+                cost += push * edge[2]
+                node = parent
+            flow += push
+
+class ReallocationEngine:
+    """Moves displaced passengers onto open seats of alternative flights.
+
+    Each affected flight supplies its passengers, split into tiers, and each
+    alternative on the same route (from the route index) offers its open
+    seats. Putting a passenger on an alternative costs the delay in minutes
+    plus the tier's rank in TIER_PRIORITY times a step longer than any delay
+    in the window, so one passenger of a higher tier always outweighs any
+    saving in delay for a lower one. Small problems are solved exactly as a min-cost
+    flow. Larger ones, such as hub-wide ground stops, use a greedy pass that
+    takes the cheapest remaining (tier, alternative) pair from a heap. Both
+    place as many passengers as the seats allow and report what is left over.
+    """
+
+    def __init__(self, window_hours: int = None, max_alternatives: int = None, exact_max_edges: int = None):
+        self.window = timedelta(hours=window_hours or Config.REALLOCATION_WINDOW_HOURS)
+        self.max_alternatives = max_alternatives or Config.REALLOCATION_MAX_ALTERNATIVES
+        self.exact_max_edges = exact_max_edges if exact_max_edges is not None else Config.REALLOCATION_EXACT_MAX_EDGES
+
+    def reallocate(self, affected_flights: Iterable[Dict[str, Any]], method: str = 'auto',
+                   connecting: Optional[Dict[Any, int]] = None) -> Dict[str, Any]:
+        """Plan passenger moves for the affected flights.
+
+        method is 'auto', 'min_cost_flow' or 'greedy'. connecting maps flight
+        id -> passengers about to misconnect (e.g. from the connection graph);
+        flights not in it fall back to the CONNECTING_SHARE estimate.
+        """
+        started = time.perf_counter()
+        flights = [flight for flight in affected_flights if to_datetime(flight.get('scheduled_departure'))]
+        affected_ids = {flight.get('id') for flight in flights}
+        # A disrupted flight can't take anyone else's passengers
+        candidates = route_index.find_alternatives(flights, window=self.window, limit=self.max_alternatives,
+                                                   exclude=affected_ids)
+
+        # Supplies are (flight, tier) pairs, seats are alternative flights; edges join them with a cost
+        tier_step = int(self.window.total_seconds() // 60) + 1
+        supplies: List[Tuple[Dict[str, Any], str, int]] = []
+        seats: Dict[Any, Dict[str, Any]] = {}
+        edges: List[Tuple[int, Any, int]] = []
+        for flight in flights:
+            departure = to_datetime(flight.get('scheduled_departure'))
+            alternatives = [alt for alt in candidates.get(flight.get('id'), []) if alt['open_seats'] > 0]
+            tiers = passenger_tiers(flight, connecting.get(flight.get('id')) if connecting is not None else None)
+            for tier, count in tiers.items():
+                if count <= 0:
+                    continue
+                supply = len(supplies)
+                supplies.append((flight, tier, count))
+                for alt in alternatives:
+                    seats.setdefault(alt['id'], alt)
+                    delay = int((alt['scheduled_departure'] - departure).total_seconds() // 60)
+                    edges.append((supply, alt['id'], TIER_PRIORITY.index(tier) * tier_step + delay))
+
+        if method == 'auto':
+            method = 'min_cost_flow' if len(edges) <= self.exact_max_edges else 'greedy'
+        if method == 'min_cost_flow':
+            assignments = self._solve_min_cost_flow(supplies, seats, edges)
+        elif method == 'greedy':
+            assignments = self._solve_greedy(supplies, seats, edges)
+        else:
+            raise ValueError(f"Unknown reallocation method '{method}'")
+
+        result = self._summarize(flights, supplies, seats, assignments)
+        result['method'] = method
+        result['edges'] = len(edges)
+        result['solve_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        logging.info(f"Reallocated {result['totals']['placed']}/{result['totals']['displaced']} passengers "
+                     f"across {len(flights)} flights via {method} in {result['solve_ms']}ms")
+        return result
+
+    def _solve_min_cost_flow(self, supplies, seats, edges) -> Dict[Tuple[int, Any], int]:
+        seat_ids = list(seats)
+        seat_node = {seat_id: len(supplies) + 1 + i for i, seat_id in enumerate(seat_ids)}
+        source, sink = 0, len(supplies) + len(seat_ids) + 1
+        network = _FlowNetwork(sink + 1)
+        for supply, (_, _, count) in enumerate(supplies):
+            network.add_edge(source, supply + 1, count, 0)
+        edge_positions = []
+        for supply, seat_id, cost in edges:
+            edge_positions.append((supply, seat_id, len(network.graph[supply + 1])))
+            network.add_edge(supply + 1, seat_node[seat_id], supplies[supply][2], cost)
+        for seat_id in seat_ids:
+            network.add_edge(seat_node[seat_id], sink, seats[seat_id]['open_seats'], 0)
+        network.min_cost_flow(source, sink)
+        assignments = {}
+        for supply, seat_id, position in edge_positions:
+            moved = supplies[supply][2] - network.graph[supply + 1][position][1]
+            if moved > 0:
+                assignments[(supply, seat_id)] = moved
+        return assignments
+
+    def _solve_greedy(self, supplies, seats, edges) -> Dict[Tuple[int, Any], int]:
+        remaining_supply = [count for _, _, count in supplies]
+        remaining_seats = {seat_id: alt['open_seats'] for seat_id, alt in seats.items()}
+        heap = [(cost, supply, seat_id) for supply, seat_id, cost in edges]
+        heapq.heapify(heap)
+        assignments = {}
+        while heap:
+            _, supply, seat_id = heapq.heappop(heap)
+            moved = min(remaining_supply[supply], remaining_seats[seat_id])
+            if moved <= 0:
+                continue
+            remaining_supply[supply] -= moved
+            remaining_seats[seat_id] -= moved
+            assignments[(supply, seat_id)] = moved
+        return assignments
+
+    @staticmethod
+    def _summarize(flights, supplies, seats, assignments) -> Dict[str, Any]:
+        per_flight = {flight.get('id'): {
+            'flight_id': flight.get('id'),
+            'flight_number': flight.get('flight_number', ''),
+            'displaced': 0,
+            'placed': 0,
+            'unplaced': 0
+        } for flight in flights}
+        for flight, _, count in supplies:
+            per_flight[flight.get('id')]['displaced'] += count
+        moves = []
+        delay_total = 0
+        for (supply, seat_id), passengers in sorted(assignments.items(), key=lambda item: item[0][0]):
+            flight, tier, _ = supplies[supply]
+            alt = seats[seat_id]
+            delay = int((alt['scheduled_departure'] - to_datetime(flight.get('scheduled_departure'))).total_seconds() // 60)
+            per_flight[flight.get('id')]['placed'] += passengers
+            delay_total += delay * passengers
+            moves.append({
+                'from_flight': flight.get('flight_number', ''),
+                'to_flight': alt['flight_number'],
+                'tier': tier,
+                'passengers': passengers,
+                'departure_time': alt['scheduled_departure'].isoformat(),
+                'delay_minutes': delay
+            })
+        for summary in per_flight.values():
+            summary['unplaced'] = summary['displaced'] - summary['placed']
+        displaced = sum(summary['displaced'] for summary in per_flight.values())
+        placed = sum(summary['placed'] for summary in per_flight.values())
+        return {
+            'moves': moves,
+            'flights': list(per_flight.values()),
+            'totals': {
+                'displaced': displaced,
+                'placed': placed,
+                'unplaced': displaced - placed,
+                'average_delay_minutes': round(delay_total / placed, 1) if placed else None,
+                'seats_offered': sum(alt['open_seats'] for alt in seats.values())
+            }
+        }
+
+    def capacity_summary(self, affected_flights: Iterable[Dict[str, Any]], same_day_hours: int = 24) -> Dict[str, Any]:
+        """Open seats on alternatives within same_day_hours and in the following day"""
+        flights = list(affected_flights)
+        affected_ids = {flight.get('id') for flight in flights}
+        candidates = route_index.find_alternatives(flights, window=timedelta(hours=same_day_hours * 2),
+                                                   limit=self.max_alternatives, exclude=affected_ids)
+        same_day, next_day, counted = 0, 0, set()
+        for flight in flights:
+            departure = to_datetime(flight.get('scheduled_departure'))
+            for alt in candidates.get(flight.get('id'), []):
+                if alt['id'] in counted:
+                    continue
+                counted.add(alt['id'])
+                if alt['scheduled_departure'] - departure <= timedelta(hours=same_day_hours):
+                    same_day += alt['open_seats']
+                else:
+                    next_day += alt['open_seats']
+        return {
+            'displaced_passengers': sum(int(f.get('passenger_count') or 0) for f in flights),
+            'same_day_seats': same_day,
+            'next_day_seats': next_day
+        }
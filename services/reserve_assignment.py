@@ -0,0 +1,225 @@
+import logging
+import time
+from typing import Any, Dict, List, Tuple
+import numpy as np
+from config import Config
+from models import AIRPORTS, airport_distance_km
+from services.crew_duty_engine import FDP_LIMIT_MINUTES, FLIGHT_TIME_LIMIT_MINUTES, MAX_SEGMENTS
+from services.date_utils import to_datetime
+
+# Cost of a pair that can't be assigned (unqualified, or out of duty time)
+INFEASIBLE = 1e9
+
+# Positioning a reserve: ground time plus the block time at this cruise speed
+POSITIONING_OVERHEAD_MINUTES = 60
+POSITIONING_SPEED_KMH = 800
+
+def hungarian(cost: np.ndarray) -> List[Tuple[int, int]]:
+    """Minimum-cost assignment of rows to columns (rows <= columns).
+
+    Shortest-augmenting-path Hungarian method with row/column potentials,
+    O(n^2 m); the scan over columns in each step is vectorized.
+    """
+    rows, columns = cost.shape
+    u = np.zeros(rows + 1)
+    v = np.zeros(columns + 1)
+    # owner[j]: 1-based row assigned to column j (column 0 is the virtual root)
+    owner = np.zeros(columns + 1, dtype=np.int64)
+    way = np.zeros(columns + 1, dtype=np.int64)
+    for row in range(1, rows + 1):
+        owner[0] = row
+        column = 0
+        min_slack = np.full(columns + 1, np.inf)
+        used = np.zeros(columns + 1, dtype=bool)
+        while True:
+            used[column] = True
+            current_row = owner[column]
+            free = ~used[1:]
+            reduced = cost[current_row - 1] - u[current_row] - v[1:]
+            better = free & (reduced < min_slack[1:])
+            min_slack[1:][better] = reduced[better]
+            way[1:][better] = column
+            candidates = np.where(free, min_slack[1:], np.inf)
+            next_column = int(np.argmin(candidates)) + 1
+            delta = candidates[next_column - 1]
+            u[owner[used]] += delta
+            v[used] -= delta
+            min_slack[~used] -= delta
+            column = next_column
+            if owner[column] == 0:
+                break
+        while column:
+            previous = way[column]
+            owner[column] = owner[previous]
+            column = previous
+    return [(int(owner[column]) - 1, column - 1) for column in range(1, columns + 1) if owner[column]]
+
+def _components(candidates: List[List[int]]) -> List[Tuple[List[int], List[int]]]:
+    """Split the slot/reserve candidate graph into independent (slots, reserves) groups"""
+    parent = {}
+
+    def find(node):
+        while parent.setdefault(node, node) != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for slot, reserves in enumerate(candidates):
+        for reserve in reserves:
+            parent[find(('slot', slot))] = find(('reserve', reserve))
+    groups: Dict[Any, Tuple[List[int], List[int]]] = {}
+    for slot, reserves in enumerate(candidates):
+        if reserves:
+            groups.setdefault(find(('slot', slot)), ([], []))[0].append(slot)
+    for reserve in sorted({reserve for reserves in candidates for reserve in reserves}):
+        groups[find(('reserve', reserve))][1].append(reserve)
+    return list(groups.values())
+
+class ReserveAssignmentSolver:
+    """Assigns reserve crews to the duty slots of crews who went illegal.
+
+    A slot is a duty-time violation from the crew duty engine; it needs a
+    reserve qualified on the flight's aircraft type who can position to the
+    departure airport and still fly the rest of the duty within the FAR 117
+    FDP limit. The cost of a pair is the positioning time plus a penalty for
+    leaving less than CREW_DUTY_AT_RISK_MINUTES of FDP margin. Each slot keeps
+    only its cheapest RESERVE_CANDIDATES_PER_SLOT reserves, the pruned graph
+    is split into independent groups, and each group is solved with the
+    Hungarian method. Slots the pruning stranded get a second pass over the
+    reserves left free.
+    """
+
+    def __init__(self, candidates_per_slot: int = None, at_risk_minutes: int = None, report_minutes: int = None):
+        self.candidates_per_slot = candidates_per_slot or Config.RESERVE_CANDIDATES_PER_SLOT
+        self.at_risk_minutes = at_risk_minutes if at_risk_minutes is not None else Config.CREW_DUTY_AT_RISK_MINUTES
+        self.report_minutes = report_minutes if report_minutes is not None else Config.CREW_REPORT_MINUTES
+
+    @staticmethod
+    def positioning_minutes(base: str, airport: str) -> float:
+        if base == airport:
+            return 0.0
+        if base not in AIRPORTS or airport not in AIRPORTS:
+            return INFEASIBLE
+        return POSITIONING_OVERHEAD_MINUTES + airport_distance_km(base, airport) / POSITIONING_SPEED_KMH * 60
+
+    def cost_matrix(self, slots: List[Dict[str, Any]], reserves: List[Dict[str, Any]]) -> np.ndarray:
+        """Cost of covering each slot (row) with each reserve (column); INFEASIBLE where impossible.
+
+        Slots need 'airport', 'aircraft_type', 'report_hour', 'segments',
+        'remaining_fdp_minutes' and 'flight_minutes'; reserves need 'base' and
+        'qualifications'.
+        """
+        cost = np.full((len(slots), len(reserves)), INFEASIBLE)
+        if not slots or not reserves:
+            return cost
+        bases = sorted({reserve.get('base') for reserve in reserves})
+        airports = sorted({slot.get('airport') for slot in slots})
+        positioning = np.array([[self.positioning_minutes(base, airport) for base in bases] for airport in airports])
+        base_column = np.array([bases.index(reserve.get('base')) for reserve in reserves])
+        airport_row = np.array([airports.index(slot.get('airport')) for slot in slots])
+        travel = positioning[airport_row][:, base_column]
+
+        qualified = np.array([[slot.get('aircraft_type') in (reserve.get('qualifications') or []) for reserve in reserves]
+                              for slot in slots], dtype=bool)
+        report_hour = np.array([slot['report_hour'] for slot in slots])
+        limit = FDP_LIMIT_MINUTES[report_hour, np.minimum(np.array([slot['segments'] for slot in slots]), MAX_SEGMENTS) - 1]
+        # A flight longer than the flight-time limit needs an augmented crew, not a reserve
+        flyable = FLIGHT_TIME_LIMIT_MINUTES[report_hour] >= np.array([slot.get('flight_minutes', 0) for slot in slots])
+        # A reserve's FDP starts when they report to position, so positioning eats into it
+        margin = limit[:, None] - np.array([slot['remaining_fdp_minutes'] for slot in slots])[:, None] - travel
+        feasible = qualified & flyable[:, None] & (margin >= 0) & (travel < INFEASIBLE)
+        penalty = np.maximum(0, self.at_risk_minutes - margin) * 2
+        cost[feasible] = (travel + penalty)[feasible]
+        return cost
+
+    def build_slots(self, violations: List[Dict[str, Any]], flights: Dict[Any, Dict[str, Any]],
+                    delays: Dict[Any, float]) -> List[Dict[str, Any]]:
+        """Turn duty-engine violations into slots, using the violated flights' documents"""
+        slots = []
+        for violation in violations:
+            flight = flights.get(violation.get('flight_id'))
+            departure = to_datetime(flight.get('scheduled_departure')) if flight else None
+            arrival = to_datetime(flight.get('scheduled_arrival')) if flight else None
+            if departure is None or arrival is None:
+                continue
+            airport = flight.get('origin', '')
+            offset = AIRPORTS.get(airport, {}).get('utc_offset', 0)
+            report = departure.hour * 60 + departure.minute + int(delays.get(flight.get('id')) or 0) - self.report_minutes
+            slots.append(dict(
+                violation,
+                airport=airport,
+                aircraft_type=str(flight.get('aircraft_id') or '').split('-')[0],
+                report_hour=int(((report + offset * 60) // 60) % 24),
+                flight_minutes=int((arrival - departure).total_seconds() // 60)
+            ))
+        return slots
+
+    def assign(self, slots: List[Dict[str, Any]], reserves: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Cover as many slots as possible at minimum total cost"""
+        started = time.perf_counter()
+        cost = self.cost_matrix(slots, reserves)
+
+        # Sparse pruning: only each slot's cheapest feasible reserves stay candidates
+        candidates = []
+        for row in cost:
+            feasible = np.flatnonzero(row < INFEASIBLE)
+            if len(feasible) > self.candidates_per_slot:
+                feasible = feasible[np.argpartition(row[feasible], self.candidates_per_slot)[:self.candidates_per_slot]]
+            candidates.append(feasible.tolist())
+        allowed = np.zeros(cost.shape, dtype=bool)
+        for row, columns in enumerate(candidates):
+            allowed[row, columns] = True
+
+        groups = _components(candidates)
+        pairs = self._solve_groups(cost, allowed, groups)
+
+        # Pruning can strand a slot whose few candidates all went elsewhere; retry those
+        # against every reserve still free
+        assigned = {slot_index for slot_index, _ in pairs}
+        used = {reserve_index for _, reserve_index in pairs}
+        stranded = [index for index, columns in enumerate(candidates) if columns and index not in assigned]
+        free = [index for index in range(len(reserves)) if index not in used]
+        if stranded and free:
+            retry = [[column for column in free if cost[index, column] < INFEASIBLE] if index in stranded else []
+                     for index in range(len(slots))]
+            pairs += self._solve_groups(cost, cost < INFEASIBLE, _components(retry))
+
+        assignments = []
+        for slot_index, reserve_index in sorted(pairs):
+            slot, reserve = slots[slot_index], reserves[reserve_index]
+            travel = self.positioning_minutes(reserve.get('base'), slot.get('airport'))
+            assignments.append({
+                'original_crew': slot.get('crew_id'),
+                'replacement_crew': reserve.get('crew_id'),
+                'flight': slot.get('flight'),
+                'base': reserve.get('base'),
+                'positioning_minutes': int(round(travel)),
+                'cost': round(float(cost[slot_index, reserve_index]), 1),
+                'status': 'assigned'
+            })
+        assigned = {slot_index for slot_index, _ in pairs}
+        result = {
+            'assignments': assignments,
+            'unassigned': [{'crew_id': slots[index].get('crew_id'), 'flight': slots[index].get('flight'),
+                            'reason': 'no qualified reserve within duty limits' if not candidates[index] else 'reserves exhausted'}
+                           for index in range(len(slots)) if index not in assigned],
+            'total_cost': round(float(sum(cost[pair] for pair in pairs)), 1),
+            'groups': len(groups),
+            'solve_ms': round((time.perf_counter() - started) * 1000, 2)
+        }
+        logging.info(f"Assigned {len(assignments)}/{len(slots)} crew slots from {len(reserves)} reserves "
+                     f"in {result['groups']} groups in {result['solve_ms']}ms")
+        return result
+
+    @staticmethod
+    def _solve_groups(cost: np.ndarray, allowed: np.ndarray, groups) -> List[Tuple[int, int]]:
+        pairs = []
+        for group_slots, group_reserves in groups:
+            sub = np.where(allowed[np.ix_(group_slots, group_reserves)], cost[np.ix_(group_slots, group_reserves)], INFEASIBLE)
+            # Pad so there are at least as many columns as rows; padded columns mean "unassigned"
+            if sub.shape[0] > sub.shape[1]:
+                sub = np.hstack([sub, np.full((sub.shape[0], sub.shape[0] - sub.shape[1]), INFEASIBLE)])
+            for row, column in hungarian(sub):
+                if column < len(group_reserves) and sub[row, column] < INFEASIBLE:
+                    pairs.append((group_slots[row], group_reserves[column]))
+        return pairs
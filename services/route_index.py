@@ -0,0 +1,179 @@
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Tuple
+from config import Config
+from models import seat_capacity
+from mongo_utils import mongo_db
+from services.date_utils import to_datetime
+from services.index_utils import ChangeWatermark, DepartureSchedule
+
+# Only flights in this status can take rebooked passengers
+BOOKABLE_STATUS = 'scheduled'
+
+INDEXED_FIELDS = {'_id': 1, 'id': 1, 'flight_number': 1, 'origin': 1, 'destination': 1,
+                  'scheduled_departure': 1, 'status': 1, 'updated_at': 1,
+                  'passenger_count': 1, 'seat_capacity': 1, 'aircraft_id': 1}
+
+# Enough of a flight that left BOOKABLE_STATUS to drop it and move the watermark
+DROPPED_FIELDS = {'_id': 1, 'id': 1, 'status': 1, 'updated_at': 1}
+
+def open_seats(flight: Dict[str, Any]) -> int:
+    """Unsold seats on a flight"""
+    return max(0, seat_capacity(flight) - int(flight.get('passenger_count') or 0))
+
+class RouteScheduleIndex:
+    """In-memory index of bookable flights by route, sorted by departure.
+
+    Alternative-flight search is a bisect into the route's departure array
+    instead of one MongoDB query per affected flight. The index is built
+    from one query over scheduled flights, then kept current by reading only
+    flights past the change watermark (flight_repository.update() and the
+    seeder maintain updated_at): scheduled ones in full, the rest only to
+    drop them. A periodic full rebuild catches deletes and anything written
+    without updated_at.
+    """
+
+    def __init__(self, refresh_seconds: float = None, rebuild_seconds: float = None):
+        self.enabled = Config.ROUTE_INDEX_ENABLED
+        self.refresh_seconds = refresh_seconds if refresh_seconds is not None else Config.ROUTE_INDEX_REFRESH_SECONDS
+        self.rebuild_seconds = rebuild_seconds if rebuild_seconds is not None else Config.ROUTE_INDEX_REBUILD_SECONDS
+        # Values are (flight number, open seats)
+        self._routes: Dict[Tuple[str, str], DepartureSchedule] = {}
+        # flight id -> (route, departure) of its current entry, for incremental moves and removals
+        self._entries: Dict[Any, Tuple[Tuple[str, str], datetime]] = {}
+        self._lock = threading.RLock()
+        self._watermark = ChangeWatermark()
+        self._built_at = None
+        self._refreshed_at = None
+        self.builds = 0
+        self.refreshes = 0
+        self.changes_applied = 0
+
+    def _apply(self, doc: Dict[str, Any]):
+        """Add, move or drop one flight according to its current document"""
+        flight_id = doc.get('id')
+        existing = self._entries.pop(flight_id, None)
+        if existing is not None:
+            route, departure = existing
+            self._routes[route].remove(departure, flight_id)
+        departure = to_datetime(doc.get('scheduled_departure'))
+        if doc.get('status') != BOOKABLE_STATUS or departure is None:
+            return
+        route = (doc.get('origin', ''), doc.get('destination', ''))
+        self._routes.setdefault(route, DepartureSchedule()).add(departure, flight_id,
+                                                                (doc.get('flight_number', ''), open_seats(doc)))
+        self._entries[flight_id] = (route, departure)
+
+    def build(self) -> int:
+        """Rebuild the whole index from the scheduled flights"""
+        started = time.perf_counter()
+        docs = list(mongo_db['flights'].find({'status': BOOKABLE_STATUS}, INDEXED_FIELDS))
+        with self._lock:
+            self._routes = {}
+            self._entries = {}
+            self._watermark.reset()
+            for doc in docs:
+                self._apply(doc)
+                self._watermark.advance(doc)
+            self._built_at = self._refreshed_at = time.monotonic()
+            self.builds += 1
+        logging.info(f"Built route index: {len(self._entries)} flights on {len(self._routes)} routes "
+                     f"in {time.perf_counter() - started:.2f}s")
+        return len(docs)
+
+    def refresh(self) -> int:
+        """Apply flights changed since the last build or refresh"""
+        if self._built_at is None:
+            return self.build()
+        changed = list(mongo_db['flights'].find(self._watermark.changed_query({'status': BOOKABLE_STATUS}), INDEXED_FIELDS))
+        changed += mongo_db['flights'].find(self._watermark.changed_query({'status': {'$ne': BOOKABLE_STATUS}}), DROPPED_FIELDS)
+        with self._lock:
+            self._refreshed_at = time.monotonic()
+            self.refreshes += 1
+            if not changed:
+                return 0
+            for doc in changed:
+                self._apply(doc)
+                self._watermark.advance(doc)
+            self.changes_applied += len(changed)
+        return len(changed)
+
+    def invalidate(self):
+        """Forget everything; the next lookup rebuilds"""
+        with self._lock:
+            self._routes = {}
+            self._entries = {}
+            self._watermark.reset()
+            self._built_at = self._refreshed_at = None
+
+    def _ensure_current(self):
+        now = time.monotonic()
+        if self._built_at is None or now - self._built_at >= self.rebuild_seconds:
+            self.build()
+        elif now - self._refreshed_at >= self.refresh_seconds:
+            self.refresh()
+
+    def find_alternatives(self, flights: Iterable[Dict[str, Any]], window: timedelta = timedelta(hours=24),
+                          limit: int = 5, exclude: Iterable = ()) -> Dict[Any, List[Dict[str, Any]]]:
+        """Bookable flights on each flight's route departing within window of it, earliest first.
+
+        Returns {flight id: [{'id', 'flight_number', 'scheduled_departure', 'open_seats'}, ...]}
+        with at most limit alternatives per flight, never the flight itself or
+        a flight in exclude.
+        """
+        flights = list(flights)
+        exclude = set(exclude)
+        if not self.enabled:
+            return {flight.get('id'): self._find_in_db(flight, window, limit, exclude) for flight in flights}
+        self._ensure_current()
+        alternatives = {}
+        with self._lock:
+            for flight in flights:
+                departure = to_datetime(flight.get('scheduled_departure'))
+                schedule = self._routes.get((flight.get('origin', ''), flight.get('destination', '')))
+                found = []
+                if departure is not None and schedule is not None:
+                    for position in schedule.window(departure, departure + window):
+                        flight_id = schedule.flight_ids[position]
+                        flight_number, seats = schedule.values[position]
+                        if flight_id == flight.get('id') or flight_id in exclude:
+                            continue
+                        found.append({'id': flight_id, 'flight_number': flight_number,
+                                      'scheduled_departure': schedule.departures[position], 'open_seats': seats})
+                        if len(found) >= limit:
+                            break
+                alternatives[flight.get('id')] = found
+        return alternatives
+
+    def _find_in_db(self, flight: Dict[str, Any], window: timedelta, limit: int, exclude: set) -> List[Dict[str, Any]]:
+        departure = to_datetime(flight.get('scheduled_departure'))
+        if departure is None:
+            return []
+        docs = mongo_db['flights'].find({
+            'origin': flight.get('origin', ''),
+            'destination': flight.get('destination', ''),
+            'scheduled_departure': {'$gte': departure, '$lte': departure + window},
+            'status': BOOKABLE_STATUS,
+            'id': {'$nin': [flight.get('id', '')] + list(exclude)}
+        }, INDEXED_FIELDS).sort('scheduled_departure', 1).limit(limit)
+        return [{'id': doc['id'], 'flight_number': doc.get('flight_number', ''),
+                 'scheduled_departure': doc['scheduled_departure'], 'open_seats': open_seats(doc)} for doc in docs]
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            return {
+                'enabled': self.enabled,
+                'routes': len(self._routes),
+                'flights': len(self._entries),
+                'builds': self.builds,
+                'refreshes': self.refreshes,
+                'changes_applied': self.changes_applied,
+                'seconds_since_build': round(now - self._built_at, 1) if self._built_at is not None else None,
+                'watermark': self._watermark.as_dict()
+            }
+
+# Shared by every agent in the process
+route_index = RouteScheduleIndex()
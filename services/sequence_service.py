@@ -0,0 +1,58 @@
+import logging
+import threading
+from pymongo import DESCENDING, ReturnDocument
+from mongo_utils import mongo_db
+
+COUNTERS_COLLECTION = 'counters'
+
+class SequenceService:
+    """Allocates integer ids from a counters collection.
+
+    Each sequence is one {'_id': name, 'value': n} document advanced with an
+    atomic $inc, so concurrent writers never hand out the same id and ids are
+    not reused after deletions. reserve() hands out a whole block in a single
+    round-trip for bulk inserts.
+    """
+
+    def __init__(self, db=None):
+        self.db = db if db is not None else mongo_db
+        self._seeded = set()
+        self._lock = threading.Lock()
+
+    def _seed(self, name: str, collection: str = None):
+        """Start the counter at the collection's current max id the first time it's used"""
+        if name in self._seeded:
+            return
+        with self._lock:
+            if name in self._seeded:
+                return
+            latest = self.db[collection or name].find_one(
+                {'id': {'$type': 'number'}}, {'id': 1}, sort=[('id', DESCENDING)])
+            max_id = int(latest['id']) if latest else 0
+            self.db[COUNTERS_COLLECTION].update_one({'_id': name}, {'$max': {'value': max_id}}, upsert=True)
+            self._seeded.add(name)
+
+    def reserve(self, name: str, count: int, collection: str = None) -> range:
+        """Reserve count consecutive ids and return them as a range"""
+        if count < 1:
+            return range(0)
+        self._seed(name, collection)
+        counter = self.db[COUNTERS_COLLECTION].find_one_and_update(
+            {'_id': name},
+            {'$inc': {'value': count}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        end = counter['value']
+        return range(end - count + 1, end + 1)
+
+    def next_id(self, name: str, collection: str = None) -> int:
+        """Allocate a single id"""
+        return self.reserve(name, 1, collection)[0]
+
+    def reset(self, name: str, value: int = 0):
+        """Restart a sequence, e.g. after its collection has been wiped"""
+        with self._lock:
+            self.db[COUNTERS_COLLECTION].update_one({'_id': name}, {'$set': {'value': value}}, upsert=True)
+            self._seeded.add(name)
+        logging.info(f"Sequence {name} reset to {value}")
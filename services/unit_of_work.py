@@ -0,0 +1,175 @@
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+from pymongo import DeleteOne, InsertOne, UpdateOne
+from pymongo.write_concern import WriteConcern
+from config import Config
+from mongo_utils import mongo_db
+
+_local = threading.local()
+_totals_lock = threading.Lock()
+_totals = {'units': 0, 'flushes': 0, 'operations': 0, 'round_trips': 0}
+
+def _write_concern(value) -> Optional[WriteConcern]:
+    if value in (None, ''):
+        return None
+    return WriteConcern(w=int(value) if str(value).isdigit() else value)
+
+class UnitOfWork:
+    """Collects the writes of one request or coordination and flushes them in batches.
+
+    Writes queued through deferred_insert/deferred_update/deferred_bulk_write
+    while a unit of work is current on the thread are held back. flush()
+    sends them as one ordered bulk_write per collection, in the order the
+    collections were first written to. Anything that must be visible to a
+    later read in the same unit (another agent's messages, say) needs an
+    explicit flush() first.
+    """
+
+    def __init__(self, name: str = 'unit_of_work', write_concern: Any = None):
+        self.name = name
+        self.write_concern = _write_concern(write_concern if write_concern is not None else Config.UNIT_OF_WORK_WRITE_CONCERN)
+        self._pending: Dict[str, List[Any]] = {}
+        self._previous = None
+        self.flushes = 0
+        self.operations = 0
+        self.round_trips = 0
+
+    def insert_one(self, collection: str, document: Dict[str, Any]):
+        self.add(collection, [InsertOne(document)])
+
+    def update_one(self, collection: str, query: Dict[str, Any], update: Dict[str, Any], upsert: bool = False):
+        self.add(collection, [UpdateOne(query, update, upsert=upsert)])
+
+    def delete_one(self, collection: str, query: Dict[str, Any]):
+        self.add(collection, [DeleteOne(query)])
+
+    def add(self, collection: str, operations: List[Any]):
+        """Queue pymongo write operations (InsertOne, UpdateOne, ...) for a collection"""
+        self._pending.setdefault(collection, []).extend(operations)
+
+    @property
+    def pending(self) -> int:
+        return sum(len(operations) for operations in self._pending.values())
+
+    def flush(self) -> Dict[str, Any]:
+        """Send the queued writes, one ordered bulk_write per collection"""
+        pending, self._pending = self._pending, {}
+        results = {}
+        operations = round_trips = 0
+        errors = []
+        try:
+            for collection, batch in pending.items():
+                target = mongo_db[collection]
+                if self.write_concern is not None:
+                    target = target.with_options(write_concern=self.write_concern)
+                operations += len(batch)
+                round_trips += 1
+                try:
+                    results[collection] = target.bulk_write(batch, ordered=True)
+                except Exception as e:
+                    # One collection's failure must not drop the other collections' writes
+                    logging.error(f"Unit of work {self.name}: bulk write to {collection} failed: {e}")
+                    errors.append(e)
+            if errors:
+                raise errors[0]
+        finally:
+            if operations:
+                self.flushes += 1
+                self.operations += operations
+                self.round_trips += round_trips
+                with _totals_lock:
+                    _totals['flushes'] += 1
+                    _totals['operations'] += operations
+                    _totals['round_trips'] += round_trips
+                logging.debug(f"Unit of work {self.name}: flushed {operations} writes in {round_trips} round-trips")
+        return results
+
+    def discard(self):
+        """Drop queued writes without sending them"""
+        if self._pending:
+            logging.warning(f"Unit of work {self.name}: discarding {self.pending} unflushed writes")
+        self._pending = {}
+
+    def begin(self) -> 'UnitOfWork':
+        """Make this the thread's current unit of work"""
+        self._previous = current_unit_of_work()
+        _local.current = self
+        with _totals_lock:
+            _totals['units'] += 1
+        return self
+
+    def end(self):
+        """Stop collecting writes on this thread (unflushed writes are discarded)"""
+        self.discard()
+        _local.current = self._previous
+        self._previous = None
+
+    def __enter__(self) -> 'UnitOfWork':
+        return self.begin()
+
+    def __exit__(self, exc_type, exc, traceback):
+        try:
+            if exc_type is None:
+                self.flush()
+        finally:
+            self.end()
+        return False
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'flushes': self.flushes,
+            'operations': self.operations,
+            'round_trips': self.round_trips,
+            'round_trips_saved': self.operations - self.round_trips,
+            'pending': self.pending
+        }
+
+def current_unit_of_work() -> Optional[UnitOfWork]:
+    return getattr(_local, 'current', None)
+
+@contextmanager
+def unit_of_work(name: str = 'unit_of_work', write_concern: Any = None):
+    """Join the thread's current unit of work, or run a new one that flushes on success"""
+    current = current_unit_of_work()
+    if current is not None or not Config.UNIT_OF_WORK_ENABLED:
+        yield current
+        return
+    with UnitOfWork(name, write_concern) as uow:
+        yield uow
+
+def deferred_insert(collection: str, document: Dict[str, Any]):
+    """Insert now, or at the current unit of work's next flush"""
+    uow = current_unit_of_work()
+    if uow is None:
+        return mongo_db[collection].insert_one(document)
+    uow.insert_one(collection, document)
+
+def deferred_update(collection: str, query: Dict[str, Any], update: Dict[str, Any], upsert: bool = False):
+    """Update now, or at the current unit of work's next flush"""
+    uow = current_unit_of_work()
+    if uow is None:
+        return mongo_db[collection].update_one(query, update, upsert=upsert)
+    uow.update_one(collection, query, update, upsert)
+
+def deferred_bulk_write(collection: str, operations: List[Any]):
+    """Bulk write now, or at the current unit of work's next flush"""
+    uow = current_unit_of_work()
+    if uow is None:
+        return mongo_db[collection].bulk_write(operations, ordered=False)
+    uow.add(collection, operations)
+
+def flush_current():
+    """Flush the thread's unit of work, if any, so later reads see its writes"""
+    uow = current_unit_of_work()
+    if uow is not None:
+        uow.flush()
+
+def get_totals() -> Dict[str, int]:
+    """Process-wide unit of work counters"""
+    with _totals_lock:
+        totals = dict(_totals)
+    totals['round_trips_saved'] = totals['operations'] - totals['round_trips']
+    return totals
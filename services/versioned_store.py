@@ -0,0 +1,31 @@
+from typing import Any, Callable, Dict, Tuple
+from pymongo.errors import DuplicateKeyError
+
+# Times compare_and_set() re-reads a document that changed under it before giving up
+COMMIT_ATTEMPTS = 20
+
+def compare_and_set(collection, document_id, build_update: Callable[[Dict[str, Any]], Tuple[Dict[str, Any], Any]],
+                    initial: Dict[str, Any] = None, attempts: int = COMMIT_ATTEMPTS) -> Tuple[Any, int]:
+    """Update one {'_id', 'version', ...} document only if nobody wrote it since it was read.
+
+    build_update(doc) returns (update, result) from the document as read;
+    the update is applied with the version bumped if the version still
+    matches, and otherwise the document is re-read and build_update called
+    again. A missing document is created from initial first. Returns the
+    result of the attempt that was written and the number of conflicts.
+    """
+    conflicts = 0
+    for _ in range(attempts):
+        doc = collection.find_one({'_id': document_id})
+        if doc is None:
+            try:
+                collection.insert_one(dict(initial or {}, _id=document_id, version=0))
+            except DuplicateKeyError:
+                pass
+            continue
+        update, result = build_update(doc)
+        update.setdefault('$inc', {})['version'] = 1
+        if collection.update_one({'_id': document_id, 'version': doc['version']}, update).matched_count:
+            return result, conflicts
+        conflicts += 1
+    raise RuntimeError(f"Could not update {collection.name} {document_id} after {attempts} attempts")
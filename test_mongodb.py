@@ -1,10 +1,7 @@
-from pymongo.mongo_client import MongoClient
-from pymongo.server_api import ServerApi
-import os
+from mongo_utils import get_client
 
-uri = os.getenv('MONGODB_URI', 'YOUR_MONGODB_CONNECTION_STRING_HERE')
-# Create a new client and connect to the server
-client = MongoClient(uri, server_api=ServerApi('1'))
+# Create a new client and connect to the server (settings from Config)
+client = get_client()
 
 # Send a ping to confirm a successful connection
 try: